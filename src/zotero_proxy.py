@@ -1,10 +1,11 @@
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-import urllib.request
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 import json
 import traceback
 import sqlite3
+from urllib.parse import parse_qs, urlparse
 import os
 import sys
+import threading
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -18,82 +19,121 @@ from zotero_utils.OpenAlexDB.citation_network import (
     get_item_citations,
     get_all_authors,
     get_coauthors,
+    stream_citing_works_to_cache,
+    get_citing_fetch_state,
+    search_works,
+    reset_citation_cache,
 )
+from zotero_utils.OpenAlexAPI.response_cache import ResponseCache, install_response_cache
+from zotero_utils.OpenAlexDB.centrality import update_centrality
+from zotero_utils.OpenAlexDB.connection import OpenAlexConnections
+from zotero_utils.OpenAlexDB.eviction import evict_works
+from zotero_utils.OpenAlexDB.expansion import (
+    DEFAULT_HOPS,
+    DEFAULT_MAX_API_CALLS,
+    DEFAULT_MAX_NODES,
+    DEFAULT_MAX_SECONDS,
+    expand_neighbourhood,
+)
+from zotero_utils.OpenAlexDB.graph_engine import CitationGraph
+from zotero_utils.OpenAlexDB.migrations import migrate
+from zotero_utils.OpenAlexDB.refresh import get_library_work_ids, refresh_library_works
+from zotero_utils.OpenAlexDB.similarity import DEFAULT_TOP_K, get_similarity_edges
+from zotero_utils.http_client import ZOTERO_LOCAL_API_URL, zotero_api_get
 
 # Database configuration
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'openalex.db')
 DB_PATH = os.path.abspath(DB_PATH)
+HTTP_CACHE_PATH = os.path.join(os.path.dirname(DB_PATH), 'openalex_http_cache.db')
 
 # Global state
-db_conn = None
+# Requests are handled concurrently (so that overlapping OpenAlex lookups can be coalesced).
+# Read-only endpoints borrow a pooled read-only connection; endpoints that write share the single writer.
+# Endpoints fetching from OpenAlex read on a reader and borrow the writer only for each write (db_writer is
+# passed as their `writer`), so that a long fetch does not hold up the other writes.
+db_init_lock = threading.Lock()
+db_connections = None
 library_work_ids = set()
-
-
-def get_db_connection():
-    """Get or create database connection."""
-    global db_conn
-    if db_conn is None:
-        # Ensure database exists with schema
-        init_db_if_needed()
-        db_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    return db_conn
+citation_graph = None
+citation_graph_lock = threading.Lock()
+
+
+def get_db_connections() -> OpenAlexConnections:
+    """Get the database connection factory, initializing the database on first use."""
+    global db_connections
+    with db_init_lock:
+        if db_connections is None:
+            # Ensure database exists with schema
+            init_db_if_needed()
+            db_connections = OpenAlexConnections(DB_PATH)
+            # Opening the writer switches the database to WAL mode before any reader opens it
+            with db_connections.writer():
+                pass
+    return db_connections
+
+
+def db_reader():
+    """Borrow a read-only database connection: `with db_reader() as conn:`"""
+    return get_db_connections().reader()
+
+
+def db_writer():
+    """Borrow the database writer connection: `with db_writer() as conn:`"""
+    return get_db_connections().writer()
+
+
+def get_citation_graph() -> CitationGraph:
+    """
+    Get the in-memory citation graph, loading it on first use and again after works were deleted.
+
+    It is loaded through the writer, so that no edge is written between loading it and attaching it. Call it
+    before borrowing the writer.
+    """
+    global citation_graph
+    with citation_graph_lock:
+        if citation_graph is None or citation_graph.stale:
+            with db_writer() as conn:
+                if citation_graph is None:
+                    citation_graph = CitationGraph.load(conn)
+                    citation_graph.attach()
+                else:
+                    citation_graph.reload(conn)
+            print(f'Citation graph: {citation_graph.num_nodes} works, {citation_graph.num_edges} citations')
+        return citation_graph
+
+
+def update_library_centrality():
+    """
+    Rank the library's citation neighbourhood again after new citations were cached. Cheap when the
+    neighbourhood did not change (see centrality.update_centrality).
+    """
+    try:
+        graph = get_citation_graph()
+        with db_reader() as conn:
+            update_centrality(conn, graph, list(library_work_ids) or get_library_work_ids(conn), writer=db_writer)
+    except Exception as e:
+        print(f'Error updating centrality: {e}')
+        traceback.print_exc()
+
+
+def evict_cached_works_if_needed():
+    """Evict the least recently used external works once the database is over its size budget."""
+    try:
+        with db_writer() as conn:
+            evict_works(conn)
+    except Exception as e:
+        print(f'Error evicting cached works: {e}')
+        traceback.print_exc()
 
 
 def init_db_if_needed():
-    """Initialize database with schema if it doesn't exist or is empty."""
+    """Create the database, or bring the schema of an existing one up to date."""
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Check if the new tables exist, add them if not
-    cursor.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name='zotero_openalex_mapping'"
-    )
-    if not cursor.fetchone():
-        print("Adding zotero_openalex_mapping table...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS zotero_openalex_mapping (
-                zotero_key TEXT PRIMARY KEY,
-                openalex_work_id TEXT,
-                doi TEXT,
-                title TEXT,
-                last_updated TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS zotero_openalex_mapping_work_id_idx
-            ON zotero_openalex_mapping(openalex_work_id)
-        """)
-
-    cursor.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name='works_cited_by'"
-    )
-    if not cursor.fetchone():
-        print("Adding works_cited_by table...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS works_cited_by (
-                work_id TEXT,
-                citing_work_id TEXT,
-                fetched_date TEXT,
-                PRIMARY KEY (work_id, citing_work_id)
-            )
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS works_cited_by_work_id_idx
-            ON works_cited_by(work_id)
-        """)
-
-    # Add indexes for works_referenced_works if they don't exist
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS works_referenced_works_work_id_idx
-        ON works_referenced_works(work_id)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS works_referenced_works_ref_id_idx
-        ON works_referenced_works(referenced_work_id)
-    """)
-
-    conn.commit()
-    conn.close()
+    try:
+        version = migrate(conn)
+        print(f"Database schema version {version}")
+    finally:
+        conn.close()
 
 
 class ZoteroProxyHandler(SimpleHTTPRequestHandler):
@@ -126,12 +166,8 @@ class ZoteroProxyHandler(SimpleHTTPRequestHandler):
         # Reset cache endpoint - clears stale data to force refresh
         if self.path == '/api/reset-cache':
             try:
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM zotero_openalex_mapping")
-                cursor.execute("DELETE FROM works_referenced_works")
-                cursor.execute("DELETE FROM works_cited_by")
-                conn.commit()
+                with db_writer() as conn:
+                    reset_citation_cache(conn)
                 print("Cache cleared!")
                 self.send_json_response({'status': 'ok', 'message': 'Cache cleared'})
             except Exception as e:
@@ -143,8 +179,8 @@ class ZoteroProxyHandler(SimpleHTTPRequestHandler):
         if self.path.startswith('/api/work-details/'):
             try:
                 work_id = self.path.replace('/api/work-details/', '')
-                conn = get_db_connection()
-                details = get_work_details(conn, work_id)
+                with db_reader() as conn:
+                    details = get_work_details(conn, work_id)
 
                 if details:
                     self.send_json_response(details)
@@ -156,19 +192,64 @@ class ZoteroProxyHandler(SimpleHTTPRequestHandler):
                 traceback.print_exc()
                 self.send_error_response(str(e))
 
+        # Full-text search of cached works
+        elif self.path.startswith('/api/search'):
+            try:
+                params = parse_qs(urlparse(self.path).query)
+                query = params.get('q', [''])[0]
+                limit = int(params.get('limit', ['20'])[0])
+                with db_reader() as conn:
+                    results = search_works(conn, query, limit)
+                self.send_json_response({'query': query, 'results': results})
+
+            except Exception as e:
+                print(f'Error searching works: {e}')
+                traceback.print_exc()
+                self.send_error_response(str(e))
+
+        # Co-citation or bibliographic coupling links between library works, as weighted edges
+        elif self.path.startswith('/api/similarity'):
+            try:
+                params = parse_qs(urlparse(self.path).query)
+                kind = params.get('kind', ['coupling'])[0]
+                top_k = int(params.get('k', [str(DEFAULT_TOP_K)])[0])
+                with db_writer() as conn:
+                    work_ids = list(library_work_ids) or get_library_work_ids(conn)
+                    edges = get_similarity_edges(conn, work_ids, kind, top_k)
+                self.send_json_response({'kind': kind, 'top_k': top_k, 'edges': edges})
+
+            except ValueError as e:
+                self.send_error_response(str(e), 400)
+            except Exception as e:
+                print(f'Error computing library similarity: {e}')
+                traceback.print_exc()
+                self.send_error_response(str(e))
+
         # Proxy Zotero API requests
         elif self.path.startswith('/zotero-api/'):
             try:
                 zotero_path = self.path.replace('/zotero-api/', '')
-                zotero_url = f'http://localhost:23119/api/{zotero_path}'
+                zotero_url = f'{ZOTERO_LOCAL_API_URL}/{zotero_path}'
 
                 print(f'\n=== Proxying request ===')
                 print(f'Original path: {self.path}')
                 print(f'Zotero URL: {zotero_url}')
 
-                with urllib.request.urlopen(zotero_url) as response:
-                    data = response.read()
-                    print(f'Success! Got {len(data)} bytes')
+                response = zotero_api_get(zotero_path)
+                if response.status_code >= 400:
+                    print(f'\n!!! HTTPError !!!')
+                    print(f'Status: {response.status_code}')
+                    print(f'Reason: {response.reason}')
+                    print(f'Body: {response.text or "No error body"}')
+
+                    self.send_error_response(
+                        f'Zotero API error {response.status_code}: {response.reason}',
+                        response.status_code
+                    )
+                    return
+
+                data = response.content
+                print(f'Success! Got {len(data)} bytes')
 
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
@@ -176,18 +257,6 @@ class ZoteroProxyHandler(SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(data)
 
-            except urllib.error.HTTPError as e:
-                error_body = e.read().decode('utf-8') if e.fp else 'No error body'
-                print(f'\n!!! HTTPError !!!')
-                print(f'Status: {e.code}')
-                print(f'Reason: {e.reason}')
-                print(f'Body: {error_body}')
-
-                self.send_error_response(
-                    f'Zotero API error {e.code}: {e.reason}',
-                    e.code
-                )
-
             except Exception as e:
                 print(f'\n!!! General Exception !!!')
                 print(f'Error type: {type(e).__name__}')
@@ -226,15 +295,21 @@ class ZoteroProxyHandler(SimpleHTTPRequestHandler):
                     return
 
                 # Fetch and cache OpenAlex data
-                conn = get_db_connection()
                 print('Fetching OpenAlex data...')
-                zotero_items_map = fetch_and_cache_works(conn, items_with_dois)
+                cached_graph = get_citation_graph()
+                with db_reader() as conn:
+                    zotero_items_map = fetch_and_cache_works(conn, items_with_dois, writer=db_writer)
+                    # Rank the library's neighbourhood, if its citations changed
+                    update_centrality(conn, cached_graph, [
+                        info['openalex_work_id'] for info in zotero_items_map.values() if info.get('openalex_work_id')
+                    ], writer=db_writer)
 
                 print(f'Mapped {len(zotero_items_map)} items to OpenAlex')
 
                 # Build the graph
                 print('Building citation graph...')
-                graph = build_library_graph(conn, zotero_items_map)
+                with db_reader() as conn:
+                    graph = build_library_graph(conn, zotero_items_map, cached_graph)
 
                 # Store library IDs for expand-node
                 library_work_ids = set(graph['library_ids'])
@@ -267,25 +342,68 @@ class ZoteroProxyHandler(SimpleHTTPRequestHandler):
 
                 print(f'\n=== Expanding node: {work_id} ===')
 
-                conn = get_db_connection()
-                expansion = get_external_connections(
-                    conn,
-                    work_id,
-                    library_work_ids,
-                    max_refs=20,
-                    max_citing=20
-                )
+                cached_graph = get_citation_graph()
+                with db_reader() as conn:
+                    expansion = get_external_connections(
+                        conn,
+                        work_id,
+                        library_work_ids,
+                        max_refs=20,
+                        max_citing=20,
+                        graph=cached_graph,
+                        writer=db_writer
+                    )
 
                 print(f'Found {len(expansion["nodes"])} external nodes, '
                       f'{len(expansion["edges"])} edges')
 
                 self.send_json_response(expansion)
+                update_library_centrality()
+                evict_cached_works_if_needed()
 
             except Exception as e:
                 print(f'Error expanding node: {e}')
                 traceback.print_exc()
                 self.send_error_response(str(e))
 
+        # Expand several hops around a set of works in one call, within budgets
+        elif self.path == '/api/expand-neighbourhood':
+            try:
+                data = self.get_json_body()
+                work_ids = data.get('work_ids') or ([data['work_id']] if data.get('work_id') else [])
+
+                if not work_ids:
+                    self.send_error_response('work_ids required', 400)
+                    return
+
+                print(f'\n=== Expanding {len(work_ids)} works by {data.get("hops", DEFAULT_HOPS)} hops ===')
+
+                cached_graph = get_citation_graph()
+                with db_reader() as conn:
+                    expansion = expand_neighbourhood(
+                        conn,
+                        work_ids,
+                        library_work_ids,
+                        hops=int(data.get('hops', DEFAULT_HOPS)),
+                        max_nodes=int(data.get('max_nodes', DEFAULT_MAX_NODES)),
+                        max_api_calls=int(data.get('max_api_calls', DEFAULT_MAX_API_CALLS)),
+                        max_seconds=float(data.get('max_seconds', DEFAULT_MAX_SECONDS)),
+                        priority=data.get('priority', 'cited_by_count'),
+                        graph=cached_graph,
+                        writer=db_writer
+                    )
+
+                self.send_json_response(expansion)
+                update_library_centrality()
+                evict_cached_works_if_needed()
+
+            except ValueError as e:
+                self.send_error_response(str(e), 400)
+            except Exception as e:
+                print(f'Error expanding neighbourhood: {e}')
+                traceback.print_exc()
+                self.send_error_response(str(e))
+
         # Get citations for a single item (for focused graph view)
         elif self.path == '/api/get-item-citations':
             try:
@@ -298,25 +416,78 @@ class ZoteroProxyHandler(SimpleHTTPRequestHandler):
 
                 print(f'\n=== Getting citations for: {work_id} ===')
 
-                conn = get_db_connection()
-                citations = get_item_citations(conn, work_id, library_work_ids)
+                cached_graph = get_citation_graph()
+                with db_reader() as conn:
+                    citations = get_item_citations(conn, work_id, library_work_ids, cached_graph, writer=db_writer)
 
                 print(f'Found {len(citations["nodes"])} cited works')
 
                 self.send_json_response(citations)
+                update_library_centrality()
+                evict_cached_works_if_needed()
 
             except Exception as e:
                 print(f'Error getting citations: {e}')
                 traceback.print_exc()
                 self.send_error_response(str(e))
 
+        # Fetch (or resume fetching) every work citing an item, page by page
+        elif self.path == '/api/fetch-citing-works':
+            try:
+                data = self.get_json_body()
+                work_id = data.get('work_id')
+                max_works = data.get('max_works')
+
+                if not work_id:
+                    self.send_error_response('work_id required', 400)
+                    return
+
+                print(f'\n=== Fetching citing works for: {work_id} ===')
+
+                fetched = 0
+                with db_reader() as conn:
+                    for citing_ids in stream_citing_works_to_cache(conn, work_id, max_works=max_works, writer=db_writer):
+                        fetched += len(citing_ids)
+                        print(f'  Cached {fetched} citing works...')
+
+                    state = get_citing_fetch_state(conn, work_id) or {'fetched_count': 0, 'complete': False}
+                self.send_json_response({
+                    'work_id': work_id,
+                    'fetched': fetched,
+                    'total_cached': state['fetched_count'],
+                    'complete': state['complete'],
+                })
+                update_library_centrality()
+                evict_cached_works_if_needed()
+
+            except Exception as e:
+                print(f'Error fetching citing works: {e}')
+                traceback.print_exc()
+                self.send_error_response(str(e))
+
+        # Re-fetch the library works changed in OpenAlex since the last refresh
+        elif self.path == '/api/refresh-library':
+            try:
+                data = self.get_json_body()
+                print('\n=== Refreshing library works ===')
+
+                with db_reader() as conn:
+                    counts = refresh_library_works(conn, since=data.get('since'), writer=db_writer)
+
+                self.send_json_response(counts)
+
+            except Exception as e:
+                print(f'Error refreshing library works: {e}')
+                traceback.print_exc()
+                self.send_error_response(str(e))
+
         # Get all unique authors from the library
         elif self.path == '/api/get-authors':
             try:
                 print('\n=== Getting all authors ===')
 
-                conn = get_db_connection()
-                authors = get_all_authors(conn)
+                with db_reader() as conn:
+                    authors = get_all_authors(conn)
 
                 print(f'Found {len(authors)} unique authors')
 
@@ -339,8 +510,8 @@ class ZoteroProxyHandler(SimpleHTTPRequestHandler):
 
                 print(f'\n=== Getting coauthors for: {author_id} ===')
 
-                conn = get_db_connection()
-                coauthors = get_coauthors(conn, author_id)
+                with db_reader() as conn:
+                    coauthors = get_coauthors(conn, author_id)
 
                 print(f'Found {len(coauthors["nodes"])} coauthors')
 
@@ -365,8 +536,14 @@ class ZoteroProxyHandler(SimpleHTTPRequestHandler):
 
 if __name__ == '__main__':
     PORT = 8000
-    httpd = HTTPServer(('localhost', PORT), ZoteroProxyHandler)
+    # Set ZOTERO_UTILS_HTTP_REPLAY=1 to answer every OpenAlex request from the response cache
+    http_cache = install_response_cache(ResponseCache(
+        HTTP_CACHE_PATH,
+        replay_only=os.environ.get('ZOTERO_UTILS_HTTP_REPLAY') == '1',
+    ))
+    httpd = ThreadingHTTPServer(('localhost', PORT), ZoteroProxyHandler)
     print(f'Server running at http://localhost:{PORT}/')
     print(f'Database: {DB_PATH}')
+    print(f'OpenAlex response cache: {HTTP_CACHE_PATH}' + (' (replay-only)' if http_cache.replay_only else ''))
     print('Press Ctrl+C to stop')
     httpd.serve_forever()
@@ -6,6 +6,7 @@ import requests
 
 from .creator import get_creator
 from ..constants import ZOTERO_ENDPOINTS_DICT
+from ..http_client import zotero_api_get
 
 ITEM_FIELDS = [
     "title",
@@ -140,14 +141,12 @@ def get_item(item_id: int, conn: sqlite3.Connection) -> Item:
 
 def get_items(source: str = 'user', incl_attachments: bool = False) -> list:
     """Get all of the items from a particular subset of the Zotero database."""
-    zotero_base_url = f"http://127.0.0.1:23119/api/users/0"
     if source == 'user':
         zotero_endpoint = ZOTERO_ENDPOINTS_DICT['items']
     elif source == 'group':
         zotero_endpoint = ZOTERO_ENDPOINTS_DICT['group_items']
-    url = f"{zotero_base_url}{zotero_endpoint}"
     try:
-        response = requests.get(url)
+        response = zotero_api_get(f"users/0{zotero_endpoint}")
         response.raise_for_status()  # Raise an error for HTTP issues
         
         # Parse the JSON response
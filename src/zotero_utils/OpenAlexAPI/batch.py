@@ -0,0 +1,93 @@
+"""Concurrent, rate-limited batch fetching for the OpenAlex web API"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+# OpenAlex polite pool limits: https://docs.openalex.org/how-to-use-the-api/rate-limits-and-authentication
+POLITE_POOL_REQUESTS_PER_SECOND = 10
+MAX_IDS_PER_FILTER = 50  # Maximum number of values in one OR filter
+DEFAULT_MAX_WORKERS = 4
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Each request takes one token,
+    blocking until one is available.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until `tokens` tokens are available, then take them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Shared by every OpenAlex request made from this process.
+polite_pool_limiter = TokenBucket(rate=POLITE_POOL_REQUESTS_PER_SECOND)
+
+
+def split_into_batches(values: Sequence, batch_size: int = MAX_IDS_PER_FILTER) -> List[list]:
+    """Split a sequence of values into consecutive batches of at most `batch_size`."""
+    return [list(values[i:i + batch_size]) for i in range(0, len(values), batch_size)]
+
+
+def fetch_batches(
+    batches: List[list],
+    fetch_batch: Callable[[list], list],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    limiter: Optional[TokenBucket] = polite_pool_limiter,
+) -> Iterator[Tuple[list, Optional[list], Optional[Exception]]]:
+    """
+    Fetch several batches concurrently, keeping up to `max_workers` requests in flight.
+
+    Args:
+        batches: List of batches (e.g. lists of up to 50 IDs)
+        fetch_batch: Callable performing the request for one batch and returning its results
+        max_workers: Maximum number of concurrent requests
+        limiter: Rate limiter shared by all requests. None to disable rate limiting.
+
+    Yields:
+        (batch, results, error) tuples in the same order as `batches`. Exactly one of results and error is None.
+    """
+    def run(batch: list) -> list:
+        if limiter is not None:
+            limiter.acquire()
+        return fetch_batch(batch)
+
+    if max_workers <= 1 or len(batches) <= 1:
+        for batch in batches:
+            try:
+                yield batch, run(batch), None
+            except Exception as e:
+                yield batch, None, e
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        # Each request runs in the caller's context, e.g. inside bypass_response_cache()
+        futures = [executor.submit(contextvars.copy_context().run, run, batch) for batch in batches]
+        for batch, future in zip(batches, futures):
+            try:
+                yield batch, future.result(), None
+            except Exception as e:
+                yield batch, None, e
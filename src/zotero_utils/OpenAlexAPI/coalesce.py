@@ -0,0 +1,134 @@
+"""Single-flight coalescing of concurrent OpenAlex work lookups"""
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from .works import STUB_WORK_FIELDS, _openalex_id_key, get_works_by_ids_report
+
+DEFAULT_WINDOW = 0.02  # Seconds to wait for other lookups before sending a batch
+DEFAULT_TIMEOUT = 300.0  # Seconds a lookup waits for its works, covering the retries of a batch
+
+
+class WorkFetchCoalescer:
+    """
+    Merge concurrent lookups of OpenAlex works into shared batch requests.
+
+    A lookup for an ID that is already in flight waits on the existing request instead of issuing a new one.
+    IDs requested within `window` seconds of each other are sent together, in 50-ID batches.
+    """
+
+    def __init__(
+        self,
+        fetch_works: Optional[Callable[[List[str]], Dict[str, dict]]] = None,
+        window: float = DEFAULT_WINDOW,
+        select: Optional[List[str]] = None,
+    ):
+        """
+        Args:
+            fetch_works: Callable taking a list of IDs and returning a dict of ID -> work.
+                Defaults to get_works_by_ids_report().
+            window: Seconds to collect lookups before dispatching them
+            select: Only fetch these top-level fields (used by the default fetch_works)
+        """
+        self._fetch_works = fetch_works or (lambda ids: get_works_by_ids_report(ids, select=select).resolved)
+        self.window = window
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._pending: List[str] = []
+        self._timer: Optional[threading.Timer] = None
+
+    def get_works(self, openalex_ids: List[str], timeout: Optional[float] = DEFAULT_TIMEOUT) -> List[dict]:
+        """
+        Get works by OpenAlex ID, sharing requests with concurrent callers.
+
+        Args:
+            openalex_ids: List of OpenAlex Work IDs (e.g., ["W123", "W456"])
+            timeout: Seconds to wait for the works. None to wait indefinitely.
+
+        Returns:
+            List of the works found, in request order
+
+        Raises:
+            concurrent.futures.TimeoutError: If the works did not arrive within `timeout` seconds
+        """
+        futures = []
+        with self._lock:
+            for openalex_id in dict.fromkeys(_openalex_id_key(i) for i in openalex_ids if i):
+                future = self._in_flight.get(openalex_id)
+                if future is None:
+                    future = Future()
+                    self._in_flight[openalex_id] = future
+                    self._pending.append(openalex_id)
+                futures.append(future)
+            if self._pending and self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        works = [future.result(timeout) for future in futures]
+        return [work for work in works if work is not None]
+
+    def _flush(self):
+        """
+        Send every pending ID in one batched lookup and resolve their futures.
+
+        Every future taken is resolved, with None for the works that could not be fetched, or failed if the
+        flush itself is interrupted, so that no lookup waits on it forever.
+        """
+        openalex_ids: List[str] = []
+        works_by_id: Dict[str, dict] = {}
+        error: Optional[BaseException] = None
+        try:
+            with self._lock:
+                openalex_ids, self._pending = self._pending, []
+                self._timer = None
+            if openalex_ids:
+                works_by_id = self._fetch_works(openalex_ids)
+        except Exception as e:
+            print(f"Error fetching coalesced batch of {len(openalex_ids)} works: {e}")
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                for openalex_id in openalex_ids:
+                    future = self._in_flight.pop(openalex_id, None)
+                    if future is None:
+                        continue
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(works_by_id.get(openalex_id))
+
+
+_full_coalescer = WorkFetchCoalescer()
+_stub_coalescer = WorkFetchCoalescer(select=STUB_WORK_FIELDS)
+
+
+def get_works_by_ids_coalesced(openalex_ids: List[str], stub: bool = False) -> List[dict]:
+    """
+    Get works by OpenAlex ID, sharing in-flight requests with concurrent callers.
+
+    Args:
+        openalex_ids: List of OpenAlex Work IDs (e.g., ["W123", "W456"])
+        stub: Only fetch the fields needed for display (see STUB_WORK_FIELDS)
+
+    Returns:
+        List of work dictionaries
+    """
+    if not openalex_ids:
+        return []
+    coalescer = _stub_coalescer if stub else _full_coalescer
+    return coalescer.get_works(openalex_ids)
+
+
+def get_work_by_id_coalesced(openalex_id: str) -> Optional[dict]:
+    """Get a work by its OpenAlex ID, sharing in-flight requests with concurrent callers."""
+    if not openalex_id:
+        return None
+    openalex_id = _openalex_id_key(openalex_id)
+    if not openalex_id.startswith("W"):
+        openalex_id = f"W{openalex_id}"
+    works = _full_coalescer.get_works([openalex_id])
+    return works[0] if works else None
@@ -0,0 +1,248 @@
+"""Persistent on-disk cache of OpenAlex HTTP responses"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .. import http_client
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), "zotero-utils", "openalex_http_cache.db")
+
+DAY = 24 * 60 * 60
+# Time to live of cached responses, by entity (the first segment of the URL path), in seconds
+DEFAULT_TTLS = {
+    "works": 7 * DAY,
+    "authors": 30 * DAY,
+    "sources": 90 * DAY,
+    "institutions": 90 * DAY,
+    "concepts": 90 * DAY,
+    "topics": 90 * DAY,
+    "publishers": 90 * DAY,
+    "funders": 90 * DAY,
+}
+DEFAULT_TTL = DAY
+
+# Query parameters that identify the caller rather than the request
+IGNORED_QUERY_PARAMS = {"mailto", "api_key"}
+
+# Headers that no longer describe the stored (decoded) body
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+# Set by bypass_response_cache(). A context variable, so fetch_batches carries it into its worker threads.
+_bypass_cache: ContextVar[bool] = ContextVar("bypass_response_cache", default=False)
+
+
+class CacheMissError(requests.exceptions.ConnectionError):
+    """Raised in replay-only mode when a request is not in the cache."""
+
+
+@contextmanager
+def bypass_response_cache() -> Iterator[None]:
+    """
+    Send the requests made in this block to OpenAlex instead of answering them from the cache, e.g. to check
+    what changed. Their responses are still stored. A replay-only cache still answers them, as it never goes
+    to the network (see serves_live_responses).
+    """
+    token = _bypass_cache.set(True)
+    try:
+        yield
+    finally:
+        _bypass_cache.reset(token)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a URL so that equivalent requests share a cache entry.
+
+    Lower-cases the scheme and host, sorts the query parameters and drops the ones that only identify the caller.
+    """
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORED_QUERY_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), urlencode(query), ""))
+
+
+def url_entity(url: str) -> str:
+    """Return the OpenAlex entity of a URL, e.g. "works" for https://api.openalex.org/works?filter=..."""
+    path = urlsplit(url).path.strip("/")
+    return path.split("/", 1)[0] if path else ""
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of HTTP responses stored zlib-compressed in a SQLite file.
+
+    Entries are keyed by the SHA-256 of the normalized URL. In replay-only mode the cache never goes to the
+    network: expired entries are still served and misses raise CacheMissError.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = DEFAULT_TTL,
+        replay_only: bool = False,
+    ):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.replay_only = replay_only
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                entity TEXT,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                fetched_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def key(url: str) -> str:
+        """Cache key of a URL."""
+        return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+    def ttl(self, url: str) -> float:
+        """Time to live of the response to a URL, in seconds."""
+        return self.ttls.get(url_entity(url), self.default_ttl)
+
+    def get(self, url: str) -> Optional[Tuple[int, dict, bytes]]:
+        """
+        Look up the cached response to a URL.
+
+        Returns:
+            (status, headers, body), or None if not cached or expired (expired entries are served in replay-only mode)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, fetched_at FROM responses WHERE key = ?", (self.key(url),)
+            ).fetchone()
+        if not row:
+            return None
+        status, headers, body, fetched_at = row
+        if not self.replay_only and time.time() - fetched_at > self.ttl(url):
+            return None
+        return status, json.loads(headers), zlib.decompress(body)
+
+    def put(self, url: str, status: int, headers: dict, body: bytes) -> None:
+        """Store the response to a URL."""
+        headers = {k: v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS}
+        with self._lock:
+            self._conn.execute(
+                "REPLACE INTO responses (key, url, entity, status, headers, body, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(url), normalize_url(url), url_entity(url), status, json.dumps(headers), zlib.compress(body), time.time())
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Delete expired entries. Returns the number of entries deleted."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT key, url, fetched_at FROM responses").fetchall()
+            expired = [(key,) for key, url, fetched_at in rows if now - fetched_at > self.ttl(url)]
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", expired)
+            self._conn.commit()
+        return len(expired)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachingAdapter(HTTPAdapter):
+    """Requests transport adapter that answers GET requests from a ResponseCache when possible."""
+
+    def __init__(self, cache: ResponseCache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != "GET":
+            return super().send(request, **kwargs)
+
+        bypass = _bypass_cache.get() and not self.cache.replay_only
+        cached = None if bypass else self.cache.get(request.url)
+        if cached is not None:
+            return self._build_cached_response(request, *cached)
+        if self.cache.replay_only:
+            raise CacheMissError(f"Not in response cache (replay-only mode): {request.url}", request=request)
+
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            self.cache.put(request.url, response.status_code, dict(response.headers), response.content)
+        return response
+
+    @staticmethod
+    def _build_cached_response(request, status: int, headers: dict, body: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or "utf-8"
+        response.reason = "OK (cached)"
+        return response
+
+
+_installed_cache: Optional[ResponseCache] = None
+
+
+def get_cached_session(cache: Optional[ResponseCache] = None) -> requests.Session:
+    """
+    Get a requests Session whose GET responses go through the response cache.
+
+    Args:
+        cache: Cache to use. Defaults to the cache installed with install_response_cache().
+
+    Returns:
+        requests.Session: a new session for an explicitly given cache, otherwise the shared pooled OpenAlex
+        session (which only caches if a cache is installed)
+    """
+    if cache is None:
+        return http_client.get_openalex_session()
+    return http_client.build_session(CachingAdapter(cache, max_retries=http_client._openalex_retries()))
+
+
+def serves_live_responses() -> bool:
+    """Whether requests bypassing the cache reach OpenAlex, i.e. no replay-only cache is installed."""
+    return _installed_cache is None or not _installed_cache.replay_only
+
+
+def install_response_cache(cache: Optional[ResponseCache] = None) -> ResponseCache:
+    """
+    Route every pyalex request through a persistent response cache.
+
+    Args:
+        cache: Cache to install. Defaults to a ResponseCache at DEFAULT_CACHE_PATH; replay-only if the
+            ZOTERO_UTILS_HTTP_REPLAY environment variable is set to 1.
+
+    Returns:
+        The installed ResponseCache
+    """
+    global _installed_cache
+    if cache is None:
+        cache = ResponseCache(replay_only=os.environ.get("ZOTERO_UTILS_HTTP_REPLAY") == "1")
+    _installed_cache = cache
+    # Rebuild the shared OpenAlex session with the caching adapter, and route pyalex through it
+    http_client.reset_sessions()
+    http_client.install_openalex_session()
+    return cache
@@ -0,0 +1,154 @@
+"""Shared retry policy for OpenAlex requests: back-off, Retry-After and batch bisection"""
+
+import email.utils
+import random
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from pyalex.api import QueryError
+
+from .batch import TokenBucket, polite_pool_limiter
+from .response_cache import CacheMissError
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+AUTH_STATUS_CODES = {401, 403}
+NOT_FOUND_STATUS_CODE = 404
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds to wait."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    Retry transient failures with exponential back-off and jitter.
+
+    429 and 5xx responses, connection errors and timeouts are retried. A Retry-After header on the
+    response overrides the computed delay. Every attempt takes a token from `limiter` first.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 60.0,
+        jitter: float = 0.5,
+        limiter: Optional[TokenBucket] = polite_pool_limiter,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.limiter = limiter
+        self._sleep = sleep
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether an error is transient, i.e. the same request may succeed later."""
+        status = _status_code(error)
+        if status is not None:
+            return status in RETRYABLE_STATUS_CODES
+        if isinstance(error, CacheMissError):
+            return False
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def is_auth_error(self, error: Exception) -> bool:
+        """Whether OpenAlex refused our credentials (e.g. a missing or invalid API key), whatever was requested."""
+        if isinstance(error, QueryError):
+            return 'API key' in str(error)
+        return _status_code(error) in AUTH_STATUS_CODES
+
+    def is_rejection(self, error: Exception) -> bool:
+        """Whether OpenAlex rejected the query itself as a bad request (e.g. a malformed identifier in a filter)."""
+        if isinstance(error, QueryError):
+            return not self.is_auth_error(error)
+        return _status_code(error) == 400
+
+    def is_not_found(self, error: Exception) -> bool:
+        """Whether OpenAlex answered that the requested entity does not exist."""
+        return _status_code(error) == NOT_FOUND_STATUS_CODE
+
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Seconds to wait before retry number `attempt` (starting at 0)."""
+        response = getattr(error, 'response', None)
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        backoff = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return backoff * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Call fn(*args, **kwargs), retrying transient failures. The last error is raised once attempts run out."""
+        for attempt in range(self.max_attempts):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_attempts - 1 or not self.is_retryable(e):
+                    raise
+                wait = self.delay(attempt, e)
+                print(f"Retrying OpenAlex request in {wait:.1f}s after error: {e}")
+                self._sleep(wait)
+
+
+default_retry_policy = RetryPolicy()
+
+
+def bisect_batch(
+    batch: List[str],
+    fetch_batch: Callable[[List[str]], list],
+    retry_policy: RetryPolicy = default_retry_policy,
+) -> Tuple[list, Dict[str, str], Dict[str, str]]:
+    """
+    Fetch a batch, splitting it in halves when it is rejected to isolate the bad values.
+
+    Only rejected requests (see RetryPolicy.is_rejection) are split. A single bad value among n costs
+    O(log n) extra requests instead of n. Authentication errors are raised, as they are not caused by the
+    values and every other request would fail the same way.
+
+    Args:
+        batch: Values to fetch (e.g. up to 50 DOIs)
+        fetch_batch: Callable performing the request for a batch
+        retry_policy: Policy used for every request
+
+    Returns:
+        (results, errored, invalid): the results of the good values; values whose requests failed for
+        other reasons (e.g. retries ran out) -> error; values rejected on their own -> error
+
+    Raises:
+        Exception: The error of a request OpenAlex refused for its credentials (see RetryPolicy.is_auth_error)
+    """
+    try:
+        return retry_policy.call(fetch_batch, batch), {}, {}
+    except Exception as e:
+        if retry_policy.is_auth_error(e):
+            raise
+        if not retry_policy.is_rejection(e):
+            return [], {value: str(e) for value in batch}, {}
+        if len(batch) == 1:
+            return [], {}, {batch[0]: str(e)}
+
+    middle = len(batch) // 2
+    left = bisect_batch(batch[:middle], fetch_batch, retry_policy)
+    right = bisect_batch(batch[middle:], fetch_batch, retry_policy)
+    return left[0] + right[0], {**left[1], **right[1]}, {**left[2], **right[2]}
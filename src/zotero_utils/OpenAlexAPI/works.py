@@ -1,6 +1,37 @@
-from typing import Optional, List
+import threading
+from functools import partial
+from typing import Callable, Dict, Iterator, Optional, List, Tuple
+from urllib.parse import quote_plus
 import pyalex
 from pyalex import Works
+from pyalex.api import OpenAlexAuth
+
+from .batch import (
+    DEFAULT_MAX_WORKERS,
+    MAX_IDS_PER_FILTER,
+    fetch_batches,
+    split_into_batches,
+)
+from .retry import RetryPolicy, bisect_batch, default_retry_policy
+from ..http_client import get_openalex_session, install_openalex_session
+
+# pyalex creates a new session for every request by default; reuse the pooled keep-alive one instead
+install_openalex_session()
+
+OPENALEX_WORKS_URL = "https://api.openalex.org/works"
+
+# Fields needed to display a work as a graph node. Used with OpenAlex select= to fetch "stub" works.
+STUB_WORK_FIELDS = [
+    "id",
+    "doi",
+    "title",
+    "display_name",
+    "publication_year",
+    "type",
+    "cited_by_count",
+    "authorships",
+    "updated_date",
+]
 
 
 def normalize_doi(doi: str) -> str:
@@ -29,103 +60,425 @@ def get_work(work_info: dict) -> Optional[dict]:
     return None
 
 
-def get_work_by_doi(doi: str) -> Optional[dict]:
-    """Get a work by its DOI using pyalex."""
+def _get_single_work(record_id: str, select: Optional[List[str]] = None) -> pyalex.Work:
+    """
+    Get one work by an identifier (OpenAlex ID or DOI URL), following merged-work redirects.
+
+    The request goes through the shared OpenAlex session (and its response cache); callers retry it.
+
+    Raises:
+        requests.HTTPError: For an error response, e.g. 404 if OpenAlex has no such work
+    """
+    url = f"{OPENALEX_WORKS_URL}/{quote_plus(record_id)}"
+    if select:
+        url = f"{url}?select={','.join(select)}"
+    response = get_openalex_session().get(url, auth=OpenAlexAuth(pyalex.config))
+    response.raise_for_status()
+    return pyalex.Work(response.json())
+
+
+def _lookup_work_by_doi(
+    doi: str,
+    select: Optional[List[str]] = None,
+    retry_policy: RetryPolicy = default_retry_policy,
+    on_request: Optional[Callable[[], None]] = None,
+) -> Optional[dict]:
+    """
+    Look a work up by its DOI, retrying transient failures. on_request, if given, is called before every request.
+
+    Returns:
+        The work, or None if OpenAlex confirmed it has no work with this DOI
+
+    Raises:
+        Exception: The error of a request that failed for any other reason
+    """
+    def get(fn, *args, **kwargs):
+        if on_request is not None:
+            on_request()
+        return fn(*args, **kwargs)
+
     doi = normalize_doi(doi)
     if not doi:
         return None
     try:
         # Query using the DOI directly as an identifier
-        work = Works()[f"https://doi.org/{doi}"]
-        return work
+        return retry_policy.call(get, _get_single_work, f"https://doi.org/{doi}", select)
+    except Exception as e:
+        if not retry_policy.is_not_found(e):
+            raise
+    # Not found as an identifier: try the filter, which also matches DOIs stored in other forms
+    works = retry_policy.call(get, _works_query(select, doi=doi).get)
+    return works[0] if works else None
+
+
+def get_work_by_doi(doi: str, select: Optional[List[str]] = None) -> Optional[dict]:
+    """Get a work by its DOI using pyalex, projected to the `select` fields if given. None if it failed."""
+    try:
+        return _lookup_work_by_doi(doi, select)
     except Exception:
-        # If direct lookup fails, try filter
-        try:
-            works = Works().filter(doi=doi).get()
-            return works[0] if works else None
-        except Exception:
-            return None
+        return None
+
+
+class BatchFetchReport:
+    """
+    Outcome of a coverage-verified batch fetch.
+
+    Attributes:
+        resolved: Dict mapping each requested value (DOI or OpenAlex ID) -> work dict
+        missing: Requested values OpenAlex returned no work for
+        errored: Dict mapping requested values whose request failed -> error message
+        invalid: Dict mapping requested values OpenAlex rejected (isolated by bisection or a direct lookup)
+            -> error message. These are also in errored.
+        not_found: Missing values a direct lookup confirmed OpenAlex has no work for (see retry_missing)
+        requests: Number of requests sent to OpenAlex, counting pages, retries, bisection and direct lookups
+    """
 
+    def __init__(self):
+        self.resolved: Dict[str, dict] = {}
+        self.missing: List[str] = []
+        self.errored: Dict[str, str] = {}
+        self.invalid: Dict[str, str] = {}
+        self.not_found: List[str] = []
+        self.requests = 0
+
+    @property
+    def works(self) -> List[dict]:
+        """Resolved works without duplicates, in request order."""
+        unique = {}
+        for work in self.resolved.values():
+            unique.setdefault(work.get('id'), work)
+        return list(unique.values())
+
+    def __repr__(self):
+        return (f"BatchFetchReport(resolved={len(self.resolved)}, missing={len(self.missing)}, "
+                f"errored={len(self.errored)}, invalid={len(self.invalid)}, not_found={len(self.not_found)}, "
+                f"requests={self.requests})")
+
+
+def _doi_key(doi: str) -> str:
+    """DOIs are case-insensitive, so compare them lower-cased and without URL prefix."""
+    return (normalize_doi(doi) or '').lower()
+
+
+def _openalex_id_key(openalex_id: str) -> str:
+    """Compare OpenAlex IDs without the https://openalex.org/ prefix."""
+    return (openalex_id or '').rsplit('/', 1)[-1].upper()
+
+
+def _works_query(select: Optional[List[str]] = None, **filters) -> Works:
+    """Build a Works query, projected to the `select` fields if given."""
+    query = Works().filter(**filters)
+    if select:
+        query = query.select(select)
+    return query
+
+
+def _fetch_filter_batch(
+    filter_field: str,
+    batch: List[str],
+    select: Optional[List[str]] = None,
+    filters: Optional[Dict[str, str]] = None,
+    on_request: Optional[Callable[[], None]] = None,
+    retry_policy: RetryPolicy = default_retry_policy,
+) -> List[dict]:
+    """
+    Fetch one batch with a single OR filter, paginating until every match has been returned.
+
+    per_page is set to the batch size so that a batch normally costs exactly one request. The caller retries
+    the first page (see bisect_batch); the following pages are retried with retry_policy.
+    on_request, if given, is called before every request.
+    """
+    # Use pipe-separated values for OR query
+    filters = {**(filters or {}), filter_field: "|".join(batch)}
+    per_page = min(max(len(batch), 1), 200)
+
+    def get_page(**page):
+        if on_request is not None:
+            on_request()
+        return _works_query(select, **filters).get(per_page=per_page, **page)
+
+    works = get_page()
+    results = list(works)
+    total = (getattr(works, 'meta', None) or {}).get('count') or 0
+    page = 1
+    while len(results) < total and len(works) == per_page:
+        page += 1
+        works = retry_policy.call(get_page, page=page)
+        results.extend(works)
+    return results
+
+
+def _get_works_report(
+    values: List[str],
+    filter_field: str,
+    value_key: Callable[[str], str],
+    work_key: Callable[[dict], str],
+    get_single: Callable[..., Optional[dict]],
+    max_workers: int,
+    retry_missing: bool,
+    select: Optional[List[str]] = None,
+    filters: Optional[Dict[str, str]] = None,
+    retry_policy: RetryPolicy = default_retry_policy,
+) -> BatchFetchReport:
+    """
+    Shared implementation of the coverage-verified DOI and OpenAlex ID batch fetches.
+
+    get_single(value, select, retry_policy, on_request) looks one value up, returning None only if OpenAlex
+    confirmed it has no such work, and raising the error of any other failure.
+    """
+    report = BatchFetchReport()
+    values = list(dict.fromkeys(values))  # Drop duplicates, keep order
+    batches = split_into_batches(values, MAX_IDS_PER_FILTER)
+    # Batches run on several threads, and every attempt of every page is a request
+    requests_lock = threading.Lock()
+
+    def count_request():
+        with requests_lock:
+            report.requests += 1
+
+    fetch = partial(
+        _fetch_filter_batch, filter_field, select=select, filters=filters, on_request=count_request,
+        retry_policy=retry_policy,
+    )
+    # Transient failures are retried with back-off; rejected batches are bisected to isolate the bad values.
+    # The retry policy takes the rate limiter token for every attempt.
+    fetch_bisecting = partial(bisect_batch, fetch_batch=fetch, retry_policy=retry_policy)
+
+    for i, (batch, result, error) in enumerate(fetch_batches(batches, fetch_bisecting, max_workers, limiter=None)):
+        if error is not None and retry_policy.is_auth_error(error):
+            # Every batch would fail the same way, and the values are not to blame
+            raise error
+        works, errored, invalid = result if error is None else ([], {value: str(error) for value in batch}, {})
+        if errored or invalid:
+            start = i * MAX_IDS_PER_FILTER
+            print(f"Error fetching batch {start}-{start + len(batch)}: "
+                  f"{len(errored)} failed, {len(invalid)} rejected by OpenAlex")
+        report.errored.update(errored)
+        report.errored.update(invalid)
+        report.invalid.update(invalid)
+        works_by_key = {work_key(work): work for work in works}
+        for value in batch:
+            if value in report.errored:
+                continue
+            work = works_by_key.get(value_key(value))
+            if work is not None:
+                report.resolved[value] = work
+            else:
+                report.missing.append(value)
+
+    # Only the values that were accepted but did not come back are retried, one at a time, with the same fields
+    if retry_missing:
+        still_missing = []
+        for value in report.missing:
+            try:
+                work = get_single(value, select, retry_policy, count_request)
+            except Exception as e:
+                if retry_policy.is_auth_error(e):
+                    raise
+                report.errored[value] = str(e)
+                if retry_policy.is_rejection(e):
+                    report.invalid[value] = str(e)
+                continue
+            if work:
+                report.resolved[value] = work
+            else:
+                still_missing.append(value)
+                report.not_found.append(value)
+        report.missing = still_missing
+
+    return report
+
+
+def get_works_by_dois_report(
+    dois: List[str],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retry_missing: bool = True,
+) -> BatchFetchReport:
+    """
+    Batch fetch works by DOI and report which DOIs were resolved, missing or errored.
+
+    Args:
+        dois: List of DOI strings
+        max_workers: Maximum number of batches in flight at once
+        retry_missing: Whether to retry DOIs absent from their batch with a direct lookup
 
-def get_works_by_dois(dois: List[str]) -> List[dict]:
+    Returns:
+        BatchFetchReport keyed by normalized DOI
+    """
+    normalized_dois = [normalize_doi(doi) for doi in dois if doi]
+    normalized_dois = [d for d in normalized_dois if d]  # Remove empty
+    return _get_works_report(
+        normalized_dois,
+        filter_field='doi',
+        value_key=_doi_key,
+        work_key=lambda work: _doi_key(work.get('doi') or ''),
+        get_single=_lookup_work_by_doi,
+        max_workers=max_workers,
+        retry_missing=retry_missing,
+    )
+
+
+def get_works_by_dois(dois: List[str], max_workers: int = DEFAULT_MAX_WORKERS) -> List[dict]:
     """
     Batch fetch works by DOI (up to 50 at a time per OpenAlex limit).
 
     Args:
         dois: List of DOI strings
+        max_workers: Maximum number of batches in flight at once
 
     Returns:
         List of work dictionaries
     """
     if not dois:
         return []
+    return get_works_by_dois_report(dois, max_workers).works
 
-    # Normalize all DOIs
-    normalized_dois = [normalize_doi(doi) for doi in dois if doi]
-    normalized_dois = [d for d in normalized_dois if d]  # Remove empty
 
-    all_works = []
-    batch_size = 50
-
-    for i in range(0, len(normalized_dois), batch_size):
-        batch = normalized_dois[i:i + batch_size]
-        try:
-            # Use pipe-separated DOIs for OR query
-            doi_filter = "|".join(batch)
-            works = Works().filter(doi=doi_filter).get()
-            all_works.extend(works)
-        except Exception as e:
-            print(f"Error fetching batch {i}-{i+batch_size}: {e}")
-            # Try individual lookups as fallback
-            for doi in batch:
-                work = get_work_by_doi(doi)
-                if work:
-                    all_works.append(work)
-
-    return all_works
-
-
-def get_work_by_id(openalex_id: str) -> Optional[dict]:
-    """Get a work by its OpenAlex ID."""
+def _lookup_work_by_id(
+    openalex_id: str,
+    select: Optional[List[str]] = None,
+    retry_policy: RetryPolicy = default_retry_policy,
+    on_request: Optional[Callable[[], None]] = None,
+) -> Optional[dict]:
+    """
+    Look a work up by its OpenAlex ID, retrying transient failures. on_request, if given, is called before
+    every request.
+
+    Returns:
+        The work, or None if OpenAlex confirmed it has no work with this ID
+
+    Raises:
+        Exception: The error of a request that failed for any other reason
+    """
+    def get():
+        if on_request is not None:
+            on_request()
+        return _get_single_work(openalex_id, select)
+
     if not openalex_id:
         return None
+    # Ensure proper format
+    if not openalex_id.startswith("W"):
+        openalex_id = f"W{openalex_id}"
+    try:
+        return retry_policy.call(get)
+    except Exception as e:
+        if retry_policy.is_not_found(e):
+            return None
+        raise
+
+
+def get_work_by_id(openalex_id: str, select: Optional[List[str]] = None) -> Optional[dict]:
+    """Get a work by its OpenAlex ID, projected to the `select` fields if given. None if it failed."""
     try:
-        # Ensure proper format
-        if not openalex_id.startswith("W"):
-            openalex_id = f"W{openalex_id}"
-        work = Works()[openalex_id]
-        return work
+        return _lookup_work_by_id(openalex_id, select)
     except Exception:
         return None
 
 
-def get_works_by_ids(openalex_ids: List[str]) -> List[dict]:
+def get_works_by_ids_report(
+    openalex_ids: List[str],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    retry_missing: bool = True,
+    select: Optional[List[str]] = None,
+    filters: Optional[Dict[str, str]] = None,
+) -> BatchFetchReport:
+    """
+    Batch fetch works by OpenAlex ID and report which IDs were resolved, missing or errored.
+
+    Args:
+        openalex_ids: List of OpenAlex Work IDs (e.g., ["W123", "W456"])
+        max_workers: Maximum number of batches in flight at once
+        retry_missing: Whether to retry IDs absent from their batch with a direct lookup (which follows merged-work redirects)
+        select: Only fetch these top-level fields (e.g. STUB_WORK_FIELDS). None for the full work.
+        filters: Further filters every work must match, e.g. {'from_updated_date': '2024-01-01'}. IDs of works
+            not matching them are reported missing, so use them with retry_missing=False.
+
+    Returns:
+        BatchFetchReport keyed by the requested IDs
+    """
+    return _get_works_report(
+        [i for i in openalex_ids if i],
+        filter_field='openalex_id',
+        value_key=_openalex_id_key,
+        work_key=lambda work: _openalex_id_key(work.get('id') or ''),
+        get_single=_lookup_work_by_id,
+        max_workers=max_workers,
+        retry_missing=retry_missing,
+        select=select,
+        filters=filters,
+    )
+
+
+def get_works_by_ids(openalex_ids: List[str], max_workers: int = DEFAULT_MAX_WORKERS) -> List[dict]:
     """
     Batch fetch works by OpenAlex ID (up to 50 at a time).
 
     Args:
         openalex_ids: List of OpenAlex Work IDs (e.g., ["W123", "W456"])
+        max_workers: Maximum number of batches in flight at once
 
     Returns:
         List of work dictionaries
     """
     if not openalex_ids:
         return []
+    return get_works_by_ids_report(openalex_ids, max_workers).works
 
-    all_works = []
-    batch_size = 50
 
-    for i in range(0, len(openalex_ids), batch_size):
-        batch = openalex_ids[i:i + batch_size]
-        try:
-            # Use pipe-separated IDs for OR query
-            id_filter = "|".join(batch)
-            works = Works().filter(openalex_id=id_filter).get()
-            all_works.extend(works)
-        except Exception as e:
-            print(f"Error fetching batch {i}-{i+batch_size}: {e}")
+def get_stub_works_by_ids(openalex_ids: List[str], max_workers: int = DEFAULT_MAX_WORKERS) -> List[dict]:
+    """
+    Batch fetch only the fields needed to display works as graph nodes (see STUB_WORK_FIELDS).
 
-    return all_works
+    Args:
+        openalex_ids: List of OpenAlex Work IDs (e.g., ["W123", "W456"])
+        max_workers: Maximum number of batches in flight at once
+
+    Returns:
+        List of partial work dictionaries
+    """
+    if not openalex_ids:
+        return []
+    return get_works_by_ids_report(openalex_ids, max_workers, select=STUB_WORK_FIELDS).works
+
+
+def _strip_openalex_url(work_id: str) -> str:
+    """Remove the https://openalex.org/ prefix from a work ID, if present."""
+    if work_id.startswith("https://openalex.org/"):
+        work_id = work_id.replace("https://openalex.org/", "")
+    return work_id
+
+
+def iter_citing_works_pages(
+    work_id: str,
+    per_page: int = 200,
+    cursor: str = "*",
+    select: Optional[List[str]] = None,
+) -> Iterator[Tuple[List[dict], Optional[str]]]:
+    """
+    Stream the works citing the given work, one page at a time, using OpenAlex cursor pagination.
+
+    Args:
+        work_id: OpenAlex Work ID (e.g., "W2741809807")
+        per_page: Number of works per page (1-200)
+        cursor: Cursor to start from. "*" starts at the beginning; pass a saved cursor to resume.
+        select: Only fetch these top-level fields (e.g. STUB_WORK_FIELDS). None for full works.
+
+    Yields:
+        (page, next_cursor) tuples. next_cursor is None after the last page.
+    """
+    if not work_id or not cursor:
+        return
+
+    work_id = _strip_openalex_url(work_id)
+    while cursor:
+        query = _works_query(select, cites=work_id)
+        page = default_retry_policy.call(query.get, per_page=per_page, cursor=cursor)
+        next_cursor = (getattr(page, 'meta', None) or {}).get('next_cursor')
+        if not page:
+            next_cursor = None
+        yield list(page), next_cursor
+        cursor = next_cursor
 
 
 def get_citing_works(work_id: str, limit: int = 50) -> List[dict]:
@@ -142,17 +495,15 @@ def get_citing_works(work_id: str, limit: int = 50) -> List[dict]:
     if not work_id:
         return []
 
-    # Ensure proper format (remove URL prefix if present)
-    if work_id.startswith("https://openalex.org/"):
-        work_id = work_id.replace("https://openalex.org/", "")
-
+    citing_works = []
     try:
-        # Use the cites filter to find works that cite this one
-        citing_works = Works().filter(cites=work_id).get(per_page=limit)
-        return list(citing_works) if citing_works else []
+        for page, _ in iter_citing_works_pages(work_id, per_page=min(max(limit, 1), 200)):
+            citing_works.extend(page)
+            if len(citing_works) >= limit:
+                break
     except Exception as e:
         print(f"Error fetching citing works for {work_id}: {e}")
-        return []
+    return citing_works[:limit]
 
 
 def get_work_by_issn(issn: str) -> Optional[dict]:
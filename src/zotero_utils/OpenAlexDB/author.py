@@ -21,10 +21,12 @@ class Author:
         """
         if not isinstance(author_ids, list):
             author_ids = [author_ids]
-        pyalexAuthors = pyalex.Authors().get([author_ids]) # I think this may be the syntax for just one author. How to do this for a list of authors at once?
+        from zotero_utils.OpenAlexDB.get_items_from_api import get_entities_by_id
+        pyalexAuthors = get_entities_by_id(author_ids).get('A', [])
         authors = [Author(a) for a in pyalexAuthors]
         for author in authors:
-            author.insert_or_replace_in_db(conn)
+            author.insert_or_replace_in_db(conn, commit=False)
+        conn.commit()
         return authors
 
     @staticmethod
@@ -54,40 +56,47 @@ class Author:
         conn.execute("DELETE FROM authors_counts_by_year WHERE author_id=?", (author_id,))
         conn.execute("DELETE FROM authors_ids WHERE author_id=?", (author_id,))
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    def insert_or_replace_in_db(self, conn: sqlite3.Connection, commit: bool = True):
         """
-        REPLACE the author in the database.
+        REPLACE the author in the database. Uses defensive .get() access for all fields.
         """
         author = self.author
+        author_id = self.author_id
         # AUTHORS
-        insert_tuple = (remove_base_url(author['id']), author['orcid'], author['display_name'], author['display_name_alternatives'], author['works_count'], author['cited_by_count'], author['last_known_institution'], author['works_api_url'], author['updated_date'])
+        # last_known_institution was replaced by the last_known_institutions list in the API
+        last_known_institution = author.get('last_known_institution') or (author.get('last_known_institutions') or [None])[0]
+        if isinstance(last_known_institution, dict):
+            last_known_institution = last_known_institution.get('id')
+        insert_tuple = (
+            author_id,
+            author.get('orcid'),
+            author.get('display_name'),
+            json.dumps(author.get('display_name_alternatives') or []),
+            author.get('works_count'),
+            author.get('cited_by_count'),
+            remove_base_url(last_known_institution or ''),
+            author.get('works_api_url'),
+            author.get('updated_date')
+        )
         question_marks = ', '.join(['?'] * len(insert_tuple))
         conn.execute(
             f"REPLACE INTO authors (id, orcid, display_name, display_name_alternatives, works_count, cited_by_count, last_known_institution, works_api_url, updated_date) VALUES ({question_marks})", insert_tuple
         )
 
         # AUTHORS_COUNTS_BY_YEAR
-        for count in author['counts_by_year']:
-            insert_tuple = (remove_base_url(author['id']), count['year'], count['works_count'], count['cited_by_count'], count['oa_works_count'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
+        conn.execute("DELETE FROM authors_counts_by_year WHERE author_id=?", (author_id,))
+        for count in author.get('counts_by_year') or []:
+            insert_tuple = (author_id, count.get('year'), count.get('works_count'), count.get('cited_by_count'), count.get('oa_works_count'))
             conn.execute(
-                f"REPLACE INTO authors_counts_by_year (author_id, year, works_count, cited_by_count, oa_works_count) VALUES ({question_marks})", insert_tuple
+                "REPLACE INTO authors_counts_by_year (author_id, year, works_count, cited_by_count, oa_works_count) VALUES (?, ?, ?, ?, ?)", insert_tuple
             )
 
         # AUTHORS_IDS
-        author_ids = author['ids']
-        openalex_id = author_ids['openalex']
-        orcid_id = author_ids.get('orcid')
-        scopus_id = author_ids.get('scopus')
-        twitter_id = author_ids.get('twitter')
-        wikipedia_id = author_ids.get('wikipedia')
-        mag_id = author_ids.get('mag')
-        insert_tuple = (remove_base_url(author['id']), openalex_id, orcid_id, scopus_id, twitter_id, wikipedia_id, mag_id)
-        question_marks = ', '.join(['?'] * len(insert_tuple))
+        author_ids = author.get('ids') or {}
+        insert_tuple = (author_id, author_ids.get('openalex'), author_ids.get('orcid'), author_ids.get('scopus'), author_ids.get('twitter'), author_ids.get('wikipedia'), author_ids.get('mag'))
         conn.execute(
-            f"REPLACE INTO authors_ids (author_id, openalex_id, orcid_id, scopus_id, twitter_id, wikipedia_id, mag_id) VALUES ({question_marks})", insert_tuple
+            "REPLACE INTO authors_ids (author_id, openalex, orcid, scopus, twitter, wikipedia, mag) VALUES (?, ?, ?, ?, ?, ?, ?)", insert_tuple
         )
 
-        conn.commit()
-
-        
\ No newline at end of file
+        if commit:
+            conn.commit()
@@ -0,0 +1,264 @@
+"""
+Centrality of the works in the library's citation neighbourhood.
+
+The neighbourhood is the library works and the cached works citing or cited by them, with the citations
+between all of these. Over its sparse adjacency matrix A (A[i, j] = 1 if work i cites work j):
+
+- in_degree / out_degree: citations received / made within the neighbourhood
+- pagerank: power iteration over the citations, so a work cited by central works ranks high
+- hub / authority: HITS scores; authorities are cited by many hubs, hubs cite many authorities
+- betweenness: Brandes' algorithm from a sample of source works, ignoring the direction of citations,
+  so works bridging otherwise separate parts of the literature rank high
+
+The scores are stored in work_centrality. They are recomputed only when the neighbourhood changed, starting
+the iterations from the stored scores, so a few new citations cost a few iterations.
+"""
+
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from .clean import int_to_work_id, work_id_to_int
+from .connection import WriterFactory, lend_connection
+from .graph_engine import CitationGraph
+
+DEFAULT_DAMPING = 0.85
+DEFAULT_TOLERANCE = 1e-8
+DEFAULT_MAX_ITERATIONS = 100
+DEFAULT_BETWEENNESS_SAMPLES = 64
+CENTRALITY_SCOPE = 'library_neighbourhood'
+
+CENTRALITY_COLUMNS = ('in_degree', 'out_degree', 'pagerank', 'hub', 'authority', 'betweenness')
+
+
+def pagerank(
+    adjacency: sparse.csr_matrix,
+    damping: float = DEFAULT_DAMPING,
+    tolerance: float = DEFAULT_TOLERANCE,
+    max_iterations: int = DEFAULT_MAX_ITERATIONS,
+    initial: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    PageRank by power iteration. Works citing nothing spread their rank over all works.
+
+    Args:
+        adjacency: A[i, j] = 1 if work i cites work j
+        damping: Probability of following a citation rather than jumping to a random work
+        tolerance: Stop once the ranks change by less than this (L1 norm)
+        max_iterations: Stop after this many iterations
+        initial: Ranks to start from, e.g. the previous ones
+
+    Returns:
+        Rank of each work, summing to 1
+    """
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out_degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = out_degrees == 0
+    transitions = (sparse.diags(1 / np.where(dangling, 1, out_degrees)) @ adjacency).T.tocsr()
+    ranks = np.full(n, 1 / n) if initial is None else initial / initial.sum()
+    for _ in range(max_iterations):
+        previous = ranks
+        ranks = damping * (transitions @ ranks + ranks[dangling].sum() / n) + (1 - damping) / n
+        if np.abs(ranks - previous).sum() < tolerance:
+            break
+    return ranks
+
+
+def hits(
+    adjacency: sparse.csr_matrix,
+    tolerance: float = DEFAULT_TOLERANCE,
+    max_iterations: int = DEFAULT_MAX_ITERATIONS,
+    initial_hubs: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    HITS hub and authority scores by power iteration, each scaled to unit length.
+
+    Returns:
+        (hub scores, authority scores)
+    """
+    n = adjacency.shape[0]
+    hubs = np.ones(n) if initial_hubs is None else initial_hubs.copy()
+    authorities = np.zeros(n)
+    transposed = adjacency.T.tocsr()
+    for _ in range(max_iterations):
+        previous = hubs
+        authorities = transposed @ hubs
+        authorities /= max(np.linalg.norm(authorities), 1e-300)
+        hubs = adjacency @ authorities
+        hubs /= max(np.linalg.norm(hubs), 1e-300)
+        if np.abs(hubs - previous).sum() < tolerance:
+            break
+    return hubs, authorities
+
+
+def approximate_betweenness(
+    adjacency: sparse.csr_matrix,
+    samples: int = DEFAULT_BETWEENNESS_SAMPLES,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Betweenness of the undirected citation graph, estimated with Brandes' algorithm from `samples` random
+    source works. Each breadth-first search advances one level per sparse matrix-vector product.
+
+    Returns:
+        Estimated number of shortest paths through each work (exact when samples >= the number of works)
+    """
+    n = adjacency.shape[0]
+    undirected = ((adjacency + adjacency.T) > 0).astype(np.float64).tocsr()
+    sources = np.arange(n)
+    if samples < n:
+        sources = np.random.default_rng(seed).choice(n, size=samples, replace=False)
+    betweenness = np.zeros(n)
+    for source in sources:
+        # Shortest paths from the source, level by level: sigma counts them, levels hold each level's works
+        sigma = np.zeros(n)
+        sigma[source] = 1
+        visited = np.zeros(n, dtype=bool)
+        visited[source] = True
+        levels = [np.array([source])]
+        while True:
+            frontier = levels[-1]
+            paths = undirected[frontier].T @ sigma[frontier]
+            reached = np.flatnonzero((paths > 0) & ~visited)
+            if len(reached) == 0:
+                break
+            sigma[reached] = paths[reached]
+            visited[reached] = True
+            levels.append(reached)
+        # Accumulate the dependencies from the farthest level back
+        delta = np.zeros(n)
+        for depth in range(len(levels) - 1, 0, -1):
+            successors = levels[depth]
+            weights = np.zeros(n)
+            weights[successors] = (1 + delta[successors]) / sigma[successors]
+            predecessors = levels[depth - 1]
+            delta[predecessors] += sigma[predecessors] * (undirected[predecessors] @ weights)
+        delta[source] = 0
+        betweenness += delta
+    # Each undirected path is counted from both of its ends
+    return betweenness * (n / max(len(sources), 1)) / 2
+
+
+def compute_centrality(
+    n: int,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    initial_pagerank: Optional[np.ndarray] = None,
+    initial_hubs: Optional[np.ndarray] = None,
+    betweenness_samples: int = DEFAULT_BETWEENNESS_SAMPLES
+) -> Dict[str, np.ndarray]:
+    """
+    Compute every centrality of a graph of n works given as (citing, cited) positions.
+
+    Returns:
+        Dict mapping each of CENTRALITY_COLUMNS -> score of each work
+    """
+    adjacency = sparse.csr_matrix((np.ones(len(sources)), (sources, targets)), shape=(n, n))
+    adjacency.data[:] = 1  # Duplicate edges were summed
+    hubs, authorities = hits(adjacency, initial_hubs=initial_hubs)
+    return {
+        'in_degree': np.asarray(adjacency.sum(axis=0)).ravel().astype(np.int64),
+        'out_degree': np.asarray(adjacency.sum(axis=1)).ravel().astype(np.int64),
+        'pagerank': pagerank(adjacency, initial=initial_pagerank),
+        'hub': hubs,
+        'authority': authorities,
+        'betweenness': approximate_betweenness(adjacency, betweenness_samples),
+    }
+
+
+def _fingerprint(numbers: np.ndarray, sources: np.ndarray, targets: np.ndarray) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (numbers, sources, targets):
+        digest.update(array.astype(np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def _get_stored_scores(conn: sqlite3.Connection, numbers: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """Get the stored PageRank and hub scores of works (by number), for warm starts. New works get the mean."""
+    stored = dict((number, (rank, hub)) for number, rank, hub in conn.execute(
+        "SELECT work_id, pagerank, hub FROM work_centrality"
+    ))
+    if not stored:
+        return None, None
+    scores = np.array([stored.get(number, (np.nan, np.nan)) for number in numbers.tolist()], dtype=np.float64)
+    scores = scores.reshape(-1, 2)
+    for column in range(2):
+        known = ~np.isnan(scores[:, column])
+        scores[~known, column] = scores[known, column].mean() if known.any() else 1.0
+    return scores[:, 0], scores[:, 1]
+
+
+def _get_stored_fingerprint(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute("SELECT fingerprint FROM work_centrality_state WHERE scope = ?", (CENTRALITY_SCOPE,)).fetchone()
+    return row[0] if row is not None else None
+
+
+def update_centrality(
+    conn: sqlite3.Connection,
+    graph: CitationGraph,
+    library_work_ids: List[str],
+    hops: int = 1,
+    commit: bool = True,
+    writer: Optional[WriterFactory] = None
+) -> bool:
+    """
+    Recompute the centrality of the library's citation neighbourhood if it changed since it was stored.
+
+    The scores are computed from the graph and the stored scores read through conn; the writer is only
+    borrowed to store them.
+
+    Args:
+        conn: SQLite database connection to read the stored scores from
+        graph: Citation graph of the cached works
+        library_work_ids: OpenAlex IDs of the library works
+        hops: Size of the neighbourhood, in citations from the library works
+        commit: Commit the transaction
+        writer: Lends the writer connection once the scores are computed. None to write through conn.
+
+    Returns:
+        Whether the centrality was recomputed
+    """
+    numbers, sources, targets = graph.neighbourhood(library_work_ids, hops)
+    fingerprint = _fingerprint(numbers, sources, targets)
+    if _get_stored_fingerprint(conn) == fingerprint:
+        return False
+
+    initial_pagerank, initial_hubs = _get_stored_scores(conn, numbers)
+    scores = compute_centrality(len(numbers), sources, targets, initial_pagerank, initial_hubs)
+    with (writer or lend_connection(conn))() as write_conn:
+        if _get_stored_fingerprint(write_conn) == fingerprint:
+            return False  # Stored meanwhile by another thread
+        write_conn.execute("DELETE FROM work_centrality")
+        write_conn.executemany(
+            f"INSERT INTO work_centrality (work_id, {', '.join(CENTRALITY_COLUMNS)}) VALUES (?{', ?' * len(CENTRALITY_COLUMNS)})",
+            zip(numbers.tolist(), *(scores[column].tolist() for column in CENTRALITY_COLUMNS))
+        )
+        write_conn.execute("""
+            INSERT OR REPLACE INTO work_centrality_state (scope, fingerprint, computed_at) VALUES (?, ?, ?)
+        """, (CENTRALITY_SCOPE, fingerprint, datetime.now().isoformat()))
+        if commit:
+            write_conn.commit()
+    print(f"Computed the centrality of {len(numbers)} works ({len(sources)} citations)")
+    return True
+
+
+def get_work_centrality(conn: sqlite3.Connection, work_ids: List[str]) -> Dict[str, dict]:
+    """
+    Get the stored centrality of works.
+
+    Returns:
+        Dict mapping work ID -> {column: score} for each of CENTRALITY_COLUMNS, for the works that have one
+    """
+    numbers = [number for number in map(work_id_to_int, work_ids) if number is not None]
+    cursor = conn.execute(f"""
+        SELECT work_id, {', '.join(CENTRALITY_COLUMNS)} FROM work_centrality
+        WHERE work_id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(numbers),))
+    return {int_to_work_id(row[0]): dict(zip(CENTRALITY_COLUMNS, row[1:])) for row in cursor}
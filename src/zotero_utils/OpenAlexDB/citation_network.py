@@ -4,20 +4,27 @@ Citation Network Module
 Builds citation network graphs from Zotero library items using OpenAlex data.
 """
 
+import json
+import re
 import sqlite3
-from datetime import datetime
-from typing import Dict, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 from ..Classes.item import get_items, get_openalex_work_id
 from ..OpenAlexAPI.works import (
-    get_work_by_doi,
-    get_works_by_dois,
-    get_works_by_ids,
-    get_citing_works,
+    STUB_WORK_FIELDS,
+    get_works_by_dois_report,
+    get_works_by_ids_report,
+    iter_citing_works_pages,
     normalize_doi,
 )
-from .work import Work
-from .clean import remove_base_url
+from ..OpenAlexAPI.coalesce import get_work_by_id_coalesced, get_works_by_ids_coalesced
+from .work import Work, WorkBatchWriter, FETCH_TIER_STUB, notify_edge_listeners
+from .graph_engine import CitationGraph
+from .centrality import get_work_centrality
+from .eviction import touch_works
+from .clean import int_to_work_id, remove_base_url, work_id_to_int
+from .connection import WriterFactory, lend_connection
 
 
 def get_zotero_items_with_dois() -> Tuple[List[dict], List[dict]]:
@@ -95,52 +102,117 @@ def extract_year(date_str: str) -> Optional[int]:
     return None
 
 
+BAD_IDENTIFIER_RETRY_DAYS = 30  # Identifiers OpenAlex rejected or could not find are skipped this long
+
+
+def record_bad_identifiers(
+    conn: sqlite3.Connection,
+    identifiers: Dict[str, str],
+    kind: str,
+    commit: bool = True
+) -> None:
+    """
+    Remember identifiers OpenAlex rejected or has no work for, so that syncs don't keep requesting them.
+
+    Args:
+        conn: SQLite database connection
+        identifiers: Dict mapping identifier -> reason
+        kind: 'doi' or 'openalex_id'
+        commit: Commit the transaction
+    """
+    if not identifiers:
+        return
+    now = datetime.now().isoformat()
+    conn.executemany("""
+        INSERT INTO openalex_bad_identifiers (identifier, kind, reason, first_seen, last_seen)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(identifier) DO UPDATE SET reason = excluded.reason, last_seen = excluded.last_seen
+    """, [(identifier, kind, reason, now, now) for identifier, reason in identifiers.items()])
+    if commit:
+        conn.commit()
+
+
+def get_bad_identifiers(
+    conn: sqlite3.Connection,
+    kind: str,
+    max_age_days: int = BAD_IDENTIFIER_RETRY_DAYS
+) -> Set[str]:
+    """Get the identifiers of this kind recorded as bad within the last max_age_days days."""
+    since = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+    cursor = conn.execute(
+        "SELECT identifier FROM openalex_bad_identifiers WHERE kind = ? AND last_seen >= ?",
+        (kind, since)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _record_report_failures(conn: sqlite3.Connection, report, kind: str) -> None:
+    """
+    Record the identifiers of a BatchFetchReport that OpenAlex rejected or confirmed it does not have. Failed
+    requests, and values only absent from their batch, are not recorded.
+    """
+    bad = dict(report.invalid)
+    bad.update({identifier: 'not found' for identifier in report.not_found})
+    record_bad_identifiers(conn, bad, kind, commit=False)
+
+
+def get_cache_status(conn: sqlite3.Connection, zotero_keys: List[str]) -> Dict[str, Tuple[Optional[str], bool]]:
+    """
+    Get the cache status of Zotero items with a single query, passing the keys as a JSON array.
+
+    Args:
+        conn: SQLite database connection
+        zotero_keys: Keys of the Zotero items
+
+    Returns:
+        Dict mapping zotero_key -> (mapped OpenAlex work ID or None, whether the work is cached)
+    """
+    cursor = conn.execute("""
+        SELECT k.value, m.openalex_work_id,
+               EXISTS (SELECT 1 FROM works w WHERE w.id = m.openalex_work_id)
+        FROM json_each(?) k
+        LEFT JOIN zotero_openalex_mapping m ON m.zotero_key = k.value
+    """, (json.dumps(zotero_keys),))
+    return {zotero_key: (openalex_id, bool(cached)) for zotero_key, openalex_id, cached in cursor}
+
+
 def fetch_and_cache_works(
     conn: sqlite3.Connection,
-    zotero_items: List[dict]
+    zotero_items: List[dict],
+    writer: Optional[WriterFactory] = None
 ) -> Dict[str, dict]:
     """
     Fetch OpenAlex works for Zotero items and cache in SQLite.
 
     Args:
-        conn: SQLite database connection
+        conn: SQLite database connection to read the cache from
         zotero_items: List of item dicts with 'doi' and 'zotero_key'
+        writer: Lends the writer connection for each write, which is not held while fetching. None to write
+            through conn.
 
     Returns:
         Dict mapping zotero_key -> work_info dict with openalex_work_id
     """
-    cursor = conn.cursor()
+    writer = writer or lend_connection(conn)
     result = {}
 
     # Check which items are already cached
     dois_to_fetch = []
     work_ids_needing_refs = []  # Work IDs that need referenced_works fetched
     cached_count = 0
+    bad_dois = get_bad_identifiers(conn, 'doi')
+    bad_work_ids = get_bad_identifiers(conn, 'openalex_id')
+    skipped_count = 0
 
-    for item in zotero_items:
-        zotero_key = item['zotero_key']
-        doi = item.get('doi')
-
-        if not doi:
-            continue
+    items_with_dois = [item for item in zotero_items if item.get('doi')]
+    cache_status = get_cache_status(conn, [item['zotero_key'] for item in items_with_dois])
 
-        # Check cache first
-        cursor.execute(
-            "SELECT openalex_work_id FROM zotero_openalex_mapping WHERE zotero_key = ?",
-            (zotero_key,)
-        )
-        row = cursor.fetchone()
-
-        if row and row[0]:
-            openalex_id = row[0]
-
-            # Check if the work exists in the works table (fully cached)
-            cursor.execute(
-                "SELECT COUNT(*) FROM works WHERE id = ?",
-                (openalex_id,)
-            )
-            work_exists = cursor.fetchone()[0] > 0
+    for item in items_with_dois:
+        zotero_key = item['zotero_key']
+        doi = item['doi']
+        openalex_id, work_exists = cache_status.get(zotero_key, (None, False))
 
+        if openalex_id:
             if work_exists:
                 # Fully cached - use cached data
                 cached_count += 1
@@ -152,113 +224,128 @@ def fetch_and_cache_works(
                     'year': item.get('year'),
                     'in_library': True,
                 }
+            elif openalex_id in bad_work_ids:
+                skipped_count += 1
             else:
                 # Mapping exists but work data missing - need to fetch
                 work_ids_needing_refs.append((zotero_key, doi, item, openalex_id))
+        elif normalize_doi(doi) in bad_dois:
+            skipped_count += 1
         else:
             dois_to_fetch.append((zotero_key, doi, item))
 
     # Report cache status
-    total_with_dois = len([i for i in zotero_items if i.get('doi')])
-    print(f"Cache status: {cached_count}/{total_with_dois} items fully cached")
+    print(f"Cache status: {cached_count}/{len(items_with_dois)} items fully cached")
 
     if work_ids_needing_refs:
         print(f"  {len(work_ids_needing_refs)} items have mapping but need work data")
     if dois_to_fetch:
         print(f"  {len(dois_to_fetch)} items need to be fetched from OpenAlex")
+    if skipped_count:
+        print(f"  {skipped_count} items skipped (DOI or OpenAlex ID recently rejected or not found by OpenAlex)")
 
     # Batch fetch missing works from OpenAlex
     if dois_to_fetch:
         dois_only = [d[1] for d in dois_to_fetch]
         print(f"Fetching {len(dois_only)} works from OpenAlex by DOI...")
-        works = get_works_by_dois(dois_only)
+        report = get_works_by_dois_report(dois_only)
+        print(f"  Resolved {len(report.resolved)}, missing {len(report.missing)}, errored {len(report.errored)}")
 
-        # Create lookup by normalized DOI
-        works_by_doi = {}
-        for work in works:
-            work_doi = work.get('doi', '')
-            if work_doi:
-                normalized = normalize_doi(work_doi)
-                works_by_doi[normalized] = work
+        # Lookup by the normalized DOI that was requested
+        works_by_doi = report.resolved
 
         # Match and cache
         now = datetime.now().isoformat()
-        for zotero_key, doi, item in dois_to_fetch:
-            work = works_by_doi.get(doi)
-            if work:
-                openalex_id = remove_base_url(work.get('id', ''))
-
-                # Cache the mapping
-                cursor.execute("""
-                    INSERT OR REPLACE INTO zotero_openalex_mapping
-                    (zotero_key, openalex_work_id, doi, title, last_updated)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (zotero_key, openalex_id, doi, item['title'], now))
-
-                # Cache the work data (including referenced_works)
-                try:
-                    work_obj = Work(work)
-                    work_obj.insert_or_replace_in_db(conn)
-                    print(f"  Fetched & cached: {openalex_id} ({len(work.get('referenced_works', []))} refs)")
-                except Exception as e:
-                    print(f"  Error caching work {openalex_id}: {e}")
-
-                result[zotero_key] = {
-                    'openalex_work_id': openalex_id,
-                    'doi': doi,
-                    'title': work.get('title', item['title']),
-                    'authors': item['authors'],
-                    'year': work.get('publication_year') or item.get('year'),
-                    'in_library': True,
-                }
-
-        conn.commit()
+        with writer() as write_conn:
+            _record_report_failures(write_conn, report, 'doi')
+            batch_writer = WorkBatchWriter(write_conn, commit=False)
+            for zotero_key, doi, item in dois_to_fetch:
+                work = works_by_doi.get(doi)
+                if work:
+                    openalex_id = remove_base_url(work.get('id', ''))
+
+                    # Cache the mapping
+                    write_conn.execute("""
+                        INSERT OR REPLACE INTO zotero_openalex_mapping
+                        (zotero_key, openalex_work_id, doi, title, last_updated)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (zotero_key, openalex_id, doi, item['title'], now))
+
+                    # Cache the work data (including referenced_works)
+                    try:
+                        batch_writer.add(work)
+                        print(f"  Fetched & cached: {openalex_id} ({len(work.get('referenced_works', []))} refs)")
+                    except Exception as e:
+                        print(f"  Error caching work {openalex_id}: {e}")
+
+                    result[zotero_key] = {
+                        'openalex_work_id': openalex_id,
+                        'doi': doi,
+                        'title': work.get('title', item['title']),
+                        'authors': item['authors'],
+                        'year': work.get('publication_year') or item.get('year'),
+                        'in_library': True,
+                    }
+
+            batch_writer.flush()
+            write_conn.commit()
 
     # Fetch referenced works for cached items that don't have them
     if work_ids_needing_refs:
         print(f"Fetching work data for {len(work_ids_needing_refs)} items with incomplete cache...")
         ids_to_fetch = [item[3] for item in work_ids_needing_refs]
-        works = get_works_by_ids(ids_to_fetch)
-
-        # Create lookup by work ID
-        works_by_id = {remove_base_url(w.get('id', '')): w for w in works}
-
-        for zotero_key, doi, item, openalex_id in work_ids_needing_refs:
-            work = works_by_id.get(openalex_id)
-            if work:
-                try:
-                    work_obj = Work(work)
-                    work_obj.insert_or_replace_in_db(conn)
-                except Exception as e:
-                    print(f"Error caching work {openalex_id}: {e}")
-
-                # Add to result
-                result[zotero_key] = {
-                    'openalex_work_id': openalex_id,
-                    'doi': doi,
-                    'title': work.get('title', item['title']),
-                    'authors': item['authors'],
-                    'year': work.get('publication_year') or item.get('year'),
-                    'in_library': True,
-                }
-
-        conn.commit()
-        print(f"  Fetched and cached {len(works)} works")
+        report = get_works_by_ids_report(ids_to_fetch)
+
+        # Lookup by the work ID that was requested
+        works_by_id = report.resolved
+
+        with writer() as write_conn:
+            _record_report_failures(write_conn, report, 'openalex_id')
+            batch_writer = WorkBatchWriter(write_conn, commit=False)
+            for zotero_key, doi, item, openalex_id in work_ids_needing_refs:
+                work = works_by_id.get(openalex_id)
+                if work:
+                    try:
+                        batch_writer.add(work)
+                    except Exception as e:
+                        print(f"Error caching work {openalex_id}: {e}")
+
+                    # Add to result
+                    result[zotero_key] = {
+                        'openalex_work_id': openalex_id,
+                        'doi': doi,
+                        'title': work.get('title', item['title']),
+                        'authors': item['authors'],
+                        'year': work.get('publication_year') or item.get('year'),
+                        'in_library': True,
+                    }
+
+            batch_writer.flush()
+            write_conn.commit()
+        print(f"  Fetched and cached {len(report.resolved)} works ({len(report.missing)} missing, {len(report.errored)} errored)")
 
     return result
 
 
 def get_referenced_works_from_cache(
     conn: sqlite3.Connection,
-    work_id: str
+    work_id: str,
+    graph: Optional[CitationGraph] = None
 ) -> List[str]:
-    """Get works referenced by this work from cache."""
+    """
+    Get works referenced by this work from cache.
+
+    With a graph, its in-memory edges are used instead of the database; they also include the citations
+    cached from the other side in works_cited_by.
+    """
+    if graph is not None:
+        return graph.references(work_id)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT referenced_work_id FROM works_referenced_works WHERE work_id = ?",
-        (work_id,)
+        (work_id_to_int(work_id),)
     )
-    return [row[0] for row in cursor.fetchall()]
+    return [int_to_work_id(row[0]) for row in cursor.fetchall()]
 
 
 def get_citing_works_from_cache(
@@ -269,38 +356,187 @@ def get_citing_works_from_cache(
     cursor = conn.cursor()
     cursor.execute(
         "SELECT citing_work_id FROM works_cited_by WHERE work_id = ?",
-        (work_id,)
+        (work_id_to_int(work_id),)
     )
-    return [row[0] for row in cursor.fetchall()]
+    return [int_to_work_id(row[0]) for row in cursor.fetchall()]
+
+
+def reset_citation_cache(conn: sqlite3.Connection, commit: bool = True) -> None:
+    """
+    Forget the Zotero -> OpenAlex mapping and the cached citations, so the next sync fetches them again.
+
+    The works' content hashes are cleared too: they describe rows that are gone, and would otherwise make
+    the next sync skip the works' references as unchanged.
+    """
+    conn.execute("DELETE FROM zotero_openalex_mapping")
+    conn.execute("DELETE FROM works_referenced_works")
+    conn.execute("DELETE FROM works_cited_by")
+    conn.execute("DELETE FROM works_content_hashes")
+    notify_edge_listeners(conn, 'edges_cleared')
+    if commit:
+        conn.commit()
 
 
 def cache_citing_works(
     conn: sqlite3.Connection,
     work_id: str,
-    citing_work_ids: List[str]
+    citing_work_ids: List[str],
+    commit: bool = True
 ) -> None:
     """Cache citing works in the database."""
-    cursor = conn.cursor()
     now = datetime.now().isoformat()
-    for citing_id in citing_work_ids:
-        cursor.execute("""
-            INSERT OR REPLACE INTO works_cited_by
-            (work_id, citing_work_id, fetched_date)
-            VALUES (?, ?, ?)
-        """, (work_id, citing_id, now))
-    conn.commit()
+    work_number = work_id_to_int(work_id)
+    citing_numbers = [number for number in map(work_id_to_int, citing_work_ids) if number is not None]
+    conn.executemany("""
+        INSERT OR REPLACE INTO works_cited_by
+        (work_id, citing_work_id, fetched_date)
+        VALUES (?, ?, ?)
+    """, [(work_number, citing_number, now) for citing_number in citing_numbers])
+    notify_edge_listeners(conn, 'citations_added', work_number, citing_numbers)
+    if commit:
+        conn.commit()
+
+
+def get_citing_fetch_state(conn: sqlite3.Connection, work_id: str) -> Optional[dict]:
+    """
+    Get the saved progress of the "cited by" fetch for a work.
+
+    Returns:
+        Dict with 'next_cursor', 'fetched_count' and 'complete', or None if never fetched
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT next_cursor, fetched_count FROM works_cited_by_fetch_state WHERE work_id = ?",
+        (work_id,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {
+        'next_cursor': row[0],
+        'fetched_count': row[1] or 0,
+        'complete': row[0] is None,
+    }
+
+
+def stream_citing_works_to_cache(
+    conn: sqlite3.Connection,
+    work_id: str,
+    max_works: Optional[int] = None,
+    per_page: int = 200,
+    stub: bool = False,
+    writer: Optional[WriterFactory] = None
+) -> Iterator[List[str]]:
+    """
+    Fetch the works citing a work page by page, writing each page through to the cache.
+
+    Each page is stored in works_cited_by and works, together with the next cursor, in a single
+    transaction. An interrupted fetch therefore resumes from the last stored page.
+
+    Args:
+        conn: SQLite database connection to read the fetch state from
+        work_id: OpenAlex work ID whose citing works to fetch
+        max_works: Stop after this many citing works have been fetched in this call (None for all)
+        per_page: Number of citing works requested per page (1-200)
+        stub: Only fetch and store the display fields of the citing works (see STUB_WORK_FIELDS)
+        writer: Lends the writer connection for each page, which is not held while fetching. None to write
+            through conn.
+
+    Yields:
+        List of citing work IDs for each page, as it is cached
+    """
+    writer = writer or lend_connection(conn)
+    state = get_citing_fetch_state(conn, work_id) or {'next_cursor': '*', 'fetched_count': 0, 'complete': False}
+    if state['complete']:
+        return
+
+    fetched_count = state['fetched_count']
+    fetched_this_call = 0
+    select = STUB_WORK_FIELDS if stub else None
+    for page, next_cursor in iter_citing_works_pages(work_id, per_page=per_page, cursor=state['next_cursor'], select=select):
+        citing_ids = [remove_base_url(w.get('id', '')) for w in page]
+        fetched_count += len(citing_ids)
+        fetched_this_call += len(citing_ids)
+
+        with writer() as write_conn, write_conn:
+            batch_writer = WorkBatchWriter(write_conn, commit=False)
+            for work in page:
+                try:
+                    if stub:
+                        Work(work).insert_stub_in_db(write_conn, commit=False)
+                    else:
+                        batch_writer.add(work)
+                except Exception as e:
+                    print(f"  Error caching citing work {work.get('id')}: {e}")
+            batch_writer.flush()
+            cache_citing_works(write_conn, work_id, citing_ids, commit=False)
+            write_conn.execute("""
+                INSERT OR REPLACE INTO works_cited_by_fetch_state
+                (work_id, next_cursor, fetched_count, updated_date)
+                VALUES (?, ?, ?, ?)
+            """, (work_id, next_cursor, fetched_count, datetime.now().isoformat()))
+
+        yield citing_ids
+
+        if max_works is not None and fetched_this_call >= max_works:
+            break
+
+
+def upgrade_stub_works(
+    conn: sqlite3.Connection,
+    work_ids: List[str],
+    writer: Optional[WriterFactory] = None
+) -> int:
+    """
+    Replace the cached stubs among the given works with full records from OpenAlex.
+
+    Args:
+        conn: SQLite database connection to read the cache from
+        work_ids: OpenAlex work IDs that need their full record (references, locations, ...)
+        writer: Lends the writer connection once the works are fetched. None to write through conn.
+
+    Returns:
+        Number of works upgraded
+    """
+    if not work_ids:
+        return 0
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(work_ids))
+    cursor.execute(
+        f"SELECT id FROM works WHERE fetch_tier = ? AND id IN ({placeholders})",
+        (FETCH_TIER_STUB, *work_ids)
+    )
+    stub_ids = [row[0] for row in cursor.fetchall()]
+    if not stub_ids:
+        return 0
+
+    print(f"  Upgrading {len(stub_ids)} stub works to full records...")
+    works = get_works_by_ids_coalesced(stub_ids)
+    with (writer or lend_connection(conn))() as write_conn, WorkBatchWriter(write_conn) as batch_writer:
+        for work in works:
+            try:
+                batch_writer.add(work)
+            except Exception as e:
+                print(f"  Error upgrading work {work.get('id')}: {e}")
+    return batch_writer.written
 
 
 def build_library_graph(
     conn: sqlite3.Connection,
-    zotero_items_map: Dict[str, dict]
+    zotero_items_map: Dict[str, dict],
+    graph: Optional[CitationGraph] = None
 ) -> dict:
     """
     Build the initial graph with library items and edges between them.
 
+    Library nodes with a stored centrality (see centrality.update_centrality) carry it in 'centrality',
+    for sizing and filtering them.
+
     Args:
         conn: SQLite database connection
         zotero_items_map: Dict from zotero_key -> work_info
+        graph: In-memory citation graph giving the edges between library items in one array operation,
+            instead of reading the references of each item from the database
 
     Returns:
         Dict with 'nodes', 'edges', and 'library_ids'
@@ -327,19 +563,33 @@ def build_library_graph(
                 'nodeType': 'library',
             })
 
+    centrality = get_work_centrality(conn, list(library_work_ids))
+    for node in nodes:
+        if node['id'] in centrality:
+            node['centrality'] = centrality[node['id']]
+
     # Find edges between library items
     # Check which library items reference other library items
     total_refs = 0
-    for work_id in library_work_ids:
-        referenced = get_referenced_works_from_cache(conn, work_id)
-        total_refs += len(referenced)
-        for ref_id in referenced:
-            if ref_id in library_work_ids:
-                edges.append({
-                    'source': work_id,
-                    'target': ref_id,
-                    'type': 'cites',
-                })
+    if graph is not None:
+        total_refs = sum(n_refs for n_refs, _ in graph.degrees(list(library_work_ids)).values())
+        for work_id, ref_id in graph.subgraph_edges(library_work_ids):
+            edges.append({
+                'source': work_id,
+                'target': ref_id,
+                'type': 'cites',
+            })
+    else:
+        for work_id in library_work_ids:
+            referenced = get_referenced_works_from_cache(conn, work_id)
+            total_refs += len(referenced)
+            for ref_id in referenced:
+                if ref_id in library_work_ids:
+                    edges.append({
+                        'source': work_id,
+                        'target': ref_id,
+                        'type': 'cites',
+                    })
 
     print(f"Found {total_refs} total references across {len(library_work_ids)} library items")
     print(f"Found {len(edges)} edges between library items")
@@ -356,27 +606,36 @@ def get_external_connections(
     work_id: str,
     library_work_ids: Set[str],
     max_refs: int = 20,
-    max_citing: int = 20
+    max_citing: int = 20,
+    graph: Optional[CitationGraph] = None,
+    writer: Optional[WriterFactory] = None
 ) -> dict:
     """
     Get external references and citations for a work.
 
     Args:
-        conn: SQLite database connection
+        conn: SQLite database connection to read the cache from
         work_id: OpenAlex work ID to expand
         library_work_ids: Set of work IDs already in library
         max_refs: Maximum referenced works to return
         max_citing: Maximum citing works to return
+        graph: In-memory citation graph to read the references from (see get_referenced_works_from_cache)
+        writer: Lends the writer connection for each write, which is not held while fetching. None to write
+            through conn.
 
     Returns:
         Dict with 'nodes' and 'edges' for external connections
     """
+    writer = writer or lend_connection(conn)
     nodes = []
     edges = []
     seen_ids = set()
 
+    # A stub has no references cached yet
+    upgrade_stub_works(conn, [work_id], writer)
+
     # Get referenced works (what this paper cites)
-    referenced = get_referenced_works_from_cache(conn, work_id)
+    referenced = get_referenced_works_from_cache(conn, work_id, graph)
 
     # Filter to external only and limit
     external_refs = [r for r in referenced if r not in library_work_ids][:max_refs]
@@ -385,23 +644,15 @@ def get_external_connections(
     citing_cached = get_citing_works_from_cache(conn, work_id)
 
     if not citing_cached:
-        # Fetch from API
-        citing_works = get_citing_works(work_id, limit=max_citing)
-        citing_ids = [remove_base_url(w.get('id', '')) for w in citing_works]
-
-        # Cache for future use
-        cache_citing_works(conn, work_id, citing_ids)
-
-        # Also cache minimal work info for these
-        for work in citing_works:
-            try:
-                work_obj = Work(work)
-                work_obj.insert_or_replace_in_db(conn)
-            except Exception:
-                pass
-        conn.commit()
-
-        citing_cached = citing_ids
+        # Fetch the first page from the API, caching the citing works and the cursor
+        try:
+            pages = stream_citing_works_to_cache(
+                conn, work_id, max_works=max_citing, per_page=min(max(max_citing, 1), 200), stub=True, writer=writer
+            )
+            for citing_ids in pages:
+                citing_cached.extend(citing_ids)
+        except Exception as e:
+            print(f"Error fetching citing works for {work_id}: {e}")
 
     # Filter to external only and limit
     external_citing = [c for c in citing_cached if c not in library_work_ids][:max_citing]
@@ -422,24 +673,30 @@ def get_external_connections(
             work_details[ext_id] = {
                 'title': row[0] or 'Unknown Title',
                 'year': row[1],
+                'authors': get_authors_for_work(conn, ext_id),
             }
 
-    # Fetch missing details from API
+    # Fetch missing details from API, only the fields needed for display
     missing_ids = [i for i in all_external_ids if i not in work_details]
-    if missing_ids:
-        fetched_works = get_works_by_ids(missing_ids)
+    fetched_works = get_works_by_ids_coalesced(missing_ids, stub=True) if missing_ids else []
+    for work in fetched_works:
+        ext_id = remove_base_url(work.get('id', ''))
+        work_details[ext_id] = {
+            'title': work.get('title', 'Unknown Title'),
+            'year': work.get('publication_year'),
+            'authors': extract_authors_from_work(work),
+        }
+
+    with writer() as write_conn:
+        # Cache them as stubs
         for work in fetched_works:
-            ext_id = remove_base_url(work.get('id', ''))
-            work_details[ext_id] = {
-                'title': work.get('title', 'Unknown Title'),
-                'year': work.get('publication_year'),
-            }
-            # Cache it
             try:
-                work_obj = Work(work)
-                work_obj.insert_or_replace_in_db(conn)
+                Work(work).insert_stub_in_db(write_conn, commit=False)
             except Exception:
                 pass
+        # The works shown are the most recently used, so they are evicted last
+        touch_works(write_conn, all_external_ids, commit=False)
+        write_conn.commit()
 
     # Build external nodes
     for ext_id in all_external_ids:
@@ -449,7 +706,7 @@ def get_external_connections(
                 'id': ext_id,
                 'title': details.get('title', 'Unknown Title'),
                 'year': details.get('year'),
-                'authors': '',
+                'authors': details.get('authors', ''),
                 'nodeType': 'external',
             })
             seen_ids.add(ext_id)
@@ -495,8 +752,7 @@ def get_work_details(conn: sqlite3.Connection, work_id: str) -> Optional[dict]:
         }
 
     # Fetch from API
-    from ..OpenAlexAPI.works import get_work_by_id
-    work = get_work_by_id(work_id)
+    work = get_work_by_id_coalesced(work_id)
     if work:
         return {
             'id': work_id,
@@ -508,6 +764,65 @@ def get_work_details(conn: sqlite3.Connection, work_id: str) -> Optional[dict]:
     return None
 
 
+def fts_match_query(query: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 MATCH expression: every word must match, the last one as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the text are searched for literally.
+
+    Returns:
+        The MATCH expression, or None if the text has no words
+    """
+    words = re.findall(r'\w+', query or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_works(conn: sqlite3.Connection, query: str, limit: int = 20) -> List[dict]:
+    """
+    Full-text search of the titles and abstracts of cached works, library and external.
+
+    Args:
+        conn: SQLite database connection
+        query: Free text, e.g. "gait variab"
+        limit: Maximum number of results
+
+    Returns:
+        List of work dicts, best match first, with a highlighted 'snippet' and whether the work is 'in_library'
+    """
+    match = fts_match_query(query)
+    if match is None:
+        return []
+
+    cursor = conn.cursor()
+    # Title matches weigh more than abstract matches
+    cursor.execute("""
+        SELECT w.id, w.title, w.publication_year, w.doi,
+               snippet(works_fts, -1, '<b>', '</b>', '...', 16),
+               EXISTS (SELECT 1 FROM zotero_openalex_mapping m WHERE m.openalex_work_id = w.id)
+        FROM works_fts
+        JOIN works w ON w.id = 'W' || works_fts.rowid
+        WHERE works_fts MATCH ?
+        ORDER BY bm25(works_fts, 10.0, 1.0)
+        LIMIT ?
+    """, (match, limit))
+
+    return [
+        {
+            'id': row[0],
+            'title': row[1],
+            'year': row[2],
+            'doi': row[3],
+            'snippet': row[4],
+            'in_library': bool(row[5]),
+        }
+        for row in cursor.fetchall()
+    ]
+
+
 def get_authors_for_work(conn: sqlite3.Connection, work_id: str) -> str:
     """Get formatted author string for a work from the database."""
     cursor = conn.cursor()
@@ -568,24 +883,33 @@ def extract_authors_from_work(work: dict) -> str:
 def get_item_citations(
     conn: sqlite3.Connection,
     work_id: str,
-    library_work_ids: Set[str]
+    library_work_ids: Set[str],
+    graph: Optional[CitationGraph] = None,
+    writer: Optional[WriterFactory] = None
 ) -> dict:
     """
     Get all works cited by a specific item.
 
     Args:
-        conn: SQLite database connection
+        conn: SQLite database connection to read the cache from
         work_id: OpenAlex work ID of the item
         library_work_ids: Set of work IDs in the user's library
+        graph: In-memory citation graph to read the references from (see get_referenced_works_from_cache)
+        writer: Lends the writer connection for each write, which is not held while fetching. None to write
+            through conn.
 
     Returns:
         Dict with 'nodes' and 'edges' for the citation graph
     """
+    writer = writer or lend_connection(conn)
     nodes = []
     edges = []
 
+    # A stub has no references cached yet
+    upgrade_stub_works(conn, [work_id], writer)
+
     # Get referenced works from cache
-    referenced = get_referenced_works_from_cache(conn, work_id)
+    referenced = get_referenced_works_from_cache(conn, work_id, graph)
 
     if not referenced:
         return {'nodes': [], 'edges': []}
@@ -619,7 +943,7 @@ def get_item_citations(
     # Fetch works that are missing entirely
     if missing_ids:
         print(f"  Fetching details for {len(missing_ids)} external works...")
-        fetched_works = get_works_by_ids(missing_ids)
+        fetched_works = get_works_by_ids_coalesced(missing_ids, stub=True)
 
         for work in fetched_works:
             ext_id = remove_base_url(work.get('id', ''))
@@ -629,14 +953,15 @@ def get_item_citations(
                 'year': work.get('publication_year'),
                 'authors': authors,
             }
-            # Cache the work for future use
-            try:
-                work_obj = Work(work)
-                work_obj.insert_or_replace_in_db(conn)
-            except Exception:
-                pass
 
-        conn.commit()
+        # Cache stubs of the works for future use
+        with writer() as write_conn:
+            for work in fetched_works:
+                try:
+                    Work(work).insert_stub_in_db(write_conn, commit=False)
+                except Exception:
+                    pass
+            write_conn.commit()
 
         # Fill in any still-missing works
         for ref_id in missing_ids:
@@ -650,24 +975,28 @@ def get_item_citations(
     # Fetch works that are cached but missing author data
     if missing_authors_ids:
         print(f"  Fetching author data for {len(missing_authors_ids)} cached works...")
-        fetched_works = get_works_by_ids(missing_authors_ids)
+        fetched_works = get_works_by_ids_coalesced(missing_authors_ids)
 
-        for work in fetched_works:
-            ext_id = remove_base_url(work.get('id', ''))
-            authors = extract_authors_from_work(work)
+        with writer() as write_conn:
+            batch_writer = WorkBatchWriter(write_conn)
+            for work in fetched_works:
+                ext_id = remove_base_url(work.get('id', ''))
+                authors = extract_authors_from_work(work)
 
-            # Update work_details with the fetched authors
-            if ext_id in work_details:
-                work_details[ext_id]['authors'] = authors
+                # Update work_details with the fetched authors
+                if ext_id in work_details:
+                    work_details[ext_id]['authors'] = authors
 
-            # Update the cache with author data
-            try:
-                work_obj = Work(work)
-                work_obj.insert_or_replace_in_db(conn)
-            except Exception:
-                pass
+                # Update the cache with author data
+                try:
+                    batch_writer.add(work)
+                except Exception:
+                    pass
 
-        conn.commit()
+            batch_writer.flush()
+
+    with writer() as write_conn:
+        touch_works(write_conn, referenced)
 
     # Build nodes for referenced works
     for ref_id in referenced:
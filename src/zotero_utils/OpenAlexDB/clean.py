@@ -1,5 +1,7 @@
 
 
+from typing import Optional
+
 REPLACEMENTS = {
     "'": "\"", 
     "True": ''' "True" ''',
@@ -18,4 +20,22 @@ def remove_base_url(string: str, base_url: str = "https://openalex.org/") -> str
     """
     Removes the base URL from a string.
     """
-    return string.replace(base_url, "")
\ No newline at end of file
+    return string.replace(base_url, "")
+
+
+def work_id_to_int(work_id: str) -> Optional[int]:
+    """
+    The number of an OpenAlex work ID, e.g. 123 for "W123" or "https://openalex.org/W123".
+
+    The citation edge tables and works_fts key works by this number instead of the ID string.
+    Returns None if the ID is not a work ID.
+    """
+    work_id = remove_base_url(work_id or '')
+    if work_id[:1].upper() == 'W' and work_id[1:].isdigit():
+        return int(work_id[1:])
+    return None
+
+
+def int_to_work_id(number: int) -> str:
+    """The OpenAlex work ID (without base URL) of a number stored by work_id_to_int(), e.g. "W123" for 123."""
+    return f"W{number}"
@@ -21,10 +21,12 @@ class Concept:
         """
         if not isinstance(concept_ids, list):
             concept_ids = [concept_ids]
-        pyalexConcepts = pyalex.Concepts().get([concept_ids])
+        from zotero_utils.OpenAlexDB.get_items_from_api import get_entities_by_id
+        pyalexConcepts = get_entities_by_id(concept_ids).get('C', [])
         concepts = [Concept(c) for c in pyalexConcepts]
         for concept in concepts:
-            concept.insert_or_replace_in_db(conn)
+            concept.insert_or_replace_in_db(conn, commit=False)
+        conn.commit()
         return concepts
 
     @staticmethod
@@ -60,48 +62,50 @@ class Concept:
         conn.execute("DELETE FROM concepts_ids WHERE concept_id=?", (concept_id,))      
         conn.execute("DELETE FROM concepts_related_concepts WHERE concept_id=?", (concept_id,))   
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    def insert_or_replace_in_db(self, conn: sqlite3.Connection, commit: bool = True):
         """
-        REPLACE the concept in the database.
+        REPLACE the concept in the database. Uses defensive .get() access for all fields.
         """
         concept = self.concept
+        concept_id = self.concept_id
         # CONCEPTS
-        insert_tuple = (remove_base_url(concept['id']), concept['wikidata'], concept['display_name'], concept['level'], concept['description'], concept['works_count'], concept['cited_by_count'], concept['image_url'], concept['image_thumbnail_url'], concept['works_api_url'], concept['updated_date'])
+        insert_tuple = (concept_id, concept.get('wikidata'), concept.get('display_name'), concept.get('level'), concept.get('description'), concept.get('works_count'), concept.get('cited_by_count'), concept.get('image_url'), concept.get('image_thumbnail_url'), concept.get('works_api_url'), concept.get('updated_date'))
         question_marks = ', '.join(['?'] * len(insert_tuple))
         conn.execute(
             f"REPLACE INTO concepts (id, wikidata, display_name, level, description, works_count, cited_by_count, image_url, image_thumbnail_url, works_api_url, updated_date) VALUES ({question_marks})", insert_tuple
         )
 
         # CONCEPTS_ANCESTORS
-        for ancestor in concept['ancestors']:
-            insert_tuple = (remove_base_url(ancestor['id']), remove_base_url(concept['id']))
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO concepts_ancestors (ancestor_id, concept_id) VALUES ({question_marks})", insert_tuple
-            )
-        
+        conn.execute("DELETE FROM concepts_ancestors WHERE concept_id=?", (concept_id,))
+        for ancestor in concept.get('ancestors') or []:
+            if ancestor.get('id'):
+                conn.execute(
+                    "INSERT INTO concepts_ancestors (ancestor_id, concept_id) VALUES (?, ?)", (remove_base_url(ancestor['id']), concept_id)
+                )
+
         # CONCEPTS_COUNTS_BY_YEAR
-        for year in concept['counts_by_year']:
-            insert_tuple = (remove_base_url(concept['id']), year['year'], year['works_count'], year['cited_by_count'], year['oa_works_count'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
+        conn.execute("DELETE FROM concepts_counts_by_year WHERE concept_id=?", (concept_id,))
+        for year in concept.get('counts_by_year') or []:
+            insert_tuple = (concept_id, year.get('year'), year.get('works_count'), year.get('cited_by_count'), year.get('oa_works_count'))
             conn.execute(
-                f"REPLACE INTO concepts_counts_by_year (concept_id, year, works_count, cited_by_count, oa_works_count) VALUES ({question_marks})", insert_tuple
+                "REPLACE INTO concepts_counts_by_year (concept_id, year, works_count, cited_by_count, oa_works_count) VALUES (?, ?, ?, ?, ?)", insert_tuple
             )
 
         # CONCEPTS_IDS
-        for id in concept['ids']:
-            insert_tuple = (remove_base_url(concept['id']), concept['openalex'], concept['wikidata'], concept['wikipedia'], concept['umls_aui'], concept['umls_cui'], concept['mag'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO concepts_ids (concept_id, openalex, wikidata, wikipedia, umls_aui, umls_cui, mag) VALUES ({question_marks})", insert_tuple
-            )
+        ids = concept.get('ids') or {}
+        insert_tuple = (concept_id, ids.get('openalex'), ids.get('wikidata'), ids.get('wikipedia'), json.dumps(ids.get('umls_aui') or []), json.dumps(ids.get('umls_cui') or []), ids.get('mag'))
+        conn.execute(
+            "REPLACE INTO concepts_ids (concept_id, openalex, wikidata, wikipedia, umls_aui, umls_cui, mag) VALUES (?, ?, ?, ?, ?, ?, ?)", insert_tuple
+        )
 
         # CONCEPTS_RELATED_CONCEPTS
-        for related_concept in concept['related_concepts']:
-            insert_tuple = (remove_base_url(related_concept['id']), remove_base_url(concept['id']))
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO concepts_related_concepts (related_concept_id, concept_id) VALUES ({question_marks})", insert_tuple
-            )
+        conn.execute("DELETE FROM concepts_related_concepts WHERE concept_id=?", (concept_id,))
+        for related_concept in concept.get('related_concepts') or []:
+            if related_concept.get('id'):
+                conn.execute(
+                    "INSERT INTO concepts_related_concepts (related_concept_id, concept_id, score) VALUES (?, ?, ?)",
+                    (remove_base_url(related_concept['id']), concept_id, related_concept.get('score'))
+                )
 
-        conn.commit()
\ No newline at end of file
+        if commit:
+            conn.commit()
@@ -0,0 +1,185 @@
+"""
+Tuned SQLite connections to openalex.db: one writer, a pool of read-only readers.
+
+The database is switched to WAL mode, in which readers never block the writer and the writer never blocks
+readers, so graph queries stay fast while a sync is writing. Writes are serialized through the single writer
+connection instead of competing for SQLite's write lock.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Callable, ContextManager, Dict, Iterator, List
+
+DEFAULT_MAX_READERS = 8
+DEFAULT_TIMEOUT = 30  # Seconds to wait for a lock held by another process
+
+# Applied to every connection
+CONNECTION_PRAGMAS = {
+    "synchronous": "NORMAL",  # Safe in WAL mode: a power loss can only lose the last transactions
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # Negative: in KiB, i.e. a 64 MiB page cache
+    "temp_store": "MEMORY",
+}
+
+# Lends the writer connection for one write transaction: `with writer() as conn:`, e.g. OpenAlexConnections.writer.
+# Functions fetching from OpenAlex take one, so that the writer is not held while they wait for the API.
+WriterFactory = Callable[[], ContextManager[sqlite3.Connection]]
+
+
+def lend_connection(conn: sqlite3.Connection) -> WriterFactory:
+    """WriterFactory lending a connection the caller already holds."""
+    return lambda: nullcontext(conn)
+
+
+class OpenAlexConnection(sqlite3.Connection):
+    """
+    Connection running callbacks once the current transaction commits, e.g. to notify the edge listeners of
+    the database (see work.notify_edge_listeners). They are dropped if the transaction is rolled back.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = ''  # Absolute path of the database file, set by connect()
+        self._after_commit: List[Callable[[], None]] = []
+
+    def after_commit(self, callback: Callable[[], None]):
+        """Call `callback` once the current transaction commits."""
+        self._after_commit.append(callback)
+
+    def commit(self):
+        super().commit()
+        self._run_after_commit()
+
+    def rollback(self):
+        super().rollback()
+        self._after_commit.clear()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # `with conn:` commits or rolls back without going through commit() and rollback()
+        result = super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self._run_after_commit()
+        else:
+            self._after_commit.clear()
+        return result
+
+    def _run_after_commit(self):
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+
+def configure_connection(conn: sqlite3.Connection, pragmas: Dict[str, object] = CONNECTION_PRAGMAS) -> sqlite3.Connection:
+    """Apply the performance PRAGMAs to a connection."""
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def connect(path: str, read_only: bool = False, timeout: float = DEFAULT_TIMEOUT) -> sqlite3.Connection:
+    """
+    Open a tuned connection to the database.
+
+    The connection may be used from any thread, but by one thread at a time.
+
+    Args:
+        path: Path of the SQLite file
+        read_only: Open the file read-only
+        timeout: Seconds to wait for a lock held by another connection
+
+    Returns:
+        OpenAlexConnection
+    """
+    if read_only:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=timeout, check_same_thread=False,
+                               factory=OpenAlexConnection)
+    else:
+        conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, factory=OpenAlexConnection)
+        # WAL mode is stored in the database file, so it only has to be set by a writer
+        conn.execute("PRAGMA journal_mode = WAL")
+    conn.path = os.path.abspath(path)
+    return configure_connection(conn)
+
+
+class OpenAlexConnections:
+    """
+    Connection factory handing out one writer connection and a pool of read-only connections.
+
+        connections = OpenAlexConnections(DB_PATH)
+        with connections.reader() as conn:
+            ...
+        with connections.writer() as conn:
+            ...
+    """
+
+    def __init__(self, path: str, max_readers: int = DEFAULT_MAX_READERS, timeout: float = DEFAULT_TIMEOUT):
+        """
+        Args:
+            path: Path of the SQLite file. It must exist (see init_db).
+            max_readers: Maximum number of read-only connections open at once
+            timeout: Seconds to wait for a lock held by another process
+        """
+        self.path = path
+        self.max_readers = max_readers
+        self.timeout = timeout
+        self._writer_lock = threading.RLock()
+        self._writer = None
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_count_lock = threading.Lock()
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow the writer connection. Other threads wanting to write wait until it is returned.
+
+        A transaction left open is rolled back when the connection is returned after an error.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = connect(self.path, timeout=self.timeout)
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection from the pool, waiting for one if max_readers are in use."""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            # End the read transaction, so the connection does not pin an old snapshot of the database
+            conn.rollback()
+            self._readers.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._reader_count_lock:
+            if self._reader_count < self.max_readers:
+                self._reader_count += 1
+                return connect(self.path, read_only=True, timeout=self.timeout)
+        return self._readers.get()
+
+    def close(self):
+        """Close every connection that is not borrowed."""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._reader_count_lock:
+                self._reader_count -= 1
@@ -0,0 +1,113 @@
+"""
+Size-budgeted eviction of external works from openalex.db.
+
+Browsing the citation network caches every external work it shows. To keep the database from growing
+without bound, works record when they were last shown (works.last_accessed), and evict_works() deletes the
+least recently used ones, in batches, once the database uses more than its budget. The library's works and
+the works they reference directly are pinned and never evicted.
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, List
+
+from .work import Work
+
+# Budget of the space used in openalex.db, overridable with the ZOTERO_UTILS_DB_MAX_MB environment variable
+DEFAULT_MAX_DB_BYTES = int(os.environ.get("ZOTERO_UTILS_DB_MAX_MB", "1024")) * 1024 * 1024
+EVICTION_TARGET_RATIO = 0.9  # Evict down to this fraction of the budget, so eviction does not run on every write
+DEFAULT_EVICTION_BATCH_SIZE = 500
+
+
+def touch_works(conn: sqlite3.Connection, work_ids: List[str], commit: bool = True):
+    """
+    Record that works were just accessed, so they are evicted last.
+
+    Args:
+        conn: SQLite database connection (a writer)
+        work_ids: IDs of the works
+        commit: Commit the transaction
+    """
+    now = datetime.now().isoformat()
+    conn.executemany("UPDATE works SET last_accessed = ? WHERE id = ?", [(now, work_id) for work_id in work_ids])
+    if commit:
+        conn.commit()
+
+
+def get_db_used_bytes(conn: sqlite3.Connection) -> int:
+    """Space used by the database's data, i.e. its size without the free pages left by deletions."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return (page_count - freelist_count) * page_size
+
+
+def _create_pinned_works_table(conn: sqlite3.Connection):
+    """Fill the temporary table pinned_works with the library's works and the works they reference."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS pinned_works (id TEXT PRIMARY KEY) WITHOUT ROWID")
+    conn.execute("DELETE FROM pinned_works")
+    conn.execute("""
+        INSERT OR IGNORE INTO pinned_works
+        SELECT openalex_work_id FROM zotero_openalex_mapping WHERE openalex_work_id IS NOT NULL
+        UNION
+        SELECT 'W' || r.referenced_work_id FROM zotero_openalex_mapping m
+        JOIN works_referenced_works r ON r.work_id = CAST(substr(m.openalex_work_id, 2) AS INTEGER)
+    """)
+
+
+def get_eviction_candidates(conn: sqlite3.Connection, limit: int) -> List[str]:
+    """
+    Get the least recently used works that are not pinned, oldest first. Works never accessed come first.
+
+    Requires the pinned_works table of _create_pinned_works_table().
+    """
+    cursor = conn.execute("""
+        SELECT id FROM works
+        WHERE id NOT IN (SELECT id FROM pinned_works)
+        ORDER BY last_accessed
+        LIMIT ?
+    """, (limit,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def evict_works(
+    conn: sqlite3.Connection,
+    max_bytes: int = DEFAULT_MAX_DB_BYTES,
+    batch_size: int = DEFAULT_EVICTION_BATCH_SIZE
+) -> Dict[str, int]:
+    """
+    Evict the least recently used external works, with all their rows, while the database is over budget.
+
+    Does nothing (beyond measuring the database) while the database is within budget. Otherwise works are
+    deleted in batches of batch_size, each in its own transaction, until the database uses less than
+    EVICTION_TARGET_RATIO of the budget or only pinned works remain. The space freed is reused by new
+    rows; the file itself only shrinks on VACUUM.
+
+    Args:
+        conn: SQLite database connection (the single writer)
+        max_bytes: Budget of the space used by the database
+        batch_size: Number of works deleted per transaction
+
+    Returns:
+        Dict with the number of works 'evicted' and the bytes 'used' before and after ('used_before')
+    """
+    used_before = used = get_db_used_bytes(conn)
+    evicted = 0
+    if used <= max_bytes:
+        return {'evicted': 0, 'used_before': used_before, 'used': used}
+
+    target = max_bytes * EVICTION_TARGET_RATIO
+    _create_pinned_works_table(conn)
+    while used > target:
+        work_ids = get_eviction_candidates(conn, batch_size)
+        if not work_ids:
+            print("Cannot evict more works: only pinned works remain")
+            break
+        with conn:
+            evicted += Work.delete_many(conn, work_ids, commit=False)
+        used = get_db_used_bytes(conn)
+    conn.execute("DROP TABLE pinned_works")
+
+    print(f"Evicted {evicted} works: openalex.db uses {used // 1024} KiB (was {used_before // 1024} KiB)")
+    return {'evicted': evicted, 'used_before': used_before, 'used': used}
@@ -0,0 +1,270 @@
+"""
+Budgeted multi-hop expansion of the citation network around a set of seed works.
+
+The neighbourhood is traversed frontier by frontier: the works citing or cited by the current frontier are
+ranked, the best ones kept, and they become the next frontier. The works of a frontier missing from the cache
+are fetched from OpenAlex in one batched call (full records, so their references are known for the next hop;
+stubs on the last hop, which only needs them for display). Budgets cap the number of works returned, the
+OpenAlex requests made and the wall time, so a 2-3 hop neighbourhood comes back in one call at bounded cost.
+
+Citing works are taken from the cache only; fetching a work's "cited by" list costs requests per work (see
+stream_citing_works_to_cache), which the expand-node and fetch-citing-works endpoints do on demand.
+"""
+
+import json
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set
+
+from ..OpenAlexAPI.batch import MAX_IDS_PER_FILTER
+from ..OpenAlexAPI.works import STUB_WORK_FIELDS, get_works_by_ids_report
+from .centrality import get_work_centrality
+from .citation_network import (
+    get_authors_for_work,
+    get_citing_works_from_cache,
+    get_referenced_works_from_cache,
+)
+from .clean import int_to_work_id, work_id_to_int
+from .connection import WriterFactory, lend_connection
+from .eviction import touch_works
+from .graph_engine import CitationGraph
+from .work import FETCH_TIER_STUB, Work, WorkBatchWriter
+
+DEFAULT_HOPS = 2
+DEFAULT_MAX_NODES = 200
+DEFAULT_MAX_API_CALLS = 20
+DEFAULT_MAX_SECONDS = 30.0
+CANDIDATES_PER_NODE = 2  # Neighbours fetched per work the node budget has left, to rank them before cutting
+
+# How neighbours are ranked before the node budget cuts them: by OpenAlex citation count, or by the stored
+# PageRank (see centrality.py) with the citation count breaking ties. Either way, works linked to more
+# works of the frontier come first among equals.
+PRIORITIES = ('cited_by_count', 'centrality')
+
+
+class ExpansionBudget:
+    """Nodes, OpenAlex requests and time left for an expansion. `exhausted` names the first budget used up."""
+
+    def __init__(self, max_nodes: int, max_api_calls: int, max_seconds: float):
+        self.nodes_left = max_nodes
+        self.api_calls_left = max_api_calls
+        self.api_calls = 0
+        self.started = time.monotonic()
+        self.deadline = self.started + max_seconds
+        self.exhausted: Optional[str] = None
+
+    def out_of_time(self) -> bool:
+        if time.monotonic() >= self.deadline:
+            self.exhausted = self.exhausted or 'max_seconds'
+            return True
+        return False
+
+    def fetchable(self, n_works: int) -> int:
+        """Number of works (of n_works) that the requests left can fetch, at one request per batch."""
+        fetchable = min(n_works, max(self.api_calls_left, 0) * MAX_IDS_PER_FILTER)
+        if fetchable < n_works:
+            self.exhausted = self.exhausted or 'max_api_calls'
+        return fetchable
+
+    def spend_api_calls(self, calls: int):
+        """Charge the requests actually made, retries and bisection included."""
+        self.api_calls += calls
+        self.api_calls_left -= calls
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+def _get_uncached_work_ids(conn: sqlite3.Connection, work_ids: List[str], need_full: bool) -> List[str]:
+    """Get the works not cached, or only cached as stubs if need_full, keeping their order."""
+    cursor = conn.execute("""
+        SELECT id, fetch_tier FROM works WHERE id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(work_ids),))
+    tiers = dict(cursor.fetchall())
+    return [
+        work_id for work_id in work_ids
+        if work_id not in tiers or (need_full and tiers[work_id] == FETCH_TIER_STUB)
+    ]
+
+
+def _fetch_missing_works(
+    conn: sqlite3.Connection,
+    work_ids: List[str],
+    budget: ExpansionBudget,
+    need_full: bool,
+    writer: WriterFactory
+) -> int:
+    """
+    Fetch and cache the given works that are not cached (as full records if need_full), most important first,
+    in one batched call within the request budget.
+
+    Returns:
+        Number of works fetched
+    """
+    missing = _get_uncached_work_ids(conn, work_ids, need_full)
+    if not missing or budget.out_of_time():
+        return 0
+    missing = missing[:budget.fetchable(len(missing))]
+    if not missing:
+        return 0
+    report = get_works_by_ids_report(missing, retry_missing=False, select=None if need_full else STUB_WORK_FIELDS)
+    budget.spend_api_calls(report.requests)
+    with writer() as write_conn, WorkBatchWriter(write_conn) as batch_writer:
+        for work in report.works:
+            try:
+                if need_full:
+                    batch_writer.add(work)
+                else:
+                    Work(work).insert_stub_in_db(write_conn, commit=False)
+            except Exception as e:
+                print(f"  Error caching work {work.get('id')}: {e}")
+        write_conn.commit()
+    return len(report.resolved)
+
+
+def _get_neighbours(conn: sqlite3.Connection, work_id: str, graph: Optional[CitationGraph]) -> List[str]:
+    """Works cited by or citing a work, from the cache."""
+    if graph is not None:
+        return graph.references(work_id) + graph.citing(work_id)
+    return get_referenced_works_from_cache(conn, work_id) + get_citing_works_from_cache(conn, work_id)
+
+
+def _rank_works(conn: sqlite3.Connection, work_ids: List[str], links: Dict[str, int], priority: str) -> List[str]:
+    """Sort the cached works among the given ones by priority (see PRIORITIES), most important first."""
+    cited_by_counts = dict(conn.execute("""
+        SELECT id, cited_by_count FROM works WHERE id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(work_ids),)).fetchall())
+    if priority == 'centrality':
+        pageranks = {work_id: scores['pagerank'] for work_id, scores in get_work_centrality(conn, work_ids).items()}
+        key = lambda work_id: (pageranks.get(work_id) or 0, cited_by_counts.get(work_id) or 0, links[work_id])
+    else:
+        key = lambda work_id: (cited_by_counts.get(work_id) or 0, links[work_id])
+    cached = [work_id for work_id in work_ids if work_id in cited_by_counts]
+    return sorted(cached, key=lambda work_id: (key(work_id), -work_id_to_int(work_id)), reverse=True)
+
+
+def _get_edges_between(
+    conn: sqlite3.Connection,
+    work_ids: List[str],
+    graph: Optional[CitationGraph]
+) -> List[tuple]:
+    """(citing, cited) ID pairs of the cached citations between the given works."""
+    if graph is not None:
+        return graph.subgraph_edges(work_ids)
+    numbers = json.dumps([number for number in map(work_id_to_int, work_ids) if number is not None])
+    cursor = conn.execute("""
+        SELECT work_id, referenced_work_id FROM works_referenced_works
+        WHERE work_id IN (SELECT value FROM json_each(?1)) AND referenced_work_id IN (SELECT value FROM json_each(?1))
+        UNION
+        SELECT citing_work_id, work_id FROM works_cited_by
+        WHERE work_id IN (SELECT value FROM json_each(?1)) AND citing_work_id IN (SELECT value FROM json_each(?1))
+    """, (numbers,))
+    return [(int_to_work_id(citing), int_to_work_id(cited)) for citing, cited in cursor]
+
+
+def expand_neighbourhood(
+    conn: sqlite3.Connection,
+    seed_work_ids: List[str],
+    library_work_ids: Set[str],
+    hops: int = DEFAULT_HOPS,
+    max_nodes: int = DEFAULT_MAX_NODES,
+    max_api_calls: int = DEFAULT_MAX_API_CALLS,
+    max_seconds: float = DEFAULT_MAX_SECONDS,
+    priority: str = 'cited_by_count',
+    graph: Optional[CitationGraph] = None,
+    writer: Optional[WriterFactory] = None
+) -> dict:
+    """
+    Get the works within `hops` citations of the seed works, within budgets.
+
+    Args:
+        conn: SQLite database connection to read the cache from
+        seed_work_ids: OpenAlex IDs of the works to expand from
+        library_work_ids: Set of work IDs in the user's library
+        hops: Number of citations to follow from the seeds
+        max_nodes: Maximum number of works returned besides the seeds
+        max_api_calls: Maximum number of OpenAlex requests
+        max_seconds: Stop expanding after this many seconds
+        priority: How to choose the works kept when the node budget does not fit them all (see PRIORITIES)
+        graph: In-memory citation graph to read the citations from
+        writer: Lends the writer connection to cache the works of each frontier, which is not held while
+            fetching. None to write through conn.
+
+    Returns:
+        Dict with 'nodes' (each with the 'hop' it was reached at), 'edges' between them, and 'stats': the
+        'hops' completed, 'api_calls' made, 'elapsed' seconds and the budget that cut the expansion short
+        ('truncated': 'max_nodes', 'max_api_calls', 'max_seconds' or None)
+
+    Raises:
+        ValueError: If priority is unknown
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority} (expected one of {', '.join(PRIORITIES)})")
+    writer = writer or lend_connection(conn)
+    budget = ExpansionBudget(max_nodes, max_api_calls, max_seconds)
+    hop_of: Dict[str, int] = dict.fromkeys(seed_work_ids, 0)
+    frontier = list(hop_of)
+    # The seeds need their references
+    _fetch_missing_works(conn, frontier, budget, need_full=True, writer=writer)
+
+    hops_completed = 0
+    for hop in range(1, hops + 1):
+        if not frontier or budget.nodes_left <= 0 or budget.out_of_time():
+            break
+        links: Dict[str, int] = {}
+        for work_id in frontier:
+            for neighbour in _get_neighbours(conn, work_id, graph):
+                if neighbour not in hop_of:
+                    links[neighbour] = links.get(neighbour, 0) + 1
+        if not links:
+            break
+
+        # Fetch the neighbours missing from the cache, the most linked first, then rank the cached ones
+        candidates = sorted(links, key=lambda work_id: (-links[work_id], work_id_to_int(work_id)))
+        _fetch_missing_works(conn, candidates[:budget.nodes_left * CANDIDATES_PER_NODE], budget, need_full=hop < hops,
+                             writer=writer)
+        ranked = _rank_works(conn, candidates, links, priority)
+        if len(ranked) > budget.nodes_left:
+            budget.exhausted = budget.exhausted or 'max_nodes'
+        frontier = ranked[:budget.nodes_left]
+        budget.nodes_left -= len(frontier)
+        hop_of.update((work_id, hop) for work_id in frontier)
+        hops_completed = hop
+
+    work_ids = list(hop_of)
+    with writer() as write_conn:
+        touch_works(write_conn, work_ids)
+
+    details = dict((row[0], row[1:]) for row in conn.execute("""
+        SELECT id, title, publication_year, cited_by_count FROM works WHERE id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(work_ids),)))
+    nodes = []
+    for work_id in work_ids:
+        title, year, cited_by_count = details.get(work_id, (None, None, None))
+        nodes.append({
+            'id': work_id,
+            'title': title or 'Unknown Title',
+            'year': year,
+            'authors': get_authors_for_work(conn, work_id),
+            'cited_by_count': cited_by_count,
+            'hop': hop_of[work_id],
+            'nodeType': 'library' if work_id in library_work_ids else 'external',
+        })
+    edges = [
+        {'source': citing, 'target': cited, 'type': 'cites'}
+        for citing, cited in _get_edges_between(conn, work_ids, graph)
+    ]
+
+    print(f"Expanded {len(seed_work_ids)} works by {hops_completed} hops: {len(nodes)} works, {len(edges)} citations, "
+          f"{budget.api_calls} requests in {budget.elapsed:.1f}s")
+    return {
+        'nodes': nodes,
+        'edges': edges,
+        'stats': {
+            'hops': hops_completed,
+            'api_calls': budget.api_calls,
+            'elapsed': budget.elapsed,
+            'truncated': budget.exhausted,
+        },
+    }
@@ -1,5 +1,20 @@
+import sqlite3
+from functools import partial
+from typing import Dict, List
+
 from pyalex import Works, Authors, Sources, Institutions, Concepts, Topics, Publishers, Funders
 
+from zotero_utils.http_client import install_openalex_session
+from zotero_utils.OpenAlexAPI.batch import DEFAULT_MAX_WORKERS, MAX_IDS_PER_FILTER, fetch_batches, split_into_batches
+from zotero_utils.OpenAlexAPI.retry import bisect_batch, default_retry_policy
+from zotero_utils.OpenAlexDB.author import Author
+from zotero_utils.OpenAlexDB.concept import Concept
+from zotero_utils.OpenAlexDB.institution import Institution
+from zotero_utils.OpenAlexDB.publisher import Publisher
+from zotero_utils.OpenAlexDB.source import Source
+from zotero_utils.OpenAlexDB.topic import Topic
+from zotero_utils.OpenAlexDB.work import Work
+
 first_letter_types_dict = {
     "W": Works,
     "A": Authors,
@@ -11,31 +26,126 @@ first_letter_types_dict = {
     "F": Funders,
 }
 
-def get_entities_by_id(openalex_item_ids: list[str]) -> list:
+# pyalex creates a new session for every request by default; reuse the pooled keep-alive one instead
+install_openalex_session()
+
+# Database classes of each entity type. Funders have no tables in the database.
+first_letter_db_classes_dict = {
+    "W": Work,
+    "A": Author,
+    "S": Source,
+    "I": Institution,
+    "C": Concept,
+    "T": Topic,
+    "P": Publisher,
+}
+
+
+def normalize_entity_id(openalex_item_id: str) -> str:
+    """Strip the https://openalex.org/ prefix and upper-case an OpenAlex ID, e.g. "a123" -> "A123"."""
+    return (openalex_item_id or "").strip().rsplit("/", 1)[-1].upper()
+
+
+def partition_ids_by_type(openalex_item_ids: List[str]) -> Dict[str, List[str]]:
+    """
+    Group OpenAlex IDs of any entity types by their type letter.
+
+    Args:
+        openalex_item_ids (list[str]): A list of item IDs, e.g. ["W123", "https://openalex.org/A456"]
+
+    Returns:
+        dict: First letter -> list of normalized, de-duplicated IDs of that type
+    """
+    ids_by_type = {}
+    for item_id in dict.fromkeys(normalize_entity_id(i) for i in openalex_item_ids if i):
+        if not item_id or item_id[0] not in first_letter_types_dict:
+            raise ValueError(f"Not an OpenAlex ID: {item_id}")
+        ids_by_type.setdefault(item_id[0], []).append(item_id)
+    return ids_by_type
+
+
+def _fetch_entity_batch(batch: List[str]) -> list:
+    """Fetch one batch of IDs of a single entity type with an OR filter."""
+    entity_class = first_letter_types_dict[batch[0][0]]
+    return list(entity_class().filter(openalex="|".join(batch)).get(per_page=len(batch)))
+
+
+def get_entities_by_id(openalex_item_ids: list[str], max_workers: int = DEFAULT_MAX_WORKERS) -> Dict[str, list]:
     """
     Get entities from OpenAlex API by their IDs.
 
+    The IDs may be of mixed entity types. They are partitioned by type into batches of up to 50 IDs,
+    and the batches of all types are fetched in parallel.
+
     Args:
         openalex_item_ids (list[str]): A list of item IDs.
+        max_workers (int): Maximum number of batches in flight at once
+
+    Returns:
+        dict: First letter of the entity type (e.g. "A") -> list of entities found
+    """
+    batches = []
+    for ids in partition_ids_by_type(openalex_item_ids).values():
+        batches.extend(split_into_batches(ids, MAX_IDS_PER_FILTER))
+
+    # Every batch holds one entity type, so each can be bisected on its own if OpenAlex rejects it
+    fetch = partial(bisect_batch, fetch_batch=_fetch_entity_batch, retry_policy=default_retry_policy)
+    entities = {}
+    for batch, result, error in fetch_batches(batches, fetch, max_workers, limiter=None):
+        if error is not None:
+            print(f"Error fetching {len(batch)} entities starting at {batch[0]}: {error}")
+            continue
+        found, errored, invalid = result
+        if errored or invalid:
+            print(f"Could not fetch {len(errored) + len(invalid)} entities starting at {batch[0]}")
+        entities.setdefault(batch[0][0], []).extend(found)
+    return entities
+
+
+def insert_entities_in_db(conn: sqlite3.Connection, entities: Dict[str, list], commit: bool = True) -> Dict[str, list]:
+    """
+    Insert entities of any type into the database, each through its class's insert_or_replace_in_db().
+
+    Args:
+        conn: SQLite database connection
+        entities: First letter of the entity type -> list of entities, as returned by get_entities_by_id()
+        commit: Commit the transaction
 
     Returns:
-        list: A list of entities.
+        dict: First letter -> list of the inserted Author/Institution/Source/... objects
     """
+    inserted = {}
+    for first_letter, type_entities in entities.items():
+        db_class = first_letter_db_classes_dict.get(first_letter)
+        if db_class is None:
+            print(f"Skipping {len(type_entities)} entities of type {first_letter}: not stored in the database")
+            continue
+        for entity in type_entities:
+            try:
+                db_entity = db_class(entity)
+                db_entity.insert_or_replace_in_db(conn, commit=False)
+                inserted.setdefault(first_letter, []).append(db_entity)
+            except Exception as e:
+                print(f"Error inserting {entity.get('id')}: {e}")
+    if commit:
+        conn.commit()
+    return inserted
 
-    # Check that the openalex_item_ids are not empty
-    if not openalex_item_ids:
-        raise ValueError("The list of item IDs is empty.")
 
-    # Make sure that the item types are all the same
-    first_letter = openalex_item_ids[0][0]
-    for item_id in openalex_item_ids:
-        if item_id[0] != first_letter:
-            raise ValueError("All item IDs must be of the same type in this list.")
+def create_entities_from_web_api_by_ids(
+    conn: sqlite3.Connection,
+    openalex_item_ids: List[str],
+    max_workers: int = DEFAULT_MAX_WORKERS
+) -> Dict[str, list]:
+    """
+    Fetch entities of any type from the OpenAlex web API and insert them into the database.
 
+    Args:
+        conn: SQLite database connection
+        openalex_item_ids: A list of item IDs of any entity types
+        max_workers: Maximum number of batches in flight at once
 
-    # Can query the OpenAlex API for up to 50 entities at a time.
-    entities = []
-    for item_count in range(0, len(openalex_item_ids), 50):
-        item_batch = openalex_item_ids[item_count:item_count + 50]
-        entities.append(entities().get(openalex_item_ids=item_batch))
-    return entities
\ No newline at end of file
+    Returns:
+        dict: First letter -> list of the inserted Author/Institution/Source/... objects
+    """
+    return insert_entities_in_db(conn, get_entities_by_id(openalex_item_ids, max_workers))
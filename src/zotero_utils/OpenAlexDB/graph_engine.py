@@ -0,0 +1,284 @@
+"""
+In-memory citation graph of the works cached in openalex.db.
+
+The citation edges (works_referenced_works, and works_cited_by from the other side) are loaded once into
+NumPy CSR arrays, in both directions: for node i, its references are out_indices[out_indptr[i]:out_indptr[i + 1]]
+and the works citing it are in_indices[in_indptr[i]:in_indptr[i + 1]]. Nodes are the numbers of the work IDs
+(see clean.work_id_to_int), mapped to array indices by a dict. Neighbour queries, degrees and library
+subgraphs are then array operations instead of SQL queries.
+
+Edges written to the same database file afterwards reach the graph through work.EDGE_LISTENERS, once their
+transaction commits: they are kept in small pending sets, merged into the arrays once there are enough of
+them. Deleting works or clearing the citations only marks the graph stale, as edges may be cached in both
+tables; reload() rebuilds it.
+"""
+
+import itertools
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .clean import int_to_work_id, work_id_to_int
+from . import work as work_module
+
+# Pending edges merged into the CSR arrays once they exceed this many, or this fraction of the edges
+COMPACT_MIN_EDGES = 10000
+COMPACT_EDGE_RATIO = 0.1
+
+
+def _load_edges(conn: sqlite3.Connection) -> Tuple[np.ndarray, np.ndarray]:
+    """Load every cached citation edge as (citing, cited) arrays of work numbers."""
+    cursor = conn.execute("""
+        SELECT work_id, referenced_work_id FROM works_referenced_works
+        UNION ALL
+        SELECT citing_work_id, work_id FROM works_cited_by
+    """)
+    edges = np.fromiter(itertools.chain.from_iterable(cursor), dtype=np.int64).reshape(-1, 2)
+    return edges[:, 0], edges[:, 1]
+
+
+def _csr(sources: np.ndarray, targets: np.ndarray, n_nodes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """CSR (indptr, indices) of edges sorted by source, then target."""
+    order = np.lexsort((targets, sources))
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n_nodes), out=indptr[1:])
+    return indptr, targets[order]
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Neighbours of several nodes at once: (node of each neighbour, neighbour) arrays."""
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    return np.repeat(nodes, lengths), indices[positions]
+
+
+class CitationGraph:
+    """
+    Citation graph in CSR arrays, kept up to date with the edges written to the database.
+
+        graph = CitationGraph.load(conn)
+        graph.attach()  # Follow the edges written from now on
+        graph.references("W123")
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._index: Dict[int, int] = {}  # Work number -> node index
+        self._numbers: List[int] = []  # Node index -> work number
+        self._n_csr = 0  # Nodes covered by the CSR arrays; later nodes only have pending edges
+        self._out_indptr = np.zeros(1, dtype=np.int64)
+        self._out_indices = np.zeros(0, dtype=np.int64)
+        self._in_indptr = np.zeros(1, dtype=np.int64)
+        self._in_indices = np.zeros(0, dtype=np.int64)
+        self._pending_out: Dict[int, Set[int]] = {}
+        self._pending_in: Dict[int, Set[int]] = {}
+        self._n_pending = 0
+        self._database_path: Optional[str] = None  # Of the database loaded, whose edges attach() follows
+        self.stale = False
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "CitationGraph":
+        """Load the citation graph from the database."""
+        graph = cls()
+        graph.reload(conn)
+        return graph
+
+    def reload(self, conn: sqlite3.Connection):
+        """Rebuild the graph from the database."""
+        sources, targets = _load_edges(conn)
+        path = work_module.database_path(conn)
+        if self._database_path is not None and path != self._database_path:
+            raise ValueError(f"The graph was loaded from {self._database_path}, not {path}")
+        with self._lock:
+            self._database_path = path
+            numbers, inverse = np.unique(np.concatenate([sources, targets]), return_inverse=True)
+            self._numbers = numbers.tolist()
+            self._index = {number: i for i, number in enumerate(self._numbers)}
+            self._pending_out, self._pending_in, self._n_pending = {}, {}, 0
+            self._build_csr(inverse[:len(sources)], inverse[len(sources):])
+            self.stale = False
+
+    def _build_csr(self, sources: np.ndarray, targets: np.ndarray):
+        """Replace the CSR arrays with the given edges (node indices), dropping duplicates."""
+        n_nodes = len(self._numbers)
+        keys = np.unique(sources.astype(np.int64) * n_nodes + targets)
+        sources, targets = keys // max(n_nodes, 1), keys % max(n_nodes, 1)
+        self._out_indptr, self._out_indices = _csr(sources, targets, n_nodes)
+        self._in_indptr, self._in_indices = _csr(targets, sources, n_nodes)
+        self._n_csr = n_nodes
+
+    def _compact(self):
+        """Merge the pending edges into the CSR arrays."""
+        sources, targets = _gather(self._out_indptr, self._out_indices, np.arange(self._n_csr))
+        pending = [(source, target) for source, targets_ in self._pending_out.items() for target in targets_]
+        pending = np.array(pending, dtype=np.int64).reshape(-1, 2)
+        self._pending_out, self._pending_in, self._n_pending = {}, {}, 0
+        self._build_csr(np.concatenate([sources, pending[:, 0]]), np.concatenate([targets, pending[:, 1]]))
+
+    def _node(self, number: int) -> int:
+        index = self._index.get(number)
+        if index is None:
+            index = self._index[number] = len(self._numbers)
+            self._numbers.append(number)
+        return index
+
+    def add_edges(self, edges: Iterable[Tuple[int, int]]):
+        """Add (citing, cited) edges of work numbers."""
+        with self._lock:
+            for citing, cited in edges:
+                source, target = self._node(citing), self._node(cited)
+                if target in self._pending_out.get(source, ()) or self._has_csr_edge(source, target):
+                    continue
+                self._pending_out.setdefault(source, set()).add(target)
+                self._pending_in.setdefault(target, set()).add(source)
+                self._n_pending += 1
+            if self._n_pending > max(COMPACT_MIN_EDGES, COMPACT_EDGE_RATIO * len(self._out_indices)):
+                self._compact()
+
+    def _has_csr_edge(self, source: int, target: int) -> bool:
+        if source >= self._n_csr:
+            return False
+        neighbours = self._out_indices[self._out_indptr[source]:self._out_indptr[source + 1]]
+        position = np.searchsorted(neighbours, target)
+        return position < len(neighbours) and neighbours[position] == target
+
+    # Listener interface of work.EDGE_LISTENERS
+
+    def references_written(self, references: Dict[int, List[int]]):
+        """Works (by number) had their references written. References removed are only dropped by reload()."""
+        self.add_edges((citing, cited) for citing, cited_numbers in references.items() for cited in cited_numbers)
+
+    def citations_added(self, work_number: int, citing_numbers: List[int]):
+        """Works citing a work were cached."""
+        self.add_edges((citing, work_number) for citing in citing_numbers)
+
+    def works_deleted(self, work_numbers: List[int]):
+        """Works were deleted; their edges stay until reload()."""
+        self.stale = True
+
+    def edges_cleared(self):
+        """Every cached citation was deleted; the graph is empty after reload()."""
+        self.stale = True
+
+    def attach(self):
+        """Follow the edges written to the database it was loaded from, from now on."""
+        if self._database_path is None:
+            raise ValueError("Load the graph before attaching it")
+        listeners = work_module.EDGE_LISTENERS.setdefault(self._database_path, [])
+        if self not in listeners:
+            listeners.append(self)
+
+    def detach(self):
+        listeners = work_module.EDGE_LISTENERS.get(self._database_path, [])
+        if self in listeners:
+            listeners.remove(self)
+
+    # Queries
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self._numbers)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self._out_indices) + self._n_pending
+
+    def _indices(self, work_ids: Iterable[str]) -> np.ndarray:
+        numbers = (work_id_to_int(work_id) for work_id in work_ids)
+        return np.array([self._index[n] for n in numbers if n in self._index], dtype=np.int64)
+
+    def _neighbours(self, work_id: str, outgoing: bool) -> List[str]:
+        with self._lock:
+            index = self._index.get(work_id_to_int(work_id))
+            if index is None:
+                return []
+            indptr, indices = (self._out_indptr, self._out_indices) if outgoing else (self._in_indptr, self._in_indices)
+            neighbours = indices[indptr[index]:indptr[index + 1]].tolist() if index < self._n_csr else []
+            neighbours.extend(sorted((self._pending_out if outgoing else self._pending_in).get(index, ())))
+            return [int_to_work_id(self._numbers[i]) for i in neighbours]
+
+    def references(self, work_id: str) -> List[str]:
+        """IDs of the works a work cites."""
+        return self._neighbours(work_id, outgoing=True)
+
+    def citing(self, work_id: str) -> List[str]:
+        """IDs of the works citing a work."""
+        return self._neighbours(work_id, outgoing=False)
+
+    def degrees(self, work_ids: List[str]) -> Dict[str, Tuple[int, int]]:
+        """Number of (references, citing works) of each work, 0 for works not in the graph."""
+        with self._lock:
+            out_degrees = np.diff(self._out_indptr)
+            in_degrees = np.diff(self._in_indptr)
+            result = {}
+            for work_id in work_ids:
+                index = self._index.get(work_id_to_int(work_id))
+                if index is None:
+                    result[work_id] = (0, 0)
+                    continue
+                in_csr = index < self._n_csr
+                result[work_id] = (
+                    int(out_degrees[index] if in_csr else 0) + len(self._pending_out.get(index, ())),
+                    int(in_degrees[index] if in_csr else 0) + len(self._pending_in.get(index, ())),
+                )
+            return result
+
+    def neighbourhood(self, work_ids: Iterable[str], hops: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Works within `hops` citations (in either direction) of the given works, and the edges between them.
+
+        Returns:
+            (work numbers, citing positions, cited positions): each edge as the positions of its works
+            in the work numbers
+        """
+        with self._lock:
+            selected = np.zeros(len(self._numbers), dtype=bool)
+            frontier = self._indices(work_ids)
+            selected[frontier] = True
+            for _ in range(hops):
+                frontier = np.unique(self._all_neighbours(frontier))
+                frontier = frontier[~selected[frontier]]
+                selected[frontier] = True
+            nodes = np.flatnonzero(selected)
+            sources, targets = _gather(self._out_indptr, self._out_indices, nodes[nodes < self._n_csr])
+            pending = np.array([
+                (source, target) for source, targets_ in self._pending_out.items() if selected[source]
+                for target in targets_
+            ], dtype=np.int64).reshape(-1, 2)
+            sources, targets = np.concatenate([sources, pending[:, 0]]), np.concatenate([targets, pending[:, 1]])
+            keep = selected[targets]
+            positions = np.full(len(self._numbers), -1, dtype=np.int64)
+            positions[nodes] = np.arange(len(nodes))
+            numbers = np.array(self._numbers, dtype=np.int64)[nodes]
+            return numbers, positions[sources[keep]], positions[targets[keep]]
+
+    def _all_neighbours(self, nodes: np.ndarray) -> np.ndarray:
+        """Works citing or cited by any of the nodes (with repeats), from the arrays and the pending sets."""
+        in_csr = nodes[nodes < self._n_csr]
+        _, cited = _gather(self._out_indptr, self._out_indices, in_csr)
+        _, citing = _gather(self._in_indptr, self._in_indices, in_csr)
+        if not self._n_pending:
+            return np.concatenate([cited, citing])
+        in_nodes = np.zeros(len(self._numbers), dtype=bool)
+        in_nodes[nodes] = True
+        pending = [
+            neighbour for pending_sets in (self._pending_out, self._pending_in)
+            for node, neighbours in pending_sets.items() if in_nodes[node] for neighbour in neighbours
+        ]
+        return np.concatenate([cited, citing, np.array(pending, dtype=np.int64)])
+
+    def subgraph_edges(self, work_ids: Iterable[str]) -> List[Tuple[str, str]]:
+        """(citing, cited) ID pairs of the edges between the given works, e.g. the library."""
+        with self._lock:
+            nodes = self._indices(work_ids)
+            selected = np.zeros(len(self._numbers), dtype=bool)
+            selected[nodes] = True
+            sources, targets = _gather(self._out_indptr, self._out_indices, nodes[nodes < self._n_csr])
+            keep = selected[targets]
+            edges = list(zip(sources[keep].tolist(), targets[keep].tolist()))
+            for source in nodes.tolist():
+                edges.extend((source, target) for target in sorted(self._pending_out.get(source, ())) if selected[target])
+            return [(int_to_work_id(self._numbers[s]), int_to_work_id(self._numbers[t])) for s, t in edges]
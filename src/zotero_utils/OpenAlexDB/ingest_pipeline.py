@@ -0,0 +1,210 @@
+"""
+Parallel parse / single writer pipeline for ingesting many works into openalex.db.
+
+Turning a work into rows (work_to_rows) is CPU-bound Python, so large syncs and snapshot imports parse in
+a process pool while one writer thread writes the parsed rows in batched transactions:
+
+    fetch (caller) -> parse (process pool) -> bounded queue -> writer thread -> SQLite
+
+At most max_pending chunks are being parsed or waiting to be written at once; submitting more blocks the
+caller, so a fast fetcher cannot run ahead of the writer and fill memory.
+
+    with IngestPipeline(conn) as pipeline:
+        for page in pages:
+            pipeline.submit_works(page)
+    print(pipeline.progress())
+"""
+
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .clean import remove_base_url
+from .work import DEFAULT_FLUSH_SIZE, work_to_rows, write_changed_work_rows
+
+DEFAULT_CHUNK_SIZE = 200  # Works per parse task
+DEFAULT_MAX_PENDING = 16  # Chunks being parsed or waiting for the writer
+
+# Parser processes are spawned, not forked: the pipeline runs in threaded processes (e.g. the proxy), and a
+# forked child could inherit a lock held by another thread and deadlock on it.
+PARSER_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# Rows of each parsed work, and the number of records read to produce them
+ParseResult = Tuple[Dict[str, Dict[str, List[tuple]]], int]
+
+
+def parse_works(works: List[dict]) -> ParseResult:
+    """Convert works to their rows. Runs in a worker process."""
+    return {remove_base_url(work['id']): work_to_rows(work) for work in works if work.get('id')}, len(works)
+
+
+class IngestPipeline:
+    """
+    Parse works in worker processes and write them from a single writer thread.
+
+    Only the tables whose rows changed are rewritten (see write_changed_work_rows). Chunks are written in
+    the order they finish parsing.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        max_workers: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        flush_size: int = DEFAULT_FLUSH_SIZE,
+    ):
+        """
+        Args:
+            conn: SQLite database connection used by the writer thread only, until close(). It must allow use
+                from other threads (see connection.connect).
+            max_workers: Number of parser processes. Defaults to the number of CPUs. 1 parses in a thread.
+            chunk_size: Works per parse task in submit_works()
+            max_pending: Maximum number of chunks being parsed or waiting to be written
+            flush_size: Number of works written per transaction (at most; the writer does not wait to fill one)
+        """
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.flush_size = flush_size
+        max_workers = max_workers or os.cpu_count() or 1
+        self._executor: Executor = (
+            ProcessPoolExecutor(max_workers=max_workers, mp_context=PARSER_MP_CONTEXT) if max_workers > 1
+            else ThreadPoolExecutor(max_workers=1)
+        )
+        self._pending = threading.BoundedSemaphore(max_pending)
+        # Never blocks: the semaphore limits the chunks in flight to max_pending
+        self._parsed: "queue.Queue[Optional[Future]]" = queue.Queue(maxsize=max_pending)
+        self._counts_lock = threading.Lock()
+        self._counts = {'submitted': 0, 'read': 0, 'parsed': 0, 'written': 0, 'unchanged': 0, 'edges': 0, 'errors': 0}
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="openalex-db-writer", daemon=True)
+        self._writer.start()
+
+    def submit(self, parse: Callable[..., ParseResult], *args):
+        """
+        Parse in a worker with parse(*args), and queue the result for writing. Blocks while max_pending
+        chunks are in flight.
+
+        Args:
+            parse: Picklable function returning (work ID -> rows, number of records read), e.g. parse_works
+        """
+        if self._closed:
+            raise RuntimeError("IngestPipeline is closed")
+        self._raise_writer_error()
+        self._pending.acquire()
+        future = self._executor.submit(parse, *args)
+        self._count('submitted', 1)
+        future.add_done_callback(self._parsed.put)
+
+    def submit_works(self, works: List[dict]):
+        """Submit works (e.g. a page fetched from the API) in chunks of chunk_size."""
+        for i in range(0, len(works), self.chunk_size):
+            self.submit(parse_works, list(works[i:i + self.chunk_size]))
+
+    def progress(self) -> Dict[str, int]:
+        """
+        Counters: chunks 'submitted', records 'read', works 'parsed', works 'written' and skipped as
+        'unchanged', citation 'edges' parsed, and chunks that failed to parse ('errors').
+        """
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def close(self) -> Dict[str, int]:
+        """
+        Wait for every submitted chunk to be written, and stop the workers.
+
+        Returns:
+            The final progress() counters
+
+        Raises:
+            The error that stopped the writer, if any
+        """
+        if not self._closed:
+            self._closed = True
+            # Every parsed chunk is queued once the workers have stopped, so the end marker comes last
+            self._executor.shutdown()
+            self._parsed.put(None)
+            self._writer.join()
+        self._raise_writer_error()
+        return self.progress()
+
+    def __enter__(self) -> "IngestPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _count(self, counter: str, n: int):
+        with self._counts_lock:
+            self._counts[counter] += n
+
+    def _raise_writer_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _take_result(self, future: Future) -> Dict[str, Dict[str, List[tuple]]]:
+        """Get the rows of a parsed chunk, counting it."""
+        self._pending.release()
+        try:
+            works_rows, n_read = future.result()
+        except Exception as e:
+            print(f"Error parsing works: {e}")
+            self._count('errors', 1)
+            return {}
+        self._count('read', n_read)
+        self._count('parsed', len(works_rows))
+        self._count('edges', sum(len(rows.get('works_referenced_works', [])) for rows in works_rows.values()))
+        return works_rows
+
+    def _write_loop(self):
+        done = False
+        while not done:
+            future = self._parsed.get()
+            if future is None:
+                break
+            batch = self._take_result(future)
+            # Add whatever else is parsed already to the transaction, up to flush_size works
+            while len(batch) < self.flush_size:
+                try:
+                    future = self._parsed.get_nowait()
+                except queue.Empty:
+                    break
+                if future is None:
+                    done = True
+                    break
+                batch.update(self._take_result(future))
+            if not batch or self._error is not None:
+                continue  # After an error, keep draining so that submit() does not block forever
+            try:
+                with self.conn:
+                    written = write_changed_work_rows(self.conn, batch)
+                self._count('written', written)
+                self._count('unchanged', len(batch) - written)
+            except BaseException as e:
+                print(f"Error writing works: {e}")
+                self._error = e
+
+
+def ingest_works(
+    conn: sqlite3.Connection,
+    works: List[dict],
+    max_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, int]:
+    """
+    Write works through an IngestPipeline. Few works (one chunk or less) are parsed in a thread instead of
+    starting worker processes.
+
+    Returns:
+        The pipeline's progress() counters
+    """
+    if len(works) <= chunk_size:
+        max_workers = 1
+    with IngestPipeline(conn, max_workers=max_workers, chunk_size=chunk_size) as pipeline:
+        pipeline.submit_works(works)
+    return pipeline.progress()
@@ -1,6 +1,9 @@
 import os
 import sqlite3
 
+from zotero_utils.OpenAlexDB.connection import connect
+from zotero_utils.OpenAlexDB.migrations import migrate
+
 # Schema from here: https://docs.openalex.org/download-all-data/upload-to-your-database/load-to-a-relational-database
 # Other API docs:
 # https://docs.openalex.org/api-entities/entities-overview
@@ -10,12 +13,8 @@ def init_openalex_db(file_path: str) -> sqlite3.Connection:
     if os.path.exists(file_path):
         os.remove(file_path)
     
-    conn = sqlite3.connect(file_path)
-    cursor = conn.cursor()
-
-    # Execute the SQL commands in init_db.sql
-    with open("src/zotero_utils/OpenAlexDB/init_db.sql", "r") as f:
-        sql_commands = f.read()
+    conn = connect(file_path)
 
-    cursor.executescript(sql_commands)
+    # Execute the SQL commands in init_db.sql, and record the schema version
+    migrate(conn)
     return conn
\ No newline at end of file
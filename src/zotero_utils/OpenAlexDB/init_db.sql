@@ -229,7 +229,11 @@ CREATE TABLE works (
     is_paratext INTEGER, -- Changed from BOOLEAN
     cited_by_api_url TEXT,
     abstract_inverted_index TEXT, -- Changed from JSON
-    language TEXT
+    language TEXT,
+    fetch_tier TEXT, -- 'stub' (display fields only) or 'full'. NULL is a full record cached before tiers existed.
+    updated_date TEXT, -- OpenAlex updated_date of the cached record
+    fetched_at TEXT, -- When the record was fetched
+    last_accessed TEXT -- When the work was last shown, for evicting the least recently used works
 );
 
 CREATE TABLE works_primary_locations (
@@ -316,10 +320,12 @@ CREATE TABLE works_open_access (
     any_repository_has_fulltext INTEGER -- Changed from BOOLEAN
 );
 
+-- Citation edges are keyed by the numbers of the work IDs, e.g. 123 for W123 (see clean.work_id_to_int)
 CREATE TABLE works_referenced_works (
-    work_id TEXT,
-    referenced_work_id TEXT
-);
+    work_id INTEGER,
+    referenced_work_id INTEGER,
+    PRIMARY KEY (work_id, referenced_work_id)
+) WITHOUT ROWID;
 
 CREATE TABLE works_related_works (
     work_id TEXT,
@@ -337,10 +343,83 @@ CREATE TABLE IF NOT EXISTS zotero_openalex_mapping (
 
 -- Cache "cited by" relationships (inverse of works_referenced_works)
 CREATE TABLE IF NOT EXISTS works_cited_by (
-    work_id TEXT,
-    citing_work_id TEXT,
+    work_id INTEGER,
+    citing_work_id INTEGER,
     fetched_date TEXT,
     PRIMARY KEY (work_id, citing_work_id)
+) WITHOUT ROWID;
+
+-- Cursor of an interrupted "cited by" fetch, so it can resume where it stopped
+CREATE TABLE IF NOT EXISTS works_cited_by_fetch_state (
+    work_id TEXT PRIMARY KEY,
+    next_cursor TEXT, -- NULL once every citing work has been fetched
+    fetched_count INTEGER,
+    updated_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS openalex_bad_identifiers (
+    identifier TEXT PRIMARY KEY, -- normalized DOI or OpenAlex ID
+    kind TEXT, -- 'doi' or 'openalex_id'
+    reason TEXT,
+    first_seen TEXT,
+    last_seen TEXT
+);
+
+-- Hash of each table's rows of a work cached in full, to skip rewriting the tables that did not change
+CREATE TABLE IF NOT EXISTS works_content_hashes (
+    work_id TEXT PRIMARY KEY,
+    section_hashes TEXT -- JSON: table name -> hash of the work's rows in it
+) WITHOUT ROWID;
+
+-- Date up to which a sync job (e.g. the library refresh) has fetched every change
+CREATE TABLE IF NOT EXISTS openalex_sync_state (
+    job TEXT PRIMARY KEY,
+    synced_date TEXT, -- Changes on or after this date are fetched by the next run
+    last_run TEXT
+);
+
+-- Co-citation and bibliographic coupling links between library works (see similarity.py), work_id < other_work_id.
+-- Work IDs are the numbers of the OpenAlex IDs.
+CREATE TABLE IF NOT EXISTS library_similarity (
+    kind TEXT, -- 'coupling' or 'cocitation'
+    work_id INTEGER,
+    other_work_id INTEGER,
+    weight INTEGER, -- Number of shared references (coupling) or citing works (co-citation)
+    PRIMARY KEY (kind, work_id, other_work_id)
+) WITHOUT ROWID;
+
+-- Fingerprint of the library, citations and top k the cached links were computed from
+CREATE TABLE IF NOT EXISTS library_similarity_state (
+    kind TEXT PRIMARY KEY,
+    fingerprint TEXT,
+    computed_at TEXT
+);
+
+-- Centrality of the works in the library's citation neighbourhood (see centrality.py).
+-- work_id is the number of the OpenAlex ID.
+CREATE TABLE IF NOT EXISTS work_centrality (
+    work_id INTEGER PRIMARY KEY,
+    in_degree INTEGER,
+    out_degree INTEGER,
+    pagerank REAL,
+    hub REAL,
+    authority REAL,
+    betweenness REAL -- Estimated from a sample of source works
+);
+
+-- Fingerprint of the neighbourhood the stored centrality was computed from
+CREATE TABLE IF NOT EXISTS work_centrality_state (
+    scope TEXT PRIMARY KEY,
+    fingerprint TEXT,
+    computed_at TEXT
+);
+
+-- Full-text index of work titles and abstracts (rebuilt from abstract_inverted_index).
+-- The rowid is the number of the work's OpenAlex ID, e.g. 123 for W123.
+CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5(
+    title,
+    abstract,
+    tokenize = 'unicode61 remove_diacritics 2'
 );
 
 -- Indexes
@@ -351,6 +430,16 @@ CREATE INDEX works_primary_locations_work_id_idx ON works_primary_locations(work
 CREATE INDEX works_locations_work_id_idx ON works_locations(work_id);
 CREATE INDEX works_best_oa_locations_work_id_idx ON works_best_oa_locations(work_id);
 CREATE INDEX zotero_openalex_mapping_work_id_idx ON zotero_openalex_mapping(openalex_work_id);
-CREATE INDEX works_cited_by_work_id_idx ON works_cited_by(work_id);
-CREATE INDEX works_referenced_works_work_id_idx ON works_referenced_works(work_id);
-CREATE INDEX works_referenced_works_ref_id_idx ON works_referenced_works(referenced_work_id);
\ No newline at end of file
+CREATE INDEX works_cited_by_citing_id_idx ON works_cited_by(citing_work_id, work_id);
+CREATE INDEX works_referenced_works_ref_id_idx ON works_referenced_works(referenced_work_id, work_id);
+CREATE INDEX works_authorships_work_position_author_idx ON works_authorships(work_id, author_position, author_id);
+CREATE INDEX works_authorships_author_work_idx ON works_authorships(author_id, work_id);
+CREATE INDEX works_doi_idx ON works(doi);
+CREATE INDEX works_topics_work_id_idx ON works_topics(work_id);
+CREATE INDEX works_topics_topic_id_idx ON works_topics(topic_id);
+CREATE INDEX works_concepts_work_id_idx ON works_concepts(work_id);
+CREATE INDEX works_concepts_concept_id_idx ON works_concepts(concept_id);
+CREATE INDEX zotero_openalex_mapping_doi_idx ON zotero_openalex_mapping(doi);
+CREATE INDEX works_mesh_work_id_idx ON works_mesh(work_id);
+CREATE INDEX works_related_works_work_id_idx ON works_related_works(work_id);
+CREATE INDEX works_last_accessed_idx ON works(last_accessed);
\ No newline at end of file
@@ -21,10 +21,12 @@ class Institution:
         """
         if not isinstance(institution_ids, list):
             institution_ids = [institution_ids]
-        pyalexInstitutions = pyalex.Institutions().get([institution_ids])
+        from zotero_utils.OpenAlexDB.get_items_from_api import get_entities_by_id
+        pyalexInstitutions = get_entities_by_id(institution_ids).get('I', [])
         institutions = [Institution(i) for i in pyalexInstitutions]
         for institution in institutions:
-            institution.insert_or_replace_in_db(conn)
+            institution.insert_or_replace_in_db(conn, commit=False)
+        conn.commit()
         return institutions
     
     @staticmethod
@@ -60,27 +62,28 @@ class Institution:
         conn.execute("DELETE FROM institutions_geo WHERE institution_id=?", (institution_id,))        
         conn.execute("DELETE FROM institutions_ids WHERE institution_id=?", (institution_id,))              
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    def insert_or_replace_in_db(self, conn: sqlite3.Connection, commit: bool = True):
         """
-        Insert the institution into the database.
+        Insert the institution into the database. Uses defensive .get() access for all fields.
         """
         institution = self.institution
+        institution_id = self.institution_id
         # INSTITUTIONS
         insert_tuple = (
-            remove_base_url(institution['id']), 
-            institution['ror'], 
-            institution['display_name'], 
-            remove_base_url(institution['country_code']), 
-            institution['type'], 
-            institution['homepage_url'], 
-            institution['image_url'], 
-            institution['image_thumbnail_url'], 
-            institution['display_name_acronyms'],
-            institution['display_name_alternatives'],
-            institution['works_count'],
-            institution['cited_by_count'],
-            institution['works_api_url'],
-            institution['updated_date']
+            institution_id,
+            institution.get('ror'),
+            institution.get('display_name'),
+            institution.get('country_code'),
+            institution.get('type'),
+            institution.get('homepage_url'),
+            institution.get('image_url'),
+            institution.get('image_thumbnail_url'),
+            json.dumps(institution.get('display_name_acronyms') or []),
+            json.dumps(institution.get('display_name_alternatives') or []),
+            institution.get('works_count'),
+            institution.get('cited_by_count'),
+            institution.get('works_api_url'),
+            institution.get('updated_date')
         )
         question_marks = ', '.join(['?'] * len(insert_tuple))
         conn.execute(
@@ -88,58 +91,63 @@ class Institution:
         )
 
         # INSTITUTIONS_ASSOCIATED_INSTITUTIONS
-        for associated_institution in institution['associated_institutions']:
+        conn.execute("DELETE FROM institutions_associated_institutions WHERE institution_id=?", (institution_id,))
+        for associated_institution in institution.get('associated_institutions') or []:
+            if not associated_institution.get('id'):
+                continue
             insert_tuple = (
-                remove_base_url(institution['id']), 
+                institution_id,
                 remove_base_url(associated_institution['id']),
-                associated_institution['relationship']
+                associated_institution.get('relationship')
             )
             conn.execute(
-                "REPLACE INTO institutions_associated_institutions (institution_id, associated_institution_id, relationship) VALUES (?, ?, ?)", insert_tuple
+                "INSERT INTO institutions_associated_institutions (institution_id, associated_institution_id, relationship) VALUES (?, ?, ?)", insert_tuple
             )
 
         # INSTITUTIONS_COUNTS_BY_YEAR
-        for count_by_year in institution['counts_by_year']:
+        conn.execute("DELETE FROM institutions_counts_by_year WHERE institution_id=?", (institution_id,))
+        for count_by_year in institution.get('counts_by_year') or []:
             insert_tuple = (
-                remove_base_url(institution['id']), 
-                count_by_year['year'],
-                count_by_year['works_count'],
-                count_by_year['cited_by_count'],
-                count_by_year['oa_works_count']
+                institution_id,
+                count_by_year.get('year'),
+                count_by_year.get('works_count'),
+                count_by_year.get('cited_by_count'),
+                count_by_year.get('oa_works_count')
             )
             conn.execute(
                 "REPLACE INTO institutions_counts_by_year (institution_id, year, works_count, cited_by_count, oa_works_count) VALUES (?, ?, ?, ?, ?)", insert_tuple
             )
 
         # INSTITUTIONS_GEO
-        for geo in institution['geo']:
-            insert_tuple = (
-                remove_base_url(institution['id']), 
-                geo['city'],
-                geo['geonames_city_id'],
-                geo['region'],
-                geo['country_code'],
-                geo['country'],
-                geo['latitude'],
-                geo['longitude']
-            )
-            conn.execute(
-                "REPLACE INTO institutions_geo (institution_id, city, geonames_city_id, region, country_code, country, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", insert_tuple
-            )
+        geo = institution.get('geo') or {}
+        insert_tuple = (
+            institution_id,
+            geo.get('city'),
+            geo.get('geonames_city_id'),
+            geo.get('region'),
+            geo.get('country_code'),
+            geo.get('country'),
+            geo.get('latitude'),
+            geo.get('longitude')
+        )
+        conn.execute(
+            "REPLACE INTO institutions_geo (institution_id, city, geonames_city_id, region, country_code, country, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", insert_tuple
+        )
 
         # INSTITUTIONS_IDS
-        for id in institution['ids']:
-            insert_tuple = (
-                remove_base_url(institution['id']), 
-                institution['openalex'],
-                institution['ror'],
-                institution['grid'],
-                institution['wikipedia'],
-                institution['wikidata'],
-                institution['mag']
-            )
-            conn.execute(
-                "REPLACE INTO institutions_ids (institution_id, openalex, ror, grid, wikipedia, wikidata, mag) VALUES (?, ?, ?, ?, ?, ?, ?)", insert_tuple
-            )
+        ids = institution.get('ids') or {}
+        insert_tuple = (
+            institution_id,
+            ids.get('openalex'),
+            ids.get('ror'),
+            ids.get('grid'),
+            ids.get('wikipedia'),
+            ids.get('wikidata'),
+            ids.get('mag')
+        )
+        conn.execute(
+            "REPLACE INTO institutions_ids (institution_id, openalex, ror, grid, wikipedia, wikidata, mag) VALUES (?, ?, ?, ?, ?, ?, ?)", insert_tuple
+        )
 
-        conn.commit()
\ No newline at end of file
+        if commit:
+            conn.commit()
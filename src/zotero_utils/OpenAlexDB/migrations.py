@@ -0,0 +1,302 @@
+"""
+Versioned schema migrations for openalex.db.
+
+The schema version is stored in SQLite's user_version header field. A new database gets the full current schema
+from init_db.sql and is stamped with the latest version. An existing database has every migration newer than its
+version applied, each in its own transaction together with the version bump. Migrations are idempotent, so a
+database that was partly upgraded by hand (or by the checks this replaces) upgrades cleanly.
+"""
+
+import os
+import sqlite3
+from typing import Callable, List, Tuple
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "init_db.sql")
+
+
+def table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return column in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _migration_1_legacy_tables(conn: sqlite3.Connection):
+    """Tables and columns added to databases created before migrations existed."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS zotero_openalex_mapping (
+            zotero_key TEXT PRIMARY KEY,
+            openalex_work_id TEXT,
+            doi TEXT,
+            title TEXT,
+            last_updated TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS zotero_openalex_mapping_work_id_idx ON zotero_openalex_mapping(openalex_work_id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS works_cited_by (
+            work_id TEXT,
+            citing_work_id TEXT,
+            fetched_date TEXT,
+            PRIMARY KEY (work_id, citing_work_id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS works_cited_by_work_id_idx ON works_cited_by(work_id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS works_cited_by_fetch_state (
+            work_id TEXT PRIMARY KEY,
+            next_cursor TEXT,
+            fetched_count INTEGER,
+            updated_date TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS openalex_bad_identifiers (
+            identifier TEXT PRIMARY KEY,
+            kind TEXT,
+            reason TEXT,
+            first_seen TEXT,
+            last_seen TEXT
+        )
+    """)
+    # Stub vs. full records of works
+    if not column_exists(conn, "works", "fetch_tier"):
+        conn.execute("ALTER TABLE works ADD COLUMN fetch_tier TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS works_referenced_works_work_id_idx ON works_referenced_works(work_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS works_referenced_works_ref_id_idx ON works_referenced_works(referenced_work_id)")
+
+
+def _migration_2_covering_indexes(conn: sqlite3.Connection):
+    """Indexes for the hot queries of citation_network, chosen from their query plans."""
+    # get_authors_for_work: WHERE work_id ORDER BY author_position, joined on author_id -> covered
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS works_authorships_work_position_author_idx
+        ON works_authorships(work_id, author_position, author_id)
+    """)
+    # get_coauthors / get_all_authors: WHERE author_id, joined on work_id -> covered
+    conn.execute("CREATE INDEX IF NOT EXISTS works_authorships_author_work_idx ON works_authorships(author_id, work_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS works_doi_idx ON works(doi)")
+    conn.execute("CREATE INDEX IF NOT EXISTS works_topics_work_id_idx ON works_topics(work_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS works_topics_topic_id_idx ON works_topics(topic_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS works_concepts_work_id_idx ON works_concepts(work_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS works_concepts_concept_id_idx ON works_concepts(concept_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS zotero_openalex_mapping_doi_idx ON zotero_openalex_mapping(doi)")
+
+
+def _migration_3_works_fts(conn: sqlite3.Connection):
+    """Full-text index of work titles and abstracts, filled from the cached works."""
+    from .clean import work_id_to_int
+    from .work import abstract_from_inverted_index
+
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5(
+            title,
+            abstract,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute("DELETE FROM works_fts")
+    abstract_column = "abstract_inverted_index" if column_exists(conn, "works", "abstract_inverted_index") else "NULL"
+    cursor = conn.execute(f"SELECT id, title, {abstract_column} FROM works")
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            break
+        conn.executemany(
+            "INSERT INTO works_fts (rowid, title, abstract) VALUES (?, ?, ?)",
+            [(work_id_to_int(work_id), title or '', abstract_from_inverted_index(abstract))
+             for work_id, title, abstract in rows if work_id_to_int(work_id) is not None]
+        )
+
+
+def _migration_4_work_id_indexes(conn: sqlite3.Connection):
+    """work_id indexes of the works tables still without one, used by read_work_dicts and write_work_rows."""
+    for table in ("works_mesh", "works_related_works"):
+        if table_exists(conn, table):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_work_id_idx ON {table}(work_id)")
+
+
+def _migration_5_freshness(conn: sqlite3.Connection):
+    """Per-work updated_date and fetch time, and the sync state of delta refreshes."""
+    for column in ("updated_date", "fetched_at"):
+        if not column_exists(conn, "works", column):
+            conn.execute(f"ALTER TABLE works ADD COLUMN {column} TEXT")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS openalex_sync_state (
+            job TEXT PRIMARY KEY,
+            synced_date TEXT,
+            last_run TEXT
+        )
+    """)
+
+
+def _is_without_rowid(conn: sqlite3.Connection, table: str) -> bool:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None and "WITHOUT ROWID" in row[0].upper()
+
+
+def _migration_6_integer_edges(conn: sqlite3.Connection):
+    """
+    Rebuild the citation edge tables keyed by the numbers of the work IDs, in WITHOUT ROWID tables whose
+    primary key serves lookups in one direction and a covering index in the other.
+
+    The space freed is reused by the database; VACUUM returns it to the file system.
+    """
+    edge_tables = [
+        # (table, other work column, further columns)
+        ("works_referenced_works", "referenced_work_id", ""),
+        ("works_cited_by", "citing_work_id", ", fetched_date TEXT"),
+    ]
+    for table, other_column, extra_columns in edge_tables:
+        if table_exists(conn, table) and _is_without_rowid(conn, table):
+            continue
+        legacy = table_exists(conn, table)
+        if legacy:
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_text")
+            for (index,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (f"{table}_text",)
+            ).fetchall():
+                conn.execute(f"DROP INDEX {index}")
+        conn.execute(f"""
+            CREATE TABLE {table} (
+                work_id INTEGER,
+                {other_column} INTEGER{extra_columns},
+                PRIMARY KEY (work_id, {other_column})
+            ) WITHOUT ROWID
+        """)
+        if legacy:
+            extra_select = ", fetched_date" if extra_columns else ""
+            conn.execute(f"""
+                INSERT OR IGNORE INTO {table}
+                SELECT CAST(substr(work_id, 2) AS INTEGER), CAST(substr({other_column}, 2) AS INTEGER){extra_select}
+                FROM {table}_text
+                WHERE work_id GLOB 'W[0-9]*' AND {other_column} GLOB 'W[0-9]*'
+            """)
+            conn.execute(f"DROP TABLE {table}_text")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS works_referenced_works_ref_id_idx
+        ON works_referenced_works(referenced_work_id, work_id)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS works_cited_by_citing_id_idx ON works_cited_by(citing_work_id, work_id)")
+
+
+def _migration_7_last_accessed(conn: sqlite3.Connection):
+    """Access time of works, for evicting the least recently used ones."""
+    if not column_exists(conn, "works", "last_accessed"):
+        conn.execute("ALTER TABLE works ADD COLUMN last_accessed TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS works_last_accessed_idx ON works(last_accessed)")
+
+
+def _migration_8_content_hashes(conn: sqlite3.Connection):
+    """Hashes of the sections of works, filled in as works are next written."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS works_content_hashes (
+            work_id TEXT PRIMARY KEY,
+            section_hashes TEXT
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_9_library_similarity(conn: sqlite3.Connection):
+    """Cache of the co-citation and bibliographic coupling links between library works."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS library_similarity (
+            kind TEXT,
+            work_id INTEGER,
+            other_work_id INTEGER,
+            weight INTEGER,
+            PRIMARY KEY (kind, work_id, other_work_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS library_similarity_state (
+            kind TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            computed_at TEXT
+        )
+    """)
+
+
+def _migration_10_work_centrality(conn: sqlite3.Connection):
+    """Centrality scores of the works in the library's citation neighbourhood."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS work_centrality (
+            work_id INTEGER PRIMARY KEY,
+            in_degree INTEGER,
+            out_degree INTEGER,
+            pagerank REAL,
+            hub REAL,
+            authority REAL,
+            betweenness REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS work_centrality_state (
+            scope TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            computed_at TEXT
+        )
+    """)
+
+
+# (version, description, migration). Append new migrations here, and add their schema to init_db.sql too.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "legacy tables and columns", _migration_1_legacy_tables),
+    (2, "covering indexes for hot queries", _migration_2_covering_indexes),
+    (3, "full-text index of works", _migration_3_works_fts),
+    (4, "work_id indexes of works_mesh and works_related_works", _migration_4_work_id_indexes),
+    (5, "work freshness and sync state", _migration_5_freshness),
+    (6, "integer-keyed citation edge tables", _migration_6_integer_edges),
+    (7, "work access times", _migration_7_last_accessed),
+    (8, "content hashes of works", _migration_8_content_hashes),
+    (9, "library similarity cache", _migration_9_library_similarity),
+    (10, "work centrality", _migration_10_work_centrality),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring the database schema up to date.
+
+    Args:
+        conn: SQLite database connection
+
+    Returns:
+        The schema version of the database
+    """
+    if not table_exists(conn, "works"):
+        # New database: create the current schema directly
+        with open(SCHEMA_PATH, "r") as f:
+            conn.executescript(f.read())
+        conn.execute(f"PRAGMA user_version = {LATEST_VERSION}")
+        conn.commit()
+        return LATEST_VERSION
+
+    version = get_schema_version(conn)
+    for migration_version, description, migration in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        print(f"Migrating openalex.db to version {migration_version}: {description}...")
+        conn.commit()
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {migration_version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        version = migration_version
+
+    # Refresh the planner statistics of tables whose indexes changed (cheap when nothing changed)
+    conn.execute("PRAGMA optimize")
+    return version
@@ -21,10 +21,12 @@ class Publisher:
         """
         if not isinstance(publisher_ids, list):
             publisher_ids = [publisher_ids]
-        pyalexPublishers = pyalex.Publishers().get([publisher_ids])
+        from zotero_utils.OpenAlexDB.get_items_from_api import get_entities_by_id
+        pyalexPublishers = get_entities_by_id(publisher_ids).get('P', [])
         publishers = [Publisher(p) for p in pyalexPublishers]
         for publisher in publishers:
-            publisher.insert_or_replace_in_db(conn)
+            publisher.insert_or_replace_in_db(conn, commit=False)
+        conn.commit()
         return publishers
     
     @staticmethod
@@ -53,32 +55,48 @@ class Publisher:
         conn.execute("DELETE FROM publishers_counts_by_year WHERE publisher_id=?", (publisher_id,))           
         conn.execute("DELETE FROM publishers_ids WHERE publisher_id=?", (publisher_id,))              
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    def insert_or_replace_in_db(self, conn: sqlite3.Connection, commit: bool = True):
         """
-        Insert the publisher into the database.
+        Insert the publisher into the database. Uses defensive .get() access for all fields.
         """
         publisher = self.publisher
+        publisher_id = self.publisher_id
         # PUBLISHERS
-        insert_tuple = (remove_base_url(publisher['id']), publisher['display_name'], publisher['alternate_titles'], publisher['country_codes'], publisher['hierarchy_level'], publisher['parent_publisher'], publisher['works_count'], publisher['cited_by_count'], publisher['sources_api_url'], publisher['updated_date'])
+        parent_publisher = publisher.get('parent_publisher')
+        if isinstance(parent_publisher, dict):
+            parent_publisher = parent_publisher.get('id')
+        insert_tuple = (
+            publisher_id,
+            publisher.get('display_name'),
+            json.dumps(publisher.get('alternate_titles') or []),
+            json.dumps(publisher.get('country_codes') or []),
+            publisher.get('hierarchy_level'),
+            remove_base_url(parent_publisher or ''),
+            publisher.get('works_count'),
+            publisher.get('cited_by_count'),
+            publisher.get('sources_api_url'),
+            publisher.get('updated_date')
+        )
         question_marks = ', '.join(['?'] * len(insert_tuple))
         conn.execute(
             f"REPLACE INTO publishers (id, display_name, alternate_titles, country_codes, hierarchy_level, parent_publisher, works_count, cited_by_count, sources_api_url, updated_date) VALUES ({question_marks})", insert_tuple
-        )        
+        )
 
         # PUBLISHERS COUNTS BY YEAR
-        for count in publisher['counts_by_year']:
-            insert_tuple = (remove_base_url(publisher['id']), count['year'], count['works_count'], count['cited_by_count'], count['oa_works_count'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
+        conn.execute("DELETE FROM publishers_counts_by_year WHERE publisher_id=?", (publisher_id,))
+        for count in publisher.get('counts_by_year') or []:
+            insert_tuple = (publisher_id, count.get('year'), count.get('works_count'), count.get('cited_by_count'), count.get('oa_works_count'))
             conn.execute(
-                f"REPLACE INTO publishers_counts_by_year (publisher_id, year, works_count, cited_by_count, oa_works_count) VALUES ({question_marks})", insert_tuple
+                "REPLACE INTO publishers_counts_by_year (publisher_id, year, works_count, cited_by_count, oa_works_count) VALUES (?, ?, ?, ?, ?)", insert_tuple
             )
 
         # PUBLISHERS IDS
-        for id in publisher['ids']:
-            insert_tuple = (remove_base_url(publisher['id']), publisher['openalex'], publisher['ror'], publisher['wikidata'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO publishers_ids (publisher_id, openalex, ror, wikidata) VALUES ({question_marks})", insert_tuple
-            )
-        
-        conn.commit()
\ No newline at end of file
+        conn.execute("DELETE FROM publishers_ids WHERE publisher_id=?", (publisher_id,))
+        ids = publisher.get('ids') or {}
+        conn.execute(
+            "INSERT INTO publishers_ids (publisher_id, openalex, ror, wikidata) VALUES (?, ?, ?, ?)",
+            (publisher_id, ids.get('openalex'), ids.get('ror'), ids.get('wikidata'))
+        )
+
+        if commit:
+            conn.commit()
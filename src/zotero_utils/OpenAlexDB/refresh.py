@@ -0,0 +1,142 @@
+"""
+Delta refresh of the cached library works.
+
+Every cached work records the OpenAlex updated_date of its record and when it was fetched. A refresh asks
+OpenAlex only for the library works changed since the last successful sync, 50 IDs per request with a
+from_updated_date filter, so keeping the cache current costs one small request per 50 library works instead
+of re-downloading them. OpenAlex only accepts from_updated_date with an API key; without one, the refresh
+compares the updated_date of each work (fetched with select=id,updated_date) with the cached one instead.
+
+These requests bypass the response cache, whose week-old pages would hide recent changes, and the synced
+date only advances when they reached OpenAlex.
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pyalex import Works
+
+from ..OpenAlexAPI.batch import DEFAULT_MAX_WORKERS
+from ..OpenAlexAPI.response_cache import bypass_response_cache, serves_live_responses
+from ..OpenAlexAPI.retry import default_retry_policy
+from ..OpenAlexAPI.works import BatchFetchReport, get_works_by_ids_report
+from .connection import WriterFactory, lend_connection
+from .ingest_pipeline import ingest_works
+
+LIBRARY_SYNC_JOB = 'library_works'
+
+
+def get_library_work_ids(conn: sqlite3.Connection) -> List[str]:
+    """Get the OpenAlex IDs of the works in the Zotero library."""
+    cursor = conn.execute(
+        "SELECT DISTINCT openalex_work_id FROM zotero_openalex_mapping WHERE openalex_work_id IS NOT NULL"
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_synced_date(conn: sqlite3.Connection, job: str = LIBRARY_SYNC_JOB) -> Optional[str]:
+    """Get the date (YYYY-MM-DD) from which the next run of a sync job has to fetch changes, if it ran before."""
+    row = conn.execute("SELECT synced_date FROM openalex_sync_state WHERE job = ?", (job,)).fetchone()
+    return row[0] if row else None
+
+
+def set_synced_date(conn: sqlite3.Connection, synced_date: str, job: str = LIBRARY_SYNC_JOB, commit: bool = True):
+    """Record that a sync job has fetched every change before `synced_date`."""
+    conn.execute("""
+        INSERT INTO openalex_sync_state (job, synced_date, last_run) VALUES (?, ?, ?)
+        ON CONFLICT(job) DO UPDATE SET synced_date = excluded.synced_date, last_run = excluded.last_run
+    """, (job, synced_date, datetime.now().isoformat()))
+    if commit:
+        conn.commit()
+
+
+def supports_from_updated_date(since: str) -> bool:
+    """Whether OpenAlex accepts the from_updated_date filter from us (it requires an API key). Costs one request."""
+    try:
+        default_retry_policy.call(lambda: Works().filter(from_updated_date=since).select(['id']).get(per_page=1))
+    except Exception as e:
+        # Without an API key, OpenAlex refuses the filter as a bad request or as unauthorized
+        if default_retry_policy.is_rejection(e) or default_retry_policy.is_auth_error(e):
+            return False
+        raise
+    return True
+
+
+def _get_changed_by_updated_date(
+    conn: sqlite3.Connection,
+    work_ids: List[str],
+    max_workers: int
+) -> BatchFetchReport:
+    """Fetch the works whose OpenAlex updated_date differs from the cached one, checking 50 dates per request."""
+    dates = get_works_by_ids_report(work_ids, max_workers, retry_missing=False, select=['id', 'updated_date'])
+    cached_dates = dict(conn.execute("""
+        SELECT DISTINCT w.id, w.updated_date FROM works w
+        JOIN zotero_openalex_mapping m ON m.openalex_work_id = w.id
+    """).fetchall())
+    changed_ids = [
+        work_id for work_id, work in dates.resolved.items()
+        if not cached_dates.get(work_id) or work.get('updated_date') != cached_dates[work_id]
+    ]
+    report = get_works_by_ids_report(changed_ids, max_workers, retry_missing=False)
+    report.errored.update(dates.errored)
+    return report
+
+
+def refresh_library_works(
+    conn: sqlite3.Connection,
+    since: Optional[str] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    writer: Optional[WriterFactory] = None
+) -> Dict[str, object]:
+    """
+    Re-fetch the library works changed in OpenAlex since the last sync, and record the sync.
+
+    The first sync (no recorded date and no `since`) fetches every library work, which records their
+    updated_date for the next syncs. The synced date only advances when every batch succeeded, live (not
+    replayed from a replay-only response cache).
+
+    Args:
+        conn: SQLite database connection to read the cache from
+        since: Fetch changes on or after this date (YYYY-MM-DD) instead of the recorded synced date
+        max_workers: Maximum number of batches in flight at once
+        writer: Lends the writer connection, usable from other threads (see connection.connect), once the
+            works are fetched. None to write through conn.
+
+    Returns:
+        Dict with the number of library works 'checked', works 'updated' and 'errored', the 'since' date
+        and the 'mode' used ('full', 'from_updated_date' or 'updated_date')
+    """
+    # Dates of OpenAlex records are in UTC; from_updated_date includes the day itself, so the overlap is refetched
+    sync_date = datetime.now(timezone.utc).date().isoformat()
+    since = since or get_synced_date(conn)
+    work_ids = get_library_work_ids(conn)
+
+    with bypass_response_cache():
+        if since is None:
+            mode = 'full'
+            report = get_works_by_ids_report(work_ids, max_workers)
+        elif supports_from_updated_date(since):
+            mode = 'from_updated_date'
+            # Unchanged works do not match the filter, so they come back missing
+            report = get_works_by_ids_report(work_ids, max_workers, retry_missing=False,
+                                             filters={'from_updated_date': since})
+        else:
+            mode = 'updated_date'
+            report = _get_changed_by_updated_date(conn, work_ids, max_workers)
+    live = serves_live_responses()
+
+    with (writer or lend_connection(conn))() as write_conn:
+        progress = ingest_works(write_conn, report.works)
+        if not report.errored and live:
+            set_synced_date(write_conn, sync_date)
+
+    print(f"Refreshed {progress['written']} of {len(work_ids)} library works changed since {since or 'ever'} "
+          f"({mode}, {len(report.errored)} errored)")
+    return {
+        'checked': len(work_ids),
+        'updated': progress['written'],
+        'errored': len(report.errored),
+        'since': since,
+        'mode': mode,
+    }
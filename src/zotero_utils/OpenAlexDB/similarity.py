@@ -0,0 +1,160 @@
+"""
+Co-citation and bibliographic coupling between the works of the library.
+
+Two library works are coupled by the references they share, and co-cited by the works citing them both.
+With A the sparse adjacency matrix of the library works (rows) to the works on the other side of their
+citations (columns), both weights are A·Aᵀ: coupling when the columns are the works they cite, co-citation
+when the columns are the works citing them. Each work keeps its top k links, and the result is cached in
+library_similarity until the library or its citations change.
+"""
+
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from .clean import int_to_work_id, work_id_to_int
+
+DEFAULT_TOP_K = 10
+
+# Citation edge table -> its columns of the citing and cited works
+EDGE_TABLE_COLUMNS = {
+    'works_referenced_works': {'citing': 'work_id', 'cited': 'referenced_work_id'},
+    'works_cited_by': {'citing': 'citing_work_id', 'cited': 'work_id'},
+}
+
+# Kind of similarity -> (side of the library works, side of the other works) of the citation edges
+SIMILARITY_KINDS: Dict[str, Tuple[str, str]] = {
+    'coupling': ('citing', 'cited'),
+    'cocitation': ('cited', 'citing'),
+}
+
+
+def get_library_edges(conn: sqlite3.Connection, library_numbers: np.ndarray, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the citation edges on the library side of a kind of similarity, from both edge tables.
+
+    Returns:
+        (library work numbers, other work numbers) arrays, sorted
+    """
+    library_column, other_column = SIMILARITY_KINDS[kind]
+    library_json = json.dumps(library_numbers.tolist())
+    selects = []
+    for table, columns in EDGE_TABLE_COLUMNS.items():
+        selects.append(f"""
+            SELECT {columns[library_column]}, {columns[other_column]} FROM {table}
+            WHERE {columns[library_column]} IN (SELECT value FROM json_each(?))
+        """)
+    cursor = conn.execute(" UNION ".join(selects) + " ORDER BY 1, 2", (library_json,) * len(selects))
+    edges = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    return edges[:, 0], edges[:, 1]
+
+
+def compute_similarity(
+    library_numbers: np.ndarray,
+    library_side: np.ndarray,
+    other_side: np.ndarray,
+    top_k: int = DEFAULT_TOP_K
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Weigh the pairs of library works by their shared neighbours, keeping the top k pairs of each work.
+
+    Args:
+        library_numbers: Sorted numbers of the library works
+        library_side: Number of the library work of each edge
+        other_side: Number of the other work of each edge
+        top_k: Links kept per work (a pair is kept if it is in the top k of either work)
+
+    Returns:
+        (work, other work, weight) arrays of the pairs kept, each pair once with work < other work
+    """
+    n = len(library_numbers)
+    rows = np.searchsorted(library_numbers, library_side)
+    _, columns = np.unique(other_side, return_inverse=True)
+    adjacency = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=(n, int(columns.max(initial=-1)) + 1)
+    )
+    weights = (adjacency @ adjacency.T).tocsr()
+
+    pair_rows = np.repeat(np.arange(n), np.diff(weights.indptr))
+    pair_columns, pair_weights = weights.indices, weights.data
+    # Rank the pairs of each row by weight, descending (ties by column), and keep the first top_k
+    order = np.lexsort((pair_columns, -pair_weights, pair_rows))
+    order = order[pair_rows[order] != pair_columns[order]]
+    rank = np.arange(len(order)) - np.searchsorted(pair_rows[order], pair_rows[order])
+    kept = order[rank < top_k]
+
+    first = np.minimum(pair_rows[kept], pair_columns[kept])
+    second = np.maximum(pair_rows[kept], pair_columns[kept])
+    n_keys = max(n, 1)
+    keys, unique = np.unique(first.astype(np.int64) * n_keys + second, return_index=True)
+    return library_numbers[keys // n_keys], library_numbers[keys % n_keys], pair_weights[kept][unique]
+
+
+def _fingerprint(library_numbers: np.ndarray, library_side: np.ndarray, other_side: np.ndarray, top_k: int) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (library_numbers, library_side, other_side, np.array([top_k], dtype=np.int64)):
+        digest.update(array.astype(np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def get_similarity_edges(
+    conn: sqlite3.Connection,
+    library_work_ids: List[str],
+    kind: str = 'coupling',
+    top_k: int = DEFAULT_TOP_K,
+    commit: bool = True
+) -> List[dict]:
+    """
+    Get the weighted co-citation or bibliographic coupling links between library works.
+
+    The links are computed when the library, its citations or top_k changed since they were cached, and
+    read from library_similarity otherwise.
+
+    Args:
+        conn: SQLite database connection (a writer, to cache the result)
+        library_work_ids: OpenAlex IDs of the library works
+        kind: 'coupling' (shared references) or 'cocitation' (shared citing works)
+        top_k: Links kept per work
+        commit: Commit the transaction
+
+    Returns:
+        List of edges: {'source', 'target', 'weight', 'type'}, the heaviest first
+
+    Raises:
+        ValueError: If kind is unknown
+    """
+    if kind not in SIMILARITY_KINDS:
+        raise ValueError(f"Unknown similarity kind: {kind} (expected one of {', '.join(SIMILARITY_KINDS)})")
+    numbers = (work_id_to_int(work_id) for work_id in library_work_ids)
+    library_numbers = np.unique(np.array([number for number in numbers if number is not None], dtype=np.int64))
+    library_side, other_side = get_library_edges(conn, library_numbers, kind)
+    fingerprint = _fingerprint(library_numbers, library_side, other_side, top_k)
+
+    row = conn.execute("SELECT fingerprint FROM library_similarity_state WHERE kind = ?", (kind,)).fetchone()
+    if row is None or row[0] != fingerprint:
+        works, others, weights = compute_similarity(library_numbers, library_side, other_side, top_k)
+        conn.execute("DELETE FROM library_similarity WHERE kind = ?", (kind,))
+        conn.executemany(
+            "INSERT INTO library_similarity (kind, work_id, other_work_id, weight) VALUES (?, ?, ?, ?)",
+            [(kind, work, other, weight) for work, other, weight in zip(works.tolist(), others.tolist(), weights.tolist())]
+        )
+        conn.execute("""
+            INSERT OR REPLACE INTO library_similarity_state (kind, fingerprint, computed_at) VALUES (?, ?, ?)
+        """, (kind, fingerprint, datetime.now().isoformat()))
+        if commit:
+            conn.commit()
+
+    cursor = conn.execute("""
+        SELECT work_id, other_work_id, weight FROM library_similarity
+        WHERE kind = ?
+        ORDER BY weight DESC, work_id, other_work_id
+    """, (kind,))
+    return [
+        {'source': int_to_work_id(work), 'target': int_to_work_id(other), 'weight': weight, 'type': kind}
+        for work, other, weight in cursor
+    ]
@@ -0,0 +1,160 @@
+"""
+Offline loader for OpenAlex snapshot files.
+
+The OpenAlex snapshot stores each entity as gzipped JSON Lines partitions, e.g.
+data/works/updated_date=2024-01-01/part_000.gz. This module streams such partitions (or any local dump with
+the same shape, gzipped or not) into the works tables of the OpenAlexDB schema without using the API.
+Partitions are read line by line and sent in chunks to worker processes, which parse them, to be written by
+a single writer thread (see ingest_pipeline). Memory therefore stays bounded whatever the partition size.
+"""
+
+import glob
+import gzip
+import itertools
+import json
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Set
+
+from .clean import remove_base_url
+from .ingest_pipeline import DEFAULT_CHUNK_SIZE, IngestPipeline, ParseResult
+from .work import work_to_rows
+
+PARTITION_PATTERNS = ("*.gz", "*.jsonl", "*.json")
+
+
+def find_partitions(path: str) -> List[str]:
+    """
+    Find the snapshot partition files under a path.
+
+    Args:
+        path: A partition file, or a directory searched recursively (e.g. the snapshot's data/works directory)
+
+    Returns:
+        Sorted list of partition file paths
+    """
+    if os.path.isfile(path):
+        return [path]
+    partitions = set()
+    for pattern in PARTITION_PATTERNS:
+        partitions.update(glob.glob(os.path.join(path, "**", pattern), recursive=True))
+    return sorted(partitions)
+
+
+def iter_partition_lines(partition: str) -> Iterator[str]:
+    """Yield the non-empty lines of a partition file, each a JSON record."""
+    opener = gzip.open if partition.endswith(".gz") else open
+    with opener(partition, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def iter_partition_records(partition: str) -> Iterator[dict]:
+    """Yield the JSON records of a partition file, one per line."""
+    for line in iter_partition_lines(partition):
+        yield json.loads(line)
+
+
+def in_neighbourhood(work: dict, neighbourhood_ids: Optional[Set[str]]) -> bool:
+    """
+    Whether a work is in the neighbourhood: it is one of the given works, or it cites one of them.
+
+    Args:
+        work: Work dict
+        neighbourhood_ids: OpenAlex IDs (without URL prefix) of the works to keep. None keeps every work.
+    """
+    if neighbourhood_ids is None:
+        return True
+    if remove_base_url(work.get('id') or '') in neighbourhood_ids:
+        return True
+    return any(remove_base_url(ref) in neighbourhood_ids for ref in work.get('referenced_works') or [] if ref)
+
+
+def parse_records(lines: List[str], neighbourhood_ids: Optional[Set[str]] = None) -> ParseResult:
+    """
+    Parse a chunk of partition lines into the rows of the works tables. Runs in a worker process.
+
+    Args:
+        lines: JSON records of a partition (see iter_partition_lines)
+        neighbourhood_ids: Only keep works in this neighbourhood (see in_neighbourhood). None keeps every work.
+
+    Returns:
+        (works_rows, n_read): work ID -> rows of each work kept; number of records read
+    """
+    works_rows = {}
+    for line in lines:
+        work = json.loads(line)
+        if not work.get('id') or not in_neighbourhood(work, neighbourhood_ids):
+            continue
+        works_rows[remove_base_url(work['id'])] = work_to_rows(work)
+    return works_rows, len(lines)
+
+
+def get_library_neighbourhood_ids(conn: sqlite3.Connection) -> Set[str]:
+    """
+    Get the IDs of the library's works and of the works they reference, as cached in the database.
+
+    Passing these to load_snapshot() also keeps the works citing any of them.
+    """
+    cursor = conn.execute("""
+        SELECT openalex_work_id FROM zotero_openalex_mapping WHERE openalex_work_id IS NOT NULL
+        UNION
+        SELECT 'W' || r.referenced_work_id FROM zotero_openalex_mapping m
+        JOIN works_referenced_works r ON r.work_id = CAST(substr(m.openalex_work_id, 2) AS INTEGER)
+    """)
+    return {row[0] for row in cursor.fetchall()}
+
+
+def load_snapshot(
+    conn: sqlite3.Connection,
+    path: str,
+    neighbourhood_ids: Optional[Set[str]] = None,
+    max_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, int]:
+    """
+    Load OpenAlex snapshot work partitions into the database.
+
+    Partitions are parsed and written in chunks, so an interrupted load keeps every chunk written so far;
+    loading again resumes cheaply, as works unchanged since they were last written are skipped.
+
+    Args:
+        conn: SQLite database connection (the single writer), usable from other threads (see connection.connect)
+        path: A partition file or a directory of partitions (see find_partitions)
+        neighbourhood_ids: Only load these works and the works citing them (e.g. from
+            get_library_neighbourhood_ids). None loads every work.
+        max_workers: Number of worker processes parsing partitions. Defaults to the number of CPUs.
+            1 parses in a thread.
+        chunk_size: Records per parse task
+
+    Returns:
+        Dict with the number of 'partitions' read, records 'read', works 'loaded' and citation 'edges' loaded
+    """
+    partitions = find_partitions(path)
+    max_workers = max_workers or os.cpu_count() or 1
+    print(f"Loading {len(partitions)} snapshot partitions from {path} with {max_workers} parser processes...")
+
+    unreadable = 0
+    with IngestPipeline(conn, max_workers=max_workers, chunk_size=chunk_size) as pipeline:
+        for partition in partitions:
+            lines = iter_partition_lines(partition)
+            try:
+                # Blocks while max_pending chunks are in flight, so only those are held in memory
+                for chunk in iter(lambda: list(itertools.islice(lines, chunk_size)), []):
+                    pipeline.submit(parse_records, chunk, neighbourhood_ids)
+            except (OSError, EOFError, UnicodeDecodeError) as e:
+                print(f"Error reading partition {partition}: {e}")
+                unreadable += 1
+    progress = pipeline.progress()
+
+    counts = {
+        'partitions': len(partitions) - unreadable,
+        'read': progress['read'],
+        'loaded': progress['parsed'],
+        'edges': progress['edges'],
+    }
+    print(f"Loaded {counts['loaded']} works ({progress['unchanged']} unchanged) and {counts['edges']} citations "
+          f"from {counts['read']} records")
+    return counts
@@ -21,10 +21,12 @@ class Source:
         """
         if not isinstance(source_ids, list):
             source_ids = [source_ids]
-        pyalexSources = pyalex.Sources().get([source_ids])
+        from zotero_utils.OpenAlexDB.get_items_from_api import get_entities_by_id
+        pyalexSources = get_entities_by_id(source_ids).get('S', [])
         sources = [Source(s) for s in pyalexSources]
         for source in sources:
-            source.insert_or_replace_in_db(conn)
+            source.insert_or_replace_in_db(conn, commit=False)
+        conn.commit()
         return sources
     
     @staticmethod
@@ -53,32 +55,49 @@ class Source:
         conn.execute("DELETE FROM sources_counts_by_year WHERE source_id=?", (source_id,))
         conn.execute("DELETE FROM sources_ids WHERE source_id=?", (source_id,))
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    def insert_or_replace_in_db(self, conn: sqlite3.Connection, commit: bool = True):
         """
-        Insert the source into the database.
+        Insert the source into the database. Uses defensive .get() access for all fields.
         """
         source = self.source
+        source_id = self.source_id
         # SOURCES
-        insert_tuple = (remove_base_url(source['id']), source['issn_l'], source['issn'], source['display_name'], source['publisher'], source['works_count'], source['cited_by_count'], source['is_oa'], source['is_in_doaj'], source ['homepage_url'], source['works_api_url'], source['updated_date'])
+        # The publisher of a source is its host organization in the current API
+        publisher = source.get('publisher') or source.get('host_organization_name')
+        insert_tuple = (
+            source_id,
+            source.get('issn_l'),
+            json.dumps(source.get('issn') or []),
+            source.get('display_name'),
+            publisher,
+            source.get('works_count'),
+            source.get('cited_by_count'),
+            int(source.get('is_oa') or False),
+            int(source.get('is_in_doaj') or False),
+            source.get('homepage_url'),
+            source.get('works_api_url'),
+            source.get('updated_date')
+        )
         question_marks = ', '.join(['?'] * len(insert_tuple))
         conn.execute(
             f"REPLACE INTO sources (id, issn_l, issn, display_name, publisher, works_count, cited_by_count, is_oa, is_in_doaj, homepage_url, works_api_url, updated_date) VALUES ({question_marks})", insert_tuple
         )
 
         # SOURCES_COUNTS_BY_YEAR
-        for year, count in source['counts_by_year'].items():
-            insert_tuple = (remove_base_url(source['id']), year, count, works_count, cited_by_count, oa_works_count)
-            question_marks = ', '.join(['?'] * len(insert_tuple))
+        conn.execute("DELETE FROM sources_counts_by_year WHERE source_id=?", (source_id,))
+        for count in source.get('counts_by_year') or []:
+            insert_tuple = (source_id, count.get('year'), count.get('works_count'), count.get('cited_by_count'), count.get('oa_works_count'))
             conn.execute(
-                f"REPLACE INTO sources_counts_by_year (source_id, year, works_count, cited_by_count, oa_works_count) VALUES ({question_marks})", insert_tuple
+                "REPLACE INTO sources_counts_by_year (source_id, year, works_count, cited_by_count, oa_works_count) VALUES (?, ?, ?, ?, ?)", insert_tuple
             )
 
         # SOURCES_IDS
-        for ids in source['ids']:
-            insert_tuple = (remove_base_url(source['id']), ids['openalex'], ids['issn_l'], ids['issn'], ids['mag'], ids['wikidata'], ids['fatcat'])
-            question_marks = ', '.join(['?'] * len(insert_tuple))
-            conn.execute(
-                f"REPLACE INTO sources_ids (source_id, openalex, issn_l, issn, mag, wikidata, fatcat) VALUES ({question_marks})", insert_tuple
-            )
+        conn.execute("DELETE FROM sources_ids WHERE source_id=?", (source_id,))
+        ids = source.get('ids') or {}
+        insert_tuple = (source_id, ids.get('openalex'), ids.get('issn_l'), json.dumps(ids.get('issn') or []), ids.get('mag'), ids.get('wikidata'), ids.get('fatcat'))
+        conn.execute(
+            "INSERT INTO sources_ids (source_id, openalex, issn_l, issn, mag, wikidata, fatcat) VALUES (?, ?, ?, ?, ?, ?, ?)", insert_tuple
+        )
 
-        conn.commit()
\ No newline at end of file
+        if commit:
+            conn.commit()
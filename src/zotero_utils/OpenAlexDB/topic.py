@@ -21,10 +21,12 @@ class Topic:
         """
         if not isinstance(topic_ids, list):
             topic_ids = [topic_ids]
-        pyalexTopics = pyalex.Topics().get([topic_ids])
+        from zotero_utils.OpenAlexDB.get_items_from_api import get_entities_by_id
+        pyalexTopics = get_entities_by_id(topic_ids).get('T', [])
         topics = [Topic(t) for t in pyalexTopics]
         for topic in topics:
-            topic.insert_or_replace_in_db(conn)
+            topic.insert_or_replace_in_db(conn, commit=False)
+        conn.commit()
         return topics
 
     @staticmethod
@@ -48,16 +50,36 @@ class Topic:
         topic_id = self.topic_id
         conn.execute("DELETE FROM topics WHERE id=?", (topic_id,))
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    def insert_or_replace_in_db(self, conn: sqlite3.Connection, commit: bool = True):
         """
-        Insert the topic into the database.
+        Insert the topic into the database. Uses defensive .get() access for all fields.
         """
         topic = self.topic
+        subfield = topic.get('subfield') or {}
+        field = topic.get('field') or {}
+        domain = topic.get('domain') or {}
         # TOPICS
-        insert_tuple = (remove_base_url(topic['id']),topic['display_name'], remove_base_url(topic['subfield_id']), topic['subfield_display_name'], remove_base_url(topic['field_id']),topic['field_display_name'], remove_base_url(topic['domain_id']), topic['domain_display_name'], topic['description'], topic['keywords'], topic['works_api_url'], topic['wikipedia_id'], topic['works_count'], topic['cited_by_count'], topic['updated_date'])
+        insert_tuple = (
+            self.topic_id,
+            topic.get('display_name'),
+            remove_base_url(subfield.get('id') or ''),
+            subfield.get('display_name'),
+            remove_base_url(field.get('id') or ''),
+            field.get('display_name'),
+            remove_base_url(domain.get('id') or ''),
+            domain.get('display_name'),
+            topic.get('description'),
+            json.dumps(topic.get('keywords') or []),
+            topic.get('works_api_url'),
+            (topic.get('ids') or {}).get('wikipedia'),
+            topic.get('works_count'),
+            topic.get('cited_by_count'),
+            topic.get('updated_date')
+        )
         question_marks = ', '.join(['?'] * len(insert_tuple))
         conn.execute(
             f"REPLACE INTO topics (id, display_name, subfield_id, subfield_display_name, field_id, field_display_name, domain_id, domain_display_name, description, keywords, works_api_url, wikipedia_id, works_count, cited_by_count, updated_date) VALUES ({question_marks})", insert_tuple
         )
 
-        conn.commit()
\ No newline at end of file
+        if commit:
+            conn.commit()
@@ -1,10 +1,68 @@
+import hashlib
+import os
 import sqlite3
 import json
-from typing import Union, List
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
 
 import pyalex
 
-from zotero_utils.OpenAlexDB.clean import remove_base_url
+from zotero_utils.OpenAlexDB.clean import int_to_work_id, remove_base_url, work_id_to_int
+
+# Values of works.fetch_tier. A stub only has the fields needed to display the work as a graph node
+# (see OpenAlexAPI.works.STUB_WORK_FIELDS) and no child rows other than its authorships.
+FETCH_TIER_STUB = 'stub'
+FETCH_TIER_FULL = 'full'
+
+DEFAULT_FLUSH_SIZE = 500  # Works buffered by WorkBatchWriter before writing them
+READ_CHUNK_SIZE = 500  # Work IDs per IN list when reading works
+OPENALEX_BASE_URL = "https://openalex.org/"
+
+# Database path (see database_path) -> objects notified of the citation edges written to and works deleted
+# from that database, e.g. an attached graph_engine.CitationGraph. They implement references_written(references),
+# citations_added(work_number, citing_numbers), works_deleted(work_numbers) and edges_cleared(), with work IDs
+# as numbers (see work_id_to_int).
+EDGE_LISTENERS: Dict[str, List] = {}
+
+
+def database_path(conn: sqlite3.Connection) -> str:
+    """Absolute path of the main database file of a connection ('' for an in-memory database)."""
+    path = getattr(conn, 'path', None)
+    if path is None:
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+    return os.path.abspath(path) if path else ''
+
+
+def notify_edge_listeners(conn: sqlite3.Connection, event: str, *args):
+    """
+    Call the method `event` with `args` of every edge listener of the database written through conn.
+
+    On a connection.OpenAlexConnection the listeners are called once the transaction commits, and not at all
+    if it is rolled back. On other connections they are called at once.
+    """
+    path = database_path(conn)
+    if not EDGE_LISTENERS.get(path):
+        return
+
+    def notify():
+        for listener in list(EDGE_LISTENERS.get(path, ())):
+            getattr(listener, event)(*args)
+
+    after_commit = getattr(conn, 'after_commit', None)
+    if after_commit is not None:
+        after_commit(notify)
+    else:
+        notify()
+
+
+def _notify_references_written(conn: sqlite3.Connection, reference_rows: List[tuple]):
+    """Notify the edge listeners of written works_referenced_works rows."""
+    if not reference_rows or not EDGE_LISTENERS.get(database_path(conn)):
+        return
+    references: Dict[int, List[int]] = {}
+    for work_number, referenced_number in reference_rows:
+        references.setdefault(work_number, []).append(referenced_number)
+    notify_edge_listeners(conn, 'references_written', references)
 
 class Work:
 
@@ -21,80 +79,410 @@ class Work:
         """
         if not isinstance(work_ids, list):
             work_ids = [work_ids]
-        pyalexWorks = pyalex.Works().get([work_ids]) # I think this may be the syntax for just one work. How to do this for a list of works at once?
+        from zotero_utils.OpenAlexDB.get_items_from_api import get_entities_by_id
+        pyalexWorks = get_entities_by_id(work_ids).get('W', [])
         works = [Work(w) for w in pyalexWorks]
         for work in works:
-            work.insert_or_replace_in_db(conn)
+            work.insert_or_replace_in_db(conn, commit=False)
+        conn.commit()
         return works
 
     @staticmethod
-    def read_works_from_db_by_ids(conn: sqlite3.Connection, work_ids: Union[List[str], str]) ->  "Work":
+    def read_works_from_db_by_ids(
+        conn: sqlite3.Connection,
+        work_ids: Union[List[str], str],
+        full_only: bool = False
+    ) -> List["Work"]:
         """
-        Query the database for a particular work to create its pyalex.Work dict. 
+        Query the database for work(s) to recreate their pyalex.Work dicts (see read_work_dicts).
+
+        Args:
+            conn: SQLite database connection
+            work_ids: ID(s) of the works
+            full_only: Skip works only cached as stubs
+
+        Returns:
+            The works found, in the order of work_ids
         """
         if not isinstance(work_ids, list):
             work_ids = [work_ids]
-        work_dict = {}
-        cursor = conn.cursor()
+        work_dicts = read_work_dicts(conn, work_ids, full_only=full_only)
+        work_ids = dict.fromkeys(remove_base_url(work_id) for work_id in work_ids)
+        return [Work(pyalex.Work(work_dicts[work_id])) for work_id in work_ids if work_id in work_dicts]
 
-        # WORKS
-        cursor.execute("SELECT * FROM works WHERE id=?", (remove_base_url(work_id),))
-        work_id = cursor.fetchone()
-
-        # WORKS_PRIMARY_LOCATIONS
-
-        # WORKS_LOCATIONS
-
-        # WORKS_BEST_OA_LOCATIONS
+    @staticmethod
+    def get_works_by_ids(conn: sqlite3.Connection, work_ids: Union[List[str], str]) -> List["Work"]:
+        """
+        Read-through cache of works: read them from the database, and fetch the ones not cached in full
+        from the OpenAlex web API (inserting them into the database).
 
-        # WORKS_AUTHORSHIPS
+        Returns:
+            The works found, in the order of work_ids
+        """
+        if not isinstance(work_ids, list):
+            work_ids = [work_ids]
+        work_ids = list(dict.fromkeys(remove_base_url(work_id) for work_id in work_ids))
+        works = {work.work_id: work for work in Work.read_works_from_db_by_ids(conn, work_ids, full_only=True)}
+        missing_ids = [work_id for work_id in work_ids if work_id not in works]
+        if missing_ids:
+            for work in Work.create_works_from_web_api_by_ids(conn, missing_ids):
+                works[work.work_id] = work
+        return [works[work_id] for work_id in work_ids if work_id in works]
 
-        # WORKS_BIBLIO
+    def delete(self, conn: sqlite3.Connection):
+        """
+        Delete the work from the database.
+        """
+        Work.delete_many(conn, [self.work_id])
 
-        # WORKS_TOPICS
+    @staticmethod
+    def delete_many(conn: sqlite3.Connection, work_ids: List[str], commit: bool = True) -> int:
+        """
+        Delete works and all their rows from the database, with one executemany per table.
 
-        # WORKS_CONCEPTS
+        The works' citations cached in "cited by" lists are deleted too, both ways, and so are the authors left
+        without works. Rows of other works pointing at them (e.g. their references) are kept.
 
-        # WORKS_IDS
+        Args:
+            conn: SQLite database connection
+            work_ids: IDs of the works
+            commit: Commit the transaction
 
-        # WORKS_MESH
+        Returns:
+            Number of works deleted
+        """
+        work_ids = [remove_base_url(work_id) for work_id in work_ids]
+        id_params = [(work_id,) for work_id in work_ids]
+        number_params = [(work_id_to_int(work_id),) for work_id in work_ids]
+        author_ids = [row[0] for row in conn.execute(
+            "SELECT DISTINCT author_id FROM works_authorships WHERE work_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(work_ids),)
+        )]
+        deleted = conn.executemany("DELETE FROM works WHERE id=?", id_params).rowcount
+        for table in WORK_CHILD_TABLES + ['works_cited_by_fetch_state']:
+            conn.executemany(f"DELETE FROM {table} WHERE work_id=?", id_params)
+        conn.executemany("DELETE FROM works_content_hashes WHERE work_id=?", id_params)
+        for table, column in {**WORK_NUMBER_KEYED_TABLES, 'works_cited_by': 'work_id'}.items():
+            conn.executemany(f"DELETE FROM {table} WHERE {column}=?", number_params)
+        conn.executemany("DELETE FROM works_cited_by WHERE citing_work_id=?", number_params)
+        orphaned_params = [row for row in conn.execute("""
+            SELECT value FROM json_each(?)
+            WHERE NOT EXISTS (SELECT 1 FROM works_authorships WHERE author_id = value)
+        """, (json.dumps(author_ids),))]
+        for table, column in AUTHOR_TABLES.items():
+            conn.executemany(f"DELETE FROM {table} WHERE {column}=?", orphaned_params)
+        notify_edge_listeners(conn, 'works_deleted', [number for (number,) in number_params if number is not None])
+        if commit:
+            conn.commit()
+        return deleted
+
+    def insert_stub_in_db(self, conn: sqlite3.Connection, commit: bool = True) -> bool:
+        """
+        Insert a stub of the work (display fields and authorships only) into the database.
 
-        # WORKS_OPEN_ACCESS
+        An existing full record is never downgraded to a stub.
 
-        # WORKS_REFERENCED_WORKS
+        Returns:
+            True if the stub was written, False if a full record already existed
+        """
+        work = self.work
+        now = datetime.now().isoformat()
+        cursor = conn.execute(
+            """
+            INSERT INTO works (id, doi, title, display_name, publication_year, type, cited_by_count, fetch_tier,
+                               updated_date, fetched_at, last_accessed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                doi=excluded.doi, title=excluded.title, display_name=excluded.display_name,
+                publication_year=excluded.publication_year, type=excluded.type, cited_by_count=excluded.cited_by_count,
+                updated_date=excluded.updated_date, fetched_at=excluded.fetched_at, last_accessed=excluded.last_accessed
+            WHERE works.fetch_tier = ?
+            """,
+            (
+                self.work_id,
+                str(work.get('doi') or ''),
+                work.get('title') or '',
+                work.get('display_name') or '',
+                work.get('publication_year'),
+                work.get('type') or '',
+                work.get('cited_by_count') or 0,
+                FETCH_TIER_STUB,
+                work.get('updated_date'),
+                now,
+                now,
+                FETCH_TIER_STUB,
+            )
+        )
+        written = cursor.rowcount > 0
+        if written:
+            self._insert_authorships(conn)
+            write_work_rows(conn, [self.work_id], work_to_rows(work, tables=('works_fts',)))
+        if commit:
+            conn.commit()
+        return written
+
+    def _insert_authorships(self, conn: sqlite3.Connection):
+        """
+        Replace the work's authorships, and insert the basic info of its authors.
+        """
+        rows = work_to_rows(self.work, tables=('authors', 'works_authorships'))
+        # works_authorships has no primary key, so clear the old rows (e.g. of a stub) first
+        conn.execute("DELETE FROM works_authorships WHERE work_id=?", (self.work_id,))
+        conn.executemany(WORK_TABLE_INSERTS['authors'], rows['authors'])
+        conn.executemany(WORK_TABLE_INSERTS['works_authorships'], rows['works_authorships'])
 
-        # WORKS_RELATED_WORKS
-        return Work(pyalex.Work(work_dict))
-    
-    def delete(self, conn: sqlite3.Connection):
+    def to_rows(self) -> Dict[str, List[tuple]]:
         """
-        Delete the work from the database.
+        Convert the work into the rows of each works table (see work_to_rows).
         """
-        work_id = self.work_id
-        conn.execute("DELETE FROM works WHERE id=?", (work_id,))
-        conn.execute("DELETE FROM works_primary_locations WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_locations WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_best_oa_locations WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_authorships WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_biblio WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_topics WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_concepts WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_ids WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_mesh WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_open_access WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_referenced_works WHERE work_id=?", (work_id,))
-        conn.execute("DELETE FROM works_related_works WHERE work_id=?", (work_id,))
-        conn.commit()
+        return work_to_rows(self.work)
 
-    def insert_or_replace_in_db(self, conn: sqlite3.Connection):
+    def insert_or_replace_in_db(self, conn: sqlite3.Connection, commit: bool = True):
         """
         Insert the work into the database. Uses defensive .get() access for all fields.
+
+        Only the tables whose rows changed since the work was last written are rewritten.
+        Pass commit=False to leave the transaction open, e.g. to write many works in one transaction.
         """
-        work = self.work
-        work_id = self.work_id
+        write_changed_work_rows(conn, {self.work_id: self.to_rows()})
+        if commit:
+            conn.commit()
+
+
+def _location_row(work_id: str, location: dict) -> tuple:
+    source = location.get('source') or {}
+    source_id = source.get('id') or ''
+    return (
+        work_id,
+        remove_base_url(source_id) if source_id else None,
+        location.get('landing_page_url'),
+        location.get('pdf_url'),
+        int(location.get('is_oa') or False),
+        location.get('version'),
+        location.get('license')
+    )
+
+
+def abstract_from_inverted_index(inverted_index: Union[dict, str, None]) -> str:
+    """
+    Rebuild the plain text of an abstract from its OpenAlex abstract_inverted_index (word -> positions).
+
+    Args:
+        inverted_index: The inverted index, or its JSON as stored in works.abstract_inverted_index
+
+    Returns:
+        The abstract, or '' if there is none
+    """
+    if isinstance(inverted_index, str):
+        inverted_index = json.loads(inverted_index) if inverted_index else None
+    if not inverted_index:
+        return ''
+    words_by_position = {}
+    for word, positions in inverted_index.items():
+        for position in positions:
+            words_by_position[position] = word
+    return ' '.join(words_by_position[position] for position in sorted(words_by_position))
+
+
+def _openalex_url(entity_id: Optional[str]) -> Optional[str]:
+    return OPENALEX_BASE_URL + entity_id if entity_id else None
+
+
+def _select_by_work_ids(conn: sqlite3.Connection, sql: str, work_ids: List[str]) -> List[tuple]:
+    """Run a query with a `{work_ids}` placeholder for an IN list, in chunks of READ_CHUNK_SIZE IDs."""
+    rows = []
+    for i in range(0, len(work_ids), READ_CHUNK_SIZE):
+        chunk = work_ids[i:i + READ_CHUNK_SIZE]
+        rows.extend(conn.execute(sql.format(work_ids=', '.join(['?'] * len(chunk))), chunk).fetchall())
+    return rows
+
+
+def _location_dict(row: tuple) -> dict:
+    source_id, source_name, landing_page_url, pdf_url, is_oa, version, license = row
+    return {
+        'source': {'id': _openalex_url(source_id), 'display_name': source_name} if source_id else None,
+        'landing_page_url': landing_page_url,
+        'pdf_url': pdf_url,
+        'is_oa': bool(is_oa),
+        'version': version,
+        'license': license,
+    }
+
+
+def read_work_dicts(conn: sqlite3.Connection, work_ids: List[str], full_only: bool = False) -> Dict[str, dict]:
+    """
+    Rebuild the OpenAlex work dicts of many works from the database.
+
+    This is the inverse of work_to_rows(). It runs one query per works table (chunked IN lists for
+    very large batches), however many works are read, instead of one query per table per work.
+
+    Args:
+        conn: SQLite database connection
+        work_ids: IDs of the works, with or without URL prefix
+        full_only: Skip works only cached as stubs
+
+    Returns:
+        Dict mapping work ID (without URL prefix) -> work dict, for the works found
+    """
+    work_ids = list(dict.fromkeys(remove_base_url(work_id) for work_id in work_ids))
+    works = {}
+
+    # WORKS
+    for row in _select_by_work_ids(conn, """
+        SELECT id, doi, title, display_name, publication_year, publication_date, type, cited_by_count,
+               is_retracted, is_paratext, cited_by_api_url, abstract_inverted_index, language, fetch_tier, updated_date
+        FROM works WHERE id IN ({work_ids})
+    """, work_ids):
+        if full_only and row[13] == FETCH_TIER_STUB:
+            continue
+        works[row[0]] = {
+            'id': _openalex_url(row[0]),
+            'doi': row[1] or None,
+            'title': row[2] or None,
+            'display_name': row[3] or None,
+            'publication_year': row[4],
+            'publication_date': row[5],
+            'type': row[6] or None,
+            'cited_by_count': row[7],
+            'is_retracted': bool(row[8]),
+            'is_paratext': bool(row[9]),
+            'cited_by_api_url': row[10] or None,
+            'abstract_inverted_index': json.loads(row[11]) if row[11] and row[11] != '{}' else None,
+            'language': row[12] or None,
+            'updated_date': row[14],
+            'authorships': [],
+            'locations': [],
+            'primary_location': None,
+            'best_oa_location': None,
+            'topics': [],
+            'concepts': [],
+            'mesh': [],
+            'referenced_works': [],
+            'related_works': [],
+        }
+    work_ids = list(works)
+    if not work_ids:
+        return works
 
-        # WORKS - main table
-        insert_tuple = (
+    # WORKS_PRIMARY_LOCATIONS, WORKS_LOCATIONS, WORKS_BEST_OA_LOCATIONS
+    for table, key in (('works_primary_locations', 'primary_location'),
+                       ('works_locations', 'locations'),
+                       ('works_best_oa_locations', 'best_oa_location')):
+        for row in _select_by_work_ids(conn, f"""
+            SELECT l.work_id, l.source_id, s.display_name, l.landing_page_url, l.pdf_url, l.is_oa, l.version, l.license
+            FROM {table} l LEFT JOIN sources s ON s.id = l.source_id
+            WHERE l.work_id IN ({{work_ids}}) ORDER BY l.rowid
+        """, work_ids):
+            if key == 'locations':
+                works[row[0]]['locations'].append(_location_dict(row[1:]))
+            else:
+                works[row[0]][key] = _location_dict(row[1:])
+
+    # WORKS_AUTHORSHIPS - one row per (author, institution), in the order they were written
+    for work_id, author_position, author_id, author_name, institution_id, institution_name in _select_by_work_ids(conn, """
+        SELECT wa.work_id, wa.author_position, wa.author_id, a.display_name, wa.institution_id, i.display_name
+        FROM works_authorships wa
+        LEFT JOIN authors a ON a.id = wa.author_id
+        LEFT JOIN institutions i ON i.id = wa.institution_id
+        WHERE wa.work_id IN ({work_ids}) ORDER BY wa.rowid
+    """, work_ids):
+        authorships = works[work_id]['authorships']
+        if not authorships or authorships[-1]['author']['id'] != _openalex_url(author_id):
+            authorships.append({
+                'author_position': author_position,
+                'author': {'id': _openalex_url(author_id), 'display_name': author_name},
+                'institutions': [],
+            })
+        if institution_id:
+            authorships[-1]['institutions'].append({'id': _openalex_url(institution_id), 'display_name': institution_name})
+
+    # WORKS_BIBLIO
+    for work_id, volume, issue, first_page, last_page in _select_by_work_ids(conn, """
+        SELECT work_id, volume, issue, first_page, last_page FROM works_biblio WHERE work_id IN ({work_ids})
+    """, work_ids):
+        works[work_id]['biblio'] = {'volume': volume, 'issue': issue, 'first_page': first_page, 'last_page': last_page}
+
+    # WORKS_TOPICS, WORKS_CONCEPTS
+    for table, column, entity_table, key in (('works_topics', 'topic_id', 'topics', 'topics'),
+                                             ('works_concepts', 'concept_id', 'concepts', 'concepts')):
+        for work_id, entity_id, display_name, score in _select_by_work_ids(conn, f"""
+            SELECT wt.work_id, wt.{column}, e.display_name, wt.score
+            FROM {table} wt LEFT JOIN {entity_table} e ON e.id = wt.{column}
+            WHERE wt.work_id IN ({{work_ids}}) ORDER BY wt.rowid
+        """, work_ids):
+            works[work_id][key].append({'id': _openalex_url(entity_id), 'display_name': display_name, 'score': score})
+
+    # WORKS_IDS
+    for work_id, *ids in _select_by_work_ids(conn, """
+        SELECT work_id, openalex, doi, mag, pmid, pmcid FROM works_ids WHERE work_id IN ({work_ids})
+    """, work_ids):
+        works[work_id]['ids'] = {
+            key: value for key, value in zip(('openalex', 'doi', 'mag', 'pmid', 'pmcid'), ids) if value is not None
+        }
+
+    # WORKS_MESH
+    for work_id, descriptor_ui, descriptor_name, qualifier_ui, qualifier_name, is_major_topic in _select_by_work_ids(conn, """
+        SELECT work_id, descriptor_ui, descriptor_name, qualifier_ui, qualifier_name, is_major_topic
+        FROM works_mesh WHERE work_id IN ({work_ids}) ORDER BY rowid
+    """, work_ids):
+        works[work_id]['mesh'].append({
+            'descriptor_ui': descriptor_ui,
+            'descriptor_name': descriptor_name,
+            'qualifier_ui': qualifier_ui,
+            'qualifier_name': qualifier_name,
+            'is_major_topic': bool(is_major_topic),
+        })
+
+    # WORKS_OPEN_ACCESS
+    for work_id, is_oa, oa_status, oa_url, any_repository_has_fulltext in _select_by_work_ids(conn, """
+        SELECT work_id, is_oa, oa_status, oa_url, any_repository_has_fulltext
+        FROM works_open_access WHERE work_id IN ({work_ids})
+    """, work_ids):
+        works[work_id]['open_access'] = {
+            'is_oa': bool(is_oa),
+            'oa_status': oa_status,
+            'oa_url': oa_url,
+            'any_repository_has_fulltext': bool(any_repository_has_fulltext),
+        }
+
+    # WORKS_REFERENCED_WORKS - keyed by the numbers of the work IDs
+    for work_number, referenced_number in _select_by_work_ids(conn, """
+        SELECT work_id, referenced_work_id FROM works_referenced_works WHERE work_id IN ({work_ids})
+    """, [work_id_to_int(work_id) for work_id in work_ids]):
+        works[int_to_work_id(work_number)]['referenced_works'].append(_openalex_url(int_to_work_id(referenced_number)))
+
+    # WORKS_RELATED_WORKS
+    for work_id, related_work_id in _select_by_work_ids(conn, """
+        SELECT work_id, related_work_id FROM works_related_works WHERE work_id IN ({work_ids}) ORDER BY rowid
+    """, work_ids):
+        works[work_id]['related_works'].append(_openalex_url(related_work_id))
+
+    return works
+
+
+def work_to_rows(work: dict, tables: Optional[Tuple[str, ...]] = None) -> Dict[str, List[tuple]]:
+    """
+    Convert a work dict (from the API or a snapshot) into the rows of each works table.
+
+    This is a pure function of the work, so it can run in worker processes. The rows are ordered
+    as the columns in WORK_TABLE_INSERTS.
+
+    Args:
+        work: Work dict
+        tables: Only build the rows of these tables. None for all of WORK_TABLE_INSERTS.
+
+    Returns:
+        Dict mapping table name -> list of row tuples
+    """
+    tables = tables or tuple(WORK_TABLE_INSERTS)
+    rows = {table: [] for table in tables}
+    fetched_at = datetime.now().isoformat()
+    work_id = remove_base_url(work['id'])
+    work_number = work_id_to_int(work_id)
+
+    # WORKS - main table
+    if 'works' in rows:
+        rows['works'].append((
             work_id,
             str(work.get('doi') or ''),
             work.get('title') or '',
@@ -107,204 +495,351 @@ class Work:
             int(work.get('is_paratext') or False),
             work.get('cited_by_api_url') or '',
             json.dumps(work.get('abstract_inverted_index') or {}),
-            work.get('language') or ''
-        )
-        conn.execute(
-            "REPLACE INTO works (id, doi, title, display_name, publication_year, publication_date, type, cited_by_count, is_retracted, is_paratext, cited_by_api_url, abstract_inverted_index, language) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            insert_tuple
-        )
-
-        # WORKS_PRIMARY_LOCATIONS
-        primary_loc = work.get('primary_location')
-        if primary_loc:
-            source = primary_loc.get('source') or {}
-            source_id = source.get('id') or ''
-            insert_tuple = (
-                work_id,
-                remove_base_url(source_id) if source_id else None,
-                primary_loc.get('landing_page_url'),
-                primary_loc.get('pdf_url'),
-                int(primary_loc.get('is_oa') or False),
-                primary_loc.get('version'),
-                primary_loc.get('license')
-            )
-            conn.execute(
-                "REPLACE INTO works_primary_locations (work_id, source_id, landing_page_url, pdf_url, is_oa, version, license) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                insert_tuple
-            )
-
-        # WORKS_LOCATIONS
+            work.get('language') or '',
+            FETCH_TIER_FULL,
+            work.get('updated_date'),
+            fetched_at,
+            fetched_at
+        ))
+
+    # WORKS_PRIMARY_LOCATIONS
+    if 'works_primary_locations' in rows and work.get('primary_location'):
+        rows['works_primary_locations'].append(_location_row(work_id, work['primary_location']))
+
+    # WORKS_LOCATIONS
+    if 'works_locations' in rows:
         for location in work.get('locations') or []:
-            source = location.get('source') or {}
-            source_id = source.get('id') or ''
-            insert_tuple = (
-                work_id,
-                remove_base_url(source_id) if source_id else None,
-                location.get('landing_page_url'),
-                location.get('pdf_url'),
-                int(location.get('is_oa') or False),
-                location.get('version'),
-                location.get('license')
-            )
-            conn.execute(
-                "REPLACE INTO works_locations (work_id, source_id, landing_page_url, pdf_url, is_oa, version, license) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                insert_tuple
-            )
-
-        # WORKS_BEST_OA_LOCATIONS
-        best_oa_loc = work.get('best_oa_location')
-        if best_oa_loc:
-            source = best_oa_loc.get('source') or {}
-            source_id = source.get('id') or ''
-            insert_tuple = (
-                work_id,
-                remove_base_url(source_id) if source_id else None,
-                best_oa_loc.get('landing_page_url'),
-                best_oa_loc.get('pdf_url'),
-                int(best_oa_loc.get('is_oa') or False),
-                best_oa_loc.get('version'),
-                best_oa_loc.get('license')
-            )
-            conn.execute(
-                "REPLACE INTO works_best_oa_locations (work_id, source_id, landing_page_url, pdf_url, is_oa, version, license) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                insert_tuple
-            )
-
-        # WORKS_AUTHORSHIPS
-        for authorship in work.get('authorships') or []:
-            author = authorship.get('author') or {}
-            author_id = author.get('id')
-            if author_id:
-                # Insert basic author info into authors table
-                author_id_clean = remove_base_url(author_id)
-                author_display_name = author.get('display_name', '')
-                if author_display_name:
-                    conn.execute(
-                        "INSERT OR IGNORE INTO authors (id, display_name) VALUES (?, ?)",
-                        (author_id_clean, author_display_name)
-                    )
-
-                institutions = authorship.get('institutions') or []
-                if institutions:
-                    for institution in institutions:
-                        inst_id = institution.get('id')
-                        insert_tuple = (
-                            work_id,
-                            authorship.get('author_position'),
-                            author_id_clean,
-                            remove_base_url(inst_id) if inst_id else None
-                        )
-                        conn.execute(
-                            "REPLACE INTO works_authorships (work_id, author_position, author_id, institution_id) VALUES (?, ?, ?, ?)",
-                            insert_tuple
-                        )
-                else:
-                    # Author with no institution
-                    insert_tuple = (
-                        work_id,
-                        authorship.get('author_position'),
-                        author_id_clean,
-                        None
-                    )
-                    conn.execute(
-                        "REPLACE INTO works_authorships (work_id, author_position, author_id, institution_id) VALUES (?, ?, ?, ?)",
-                        insert_tuple
-                    )
-
-        # WORKS_BIBLIO
+            rows['works_locations'].append(_location_row(work_id, location))
+
+    # WORKS_BEST_OA_LOCATIONS
+    if 'works_best_oa_locations' in rows and work.get('best_oa_location'):
+        rows['works_best_oa_locations'].append(_location_row(work_id, work['best_oa_location']))
+
+    # WORKS_AUTHORSHIPS (and the basic info of the authors)
+    for authorship in work.get('authorships') or []:
+        author = authorship.get('author') or {}
+        author_id = author.get('id')
+        if not author_id:
+            continue
+        author_id_clean = remove_base_url(author_id)
+        if 'authors' in rows and author.get('display_name'):
+            rows['authors'].append((author_id_clean, author['display_name']))
+        if 'works_authorships' in rows:
+            # One row per institution; authors with no institution get a single row with NULL institution
+            institution_ids = [institution.get('id') for institution in authorship.get('institutions') or []] or [None]
+            for inst_id in institution_ids:
+                rows['works_authorships'].append((
+                    work_id,
+                    authorship.get('author_position'),
+                    author_id_clean,
+                    remove_base_url(inst_id) if inst_id else None
+                ))
+
+    # WORKS_BIBLIO
+    if 'works_biblio' in rows:
         biblio = work.get('biblio') or {}
-        insert_tuple = (
+        rows['works_biblio'].append((
             work_id,
             biblio.get('volume'),
             biblio.get('issue'),
             biblio.get('first_page'),
             biblio.get('last_page')
-        )
-        conn.execute(
-            "REPLACE INTO works_biblio (work_id, volume, issue, first_page, last_page) VALUES (?, ?, ?, ?, ?)",
-            insert_tuple
-        )
+        ))
 
-        # WORKS_TOPICS
+    # WORKS_TOPICS
+    if 'works_topics' in rows:
         for topic in work.get('topics') or []:
-            topic_id = topic.get('id')
-            if topic_id:
-                insert_tuple = (work_id, remove_base_url(topic_id), topic.get('score'))
-                conn.execute(
-                    "REPLACE INTO works_topics (work_id, topic_id, score) VALUES (?, ?, ?)",
-                    insert_tuple
-                )
-
-        # WORKS_CONCEPTS
+            if topic.get('id'):
+                rows['works_topics'].append((work_id, remove_base_url(topic['id']), topic.get('score')))
+
+    # WORKS_CONCEPTS
+    if 'works_concepts' in rows:
         for concept in work.get('concepts') or []:
-            concept_id = concept.get('id')
-            if concept_id:
-                insert_tuple = (work_id, remove_base_url(concept_id), concept.get('score'))
-                conn.execute(
-                    "REPLACE INTO works_concepts (work_id, concept_id, score) VALUES (?, ?, ?)",
-                    insert_tuple
-                )
-
-        # WORKS_IDS
+            if concept.get('id'):
+                rows['works_concepts'].append((work_id, remove_base_url(concept['id']), concept.get('score')))
+
+    # WORKS_IDS
+    if 'works_ids' in rows:
         work_ids = work.get('ids') or {}
-        insert_tuple = (
+        rows['works_ids'].append((
             work_id,
             work_ids.get('openalex'),
             work_ids.get('doi'),
             work_ids.get('mag'),
             work_ids.get('pmid'),
             work_ids.get('pmcid')
-        )
-        conn.execute(
-            "REPLACE INTO works_ids (work_id, openalex, doi, mag, pmid, pmcid) VALUES (?, ?, ?, ?, ?, ?)",
-            insert_tuple
-        )
+        ))
 
-        # WORKS_MESH
+    # WORKS_MESH
+    if 'works_mesh' in rows:
         for mesh in work.get('mesh') or []:
-            insert_tuple = (
+            rows['works_mesh'].append((
                 work_id,
                 mesh.get('descriptor_ui'),
                 mesh.get('descriptor_name'),
                 mesh.get('qualifier_ui'),
                 mesh.get('qualifier_name'),
                 mesh.get('is_major_topic')
-            )
-            conn.execute(
-                "REPLACE INTO works_mesh (work_id, descriptor_ui, descriptor_name, qualifier_ui, qualifier_name, is_major_topic) VALUES (?, ?, ?, ?, ?, ?)",
-                insert_tuple
-            )
+            ))
 
-        # WORKS_OPEN_ACCESS
+    # WORKS_OPEN_ACCESS
+    if 'works_open_access' in rows:
         open_access = work.get('open_access') or {}
-        insert_tuple = (
+        rows['works_open_access'].append((
             work_id,
             int(open_access.get('is_oa') or False),
             open_access.get('oa_status'),
             open_access.get('oa_url'),
             int(open_access.get('any_repository_has_fulltext') or False)
-        )
-        conn.execute(
-            "REPLACE INTO works_open_access (work_id, is_oa, oa_status, oa_url, any_repository_has_fulltext) VALUES (?, ?, ?, ?, ?)",
-            insert_tuple
-        )
+        ))
 
-        # WORKS_REFERENCED_WORKS - This is the key table for citation network!
+    # WORKS_REFERENCED_WORKS - This is the key table for citation network! Keyed by the numbers of the work IDs.
+    if 'works_referenced_works' in rows and work_number is not None:
         for referenced_work_id in work.get('referenced_works') or []:
-            if referenced_work_id:
-                insert_tuple = (work_id, remove_base_url(referenced_work_id))
-                conn.execute(
-                    "REPLACE INTO works_referenced_works (work_id, referenced_work_id) VALUES (?, ?)",
-                    insert_tuple
-                )
-
-        # WORKS_RELATED_WORKS
+            referenced_number = work_id_to_int(referenced_work_id)
+            if referenced_number is not None:
+                rows['works_referenced_works'].append((work_number, referenced_number))
+
+    # WORKS_RELATED_WORKS
+    if 'works_related_works' in rows:
         for related_work_id in work.get('related_works') or []:
             if related_work_id:
-                insert_tuple = (work_id, remove_base_url(related_work_id))
-                conn.execute(
-                    "REPLACE INTO works_related_works (work_id, related_work_id) VALUES (?, ?)",
-                    insert_tuple
-                )
+                rows['works_related_works'].append((work_id, remove_base_url(related_work_id)))
+
+    # WORKS_FTS - full-text index of the title and abstract
+    if 'works_fts' in rows and work_number is not None:
+        rows['works_fts'].append((
+            work_number,
+            work.get('title') or work.get('display_name') or '',
+            abstract_from_inverted_index(work.get('abstract_inverted_index'))
+        ))
+
+    return rows
+
+
+def _delete_work_rows(conn: sqlite3.Connection, table: str, work_ids: List[str]):
+    """Delete the rows of the given works from a child table (see WORK_CHILD_TABLES, WORK_NUMBER_KEYED_TABLES)."""
+    if table in WORK_NUMBER_KEYED_TABLES:
+        conn.executemany(f"DELETE FROM {table} WHERE {WORK_NUMBER_KEYED_TABLES[table]}=?",
+                         [(work_id_to_int(work_id),) for work_id in work_ids])
+    elif table in WORK_CHILD_TABLES:
+        conn.executemany(f"DELETE FROM {table} WHERE work_id=?", [(work_id,) for work_id in work_ids])
+
+
+def write_work_rows(conn: sqlite3.Connection, work_ids: List[str], rows: Dict[str, List[tuple]]):
+    """
+    Replace the rows of the given works with `rows`, using one executemany per table.
+
+    The child tables have no primary keys, so the works' existing child rows are deleted first.
+    Rewriting the works row drops the works' content hashes, as they may no longer match.
+    Does not commit.
+
+    Args:
+        conn: SQLite database connection
+        work_ids: IDs of the works the rows belong to
+        rows: Dict mapping table name -> row tuples, e.g. merged from work_to_rows() of several works
+    """
+    for table in rows:
+        _delete_work_rows(conn, table, work_ids)
+    if 'works' in rows:
+        conn.executemany("DELETE FROM works_content_hashes WHERE work_id=?", [(work_id,) for work_id in work_ids])
+    for table, table_rows in rows.items():
+        if table_rows:
+            conn.executemany(WORK_TABLE_INSERTS[table], table_rows)
+    _notify_references_written(conn, rows.get('works_referenced_works', []))
+
+
+def section_hashes(rows: Dict[str, List[tuple]]) -> Dict[str, str]:
+    """
+    Hash the rows of each table of one work (as built by work_to_rows), ignoring the fetch and access times.
+
+    Returns:
+        Dict mapping table name -> hash of its rows
+    """
+    hashes = {}
+    for table, table_rows in rows.items():
+        if table == 'works':
+            table_rows = [row[:-len(WORKS_TIME_COLUMNS)] for row in table_rows]
+        hashes[table] = hashlib.blake2b(repr(table_rows).encode('utf-8'), digest_size=16).hexdigest()
+    return hashes
+
+
+def _get_stored_section_hashes(conn: sqlite3.Connection, work_ids: List[str]) -> Dict[str, Dict[str, str]]:
+    """Get the section hashes stored for the works cached in full."""
+    stored = {}
+    for work_id, hashes in _select_by_work_ids(conn, f"""
+        SELECT h.work_id, h.section_hashes FROM works_content_hashes h
+        JOIN works w ON w.id = h.work_id
+        WHERE h.work_id IN ({{work_ids}}) AND w.fetch_tier IS NOT '{FETCH_TIER_STUB}'
+    """, work_ids):
+        stored[work_id] = json.loads(hashes)
+    return stored
+
+
+def write_changed_work_rows(conn: sqlite3.Connection, works_rows: Dict[str, Dict[str, List[tuple]]]) -> int:
+    """
+    Write works, rewriting only the tables whose rows changed since they were last written.
+
+    Each table of a work (a section) is hashed, and the hashes are stored in works_content_hashes. A work
+    whose sections all hash as stored is not rewritten; only its fetch and access times are updated.
+    Does not commit.
+
+    Args:
+        conn: SQLite database connection
+        works_rows: Dict mapping work ID -> its rows, as built by work_to_rows()
+
+    Returns:
+        Number of works with at least one section rewritten
+    """
+    stored = _get_stored_section_hashes(conn, list(works_rows))
+    changed_rows: Dict[str, Dict[str, List[tuple]]] = {}  # table -> work ID -> rows
+    new_hashes = []
+    times = []
+    for work_id, rows in works_rows.items():
+        hashes = section_hashes(rows)
+        stored_hashes = stored.get(work_id, {})
+        changed_tables = [table for table in rows if hashes[table] != stored_hashes.get(table)]
+        for table in changed_tables:
+            changed_rows.setdefault(table, {})[work_id] = rows[table]
+        if changed_tables:
+            new_hashes.append((work_id, json.dumps({**stored_hashes, **hashes}, sort_keys=True)))
+        if 'works' not in changed_tables and rows.get('works'):
+            times.append((*rows['works'][0][-len(WORKS_TIME_COLUMNS):], work_id))
+
+    for table, rows_by_work in changed_rows.items():
+        _delete_work_rows(conn, table, list(rows_by_work))
+        table_rows = [row for rows in rows_by_work.values() for row in rows]
+        if table_rows:
+            conn.executemany(WORK_TABLE_INSERTS[table], table_rows)
+        if table == 'works_referenced_works':
+            _notify_references_written(conn, table_rows)
+    conn.executemany(
+        f"UPDATE works SET {', '.join(f'{column}=?' for column in WORKS_TIME_COLUMNS)} WHERE id=?", times
+    )
+    conn.executemany(
+        "REPLACE INTO works_content_hashes (work_id, section_hashes) VALUES (?, ?)", new_hashes
+    )
+    return len(new_hashes)
+
+
+class WorkBatchWriter:
+    """
+    Write many works with one executemany per table and one transaction per flush.
+
+    The rows of added works are buffered and written every `flush_size` works, and on leaving the
+    `with` block. Only the tables whose rows changed are rewritten (see write_changed_work_rows):
+
+        with WorkBatchWriter(conn) as writer:
+            for work in works:
+                writer.add(work)
+    """
+
+    def __init__(self, conn: sqlite3.Connection, flush_size: int = DEFAULT_FLUSH_SIZE, commit: bool = True):
+        """
+        Args:
+            conn: SQLite database connection
+            flush_size: Number of works to buffer before writing them
+            commit: Write each flush in a transaction of its own and commit it. False writes into the
+                caller's transaction, which the caller commits.
+        """
+        self.conn = conn
+        self.flush_size = flush_size
+        self.commit = commit
+        self.written = 0  # Works rewritten
+        self.unchanged = 0  # Works skipped as unchanged
+        self._works_rows: Dict[str, Dict[str, List[tuple]]] = {}
+
+    def __len__(self) -> int:
+        """Number of buffered works."""
+        return len(self._works_rows)
+
+    def add(self, work: Union["Work", dict]):
+        """
+        Buffer a work, flushing if the buffer is full.
 
-        conn.commit()
\ No newline at end of file
+        Raises:
+            KeyError: the work has no id
+        """
+        work = work.work if isinstance(work, Work) else work
+        work_id = remove_base_url(work['id'])
+        if work_id in self._works_rows:
+            # A later version of a buffered work; write the earlier one first so the later one wins
+            self.flush()
+        self._works_rows[work_id] = work_to_rows(work)
+        if len(self._works_rows) >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write the buffered works.
+
+        Returns:
+            Number of works rewritten
+        """
+        if not self._works_rows:
+            return 0
+        works_rows, self._works_rows = self._works_rows, {}
+        if self.commit:
+            with self.conn:
+                written = write_changed_work_rows(self.conn, works_rows)
+        else:
+            written = write_changed_work_rows(self.conn, works_rows)
+        self.written += written
+        self.unchanged += len(works_rows) - written
+        return written
+
+    def __enter__(self) -> "WorkBatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+
+def _insert_sql(verb: str, table: str, columns: Tuple[str, ...]) -> str:
+    return f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+
+
+# Last columns of the works row: when the work was fetched and last accessed. They are not part of its content.
+WORKS_TIME_COLUMNS = ('fetched_at', 'last_accessed')
+
+_LOCATION_COLUMNS = ('work_id', 'source_id', 'landing_page_url', 'pdf_url', 'is_oa', 'version', 'license')
+
+# Statement to write the rows of each table built by work_to_rows(), in column order
+WORK_TABLE_INSERTS = {
+    'works': _insert_sql('REPLACE', 'works', ('id', 'doi', 'title', 'display_name', 'publication_year', 'publication_date', 'type', 'cited_by_count', 'is_retracted', 'is_paratext', 'cited_by_api_url', 'abstract_inverted_index', 'language', 'fetch_tier', 'updated_date') + WORKS_TIME_COLUMNS),
+    'works_primary_locations': _insert_sql('INSERT', 'works_primary_locations', _LOCATION_COLUMNS),
+    'works_locations': _insert_sql('INSERT', 'works_locations', _LOCATION_COLUMNS),
+    'works_best_oa_locations': _insert_sql('INSERT', 'works_best_oa_locations', _LOCATION_COLUMNS),
+    # Basic author info; never overwrites a full author record
+    'authors': _insert_sql('INSERT OR IGNORE', 'authors', ('id', 'display_name')),
+    'works_authorships': _insert_sql('INSERT', 'works_authorships', ('work_id', 'author_position', 'author_id', 'institution_id')),
+    'works_biblio': _insert_sql('REPLACE', 'works_biblio', ('work_id', 'volume', 'issue', 'first_page', 'last_page')),
+    'works_topics': _insert_sql('INSERT', 'works_topics', ('work_id', 'topic_id', 'score')),
+    'works_concepts': _insert_sql('INSERT', 'works_concepts', ('work_id', 'concept_id', 'score')),
+    'works_ids': _insert_sql('REPLACE', 'works_ids', ('work_id', 'openalex', 'doi', 'mag', 'pmid', 'pmcid')),
+    'works_mesh': _insert_sql('INSERT', 'works_mesh', ('work_id', 'descriptor_ui', 'descriptor_name', 'qualifier_ui', 'qualifier_name', 'is_major_topic')),
+    'works_open_access': _insert_sql('REPLACE', 'works_open_access', ('work_id', 'is_oa', 'oa_status', 'oa_url', 'any_repository_has_fulltext')),
+    # OpenAlex occasionally lists a reference twice
+    'works_referenced_works': _insert_sql('INSERT OR IGNORE', 'works_referenced_works', ('work_id', 'referenced_work_id')),
+    'works_related_works': _insert_sql('INSERT', 'works_related_works', ('work_id', 'related_work_id')),
+    'works_fts': _insert_sql('INSERT', 'works_fts', ('rowid', 'title', 'abstract')),
+}
+
+# Tables keyed by the number of the work ID (see work_id_to_int) instead of the ID string -> key column
+WORK_NUMBER_KEYED_TABLES = {
+    'works_referenced_works': 'work_id',
+    'works_fts': 'rowid',
+}
+
+# Tables of author rows -> author ID column, deleted with the last work of an author (see Work.delete_many)
+AUTHOR_TABLES = {
+    'authors': 'id',
+    'authors_counts_by_year': 'author_id',
+    'authors_ids': 'author_id',
+}
+
+# Tables keyed by work_id whose rows are replaced when a work is rewritten
+WORK_CHILD_TABLES = [
+    table for table in WORK_TABLE_INSERTS if table.startswith('works_') and table not in WORK_NUMBER_KEYED_TABLES
+]
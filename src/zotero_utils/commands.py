@@ -14,7 +14,12 @@ from .Items.get_all_items import get_all_item_ids
 from .Visualizations.pie_chart import pie_chart
 from .Visualizations.stacked_bar_chart import stacked_bar_chart
 from .Visualizations.stem_plot import stem_plot
-from .constants import ZOTERO_DB_FILE_HELP, TYPE_HELP, NUM_GROUPS_HELP, ZOTERO_ENDPOINTS_DICT
+from .OpenAlexAPI.response_cache import get_cached_session, install_response_cache
+from .OpenAlexDB.connection import connect
+from .OpenAlexDB.ingest_pipeline import DEFAULT_CHUNK_SIZE
+from .OpenAlexDB.migrations import migrate
+from .OpenAlexDB.snapshot import get_library_neighbourhood_ids, load_snapshot
+from .constants import ZOTERO_DB_FILE_HELP, TYPE_HELP, NUM_GROUPS_HELP, OPENALEX_DB_FILE_HELP, ZOTERO_ENDPOINTS_DICT
 
 app = typer.Typer()
 
@@ -157,6 +162,10 @@ def show_dag(md_dir: str = typer.Option(default=os.path.join(os.path.expanduser(
         if work_id is not None:
             zotero_items_by_work_id[work_id] = zotero_item
 
+    # OpenAlex responses are cached on disk, so re-running after a crash costs no network
+    install_response_cache()
+    openalex_session = get_cached_session()
+
     # 2. Get any OpenAlex items from cache
     openalex_cache_file = 'openalex_items.json'
     openalex_items_by_work_id = {}
@@ -190,7 +199,7 @@ def show_dag(md_dir: str = typer.Option(default=os.path.join(os.path.expanduser(
         else:
             # Query the OpenAlex API for the referenced works
             url = f'https://api.openalex.org/works/{open_alex_work_id}'
-            response = requests.get(url)
+            response = openalex_session.get(url)
             response.raise_for_status()
             data = response.json()
             referenced_works_raw = data.get('referenced_works', [])
@@ -209,7 +218,7 @@ def show_dag(md_dir: str = typer.Option(default=os.path.join(os.path.expanduser(
 
             # Query the OpenAlex API for the work.
             url = f'https://api.openalex.org/works/{work_id}'
-            response = requests.get(url)
+            response = openalex_session.get(url)
             try:
                 response.raise_for_status()
             except:
@@ -261,6 +270,32 @@ def show_dag(md_dir: str = typer.Option(default=os.path.join(os.path.expanduser(
     callables_dicts.append(openalex_callables_dict)
     dag.to_md_files(md_dir, callables_dicts)
 
+@app.command()
+def load_openalex_snapshot(snapshot_path: str = typer.Argument(..., help="A snapshot partition file, or a directory of partitions (e.g. the snapshot's data/works directory)."),
+                           openalex_db_file: str = typer.Option(..., help=OPENALEX_DB_FILE_HELP),
+                           neighbourhood: bool = typer.Option(True, help="Only load the library's works, the works they reference and the works citing them, as found in the database. --no-neighbourhood loads every work."),
+                           workers: int = typer.Option(None, help="Number of processes parsing the partitions. Defaults to the number of CPUs."),
+                           chunk_size: int = typer.Option(DEFAULT_CHUNK_SIZE, help="Records parsed per task.")):
+    """
+    Load works from a local OpenAlex snapshot into the OpenAlex database, without using the API.
+
+    Args:
+        snapshot_path (str): Partition file or directory of partitions.
+        openalex_db_file (str): Path to the OpenAlex SQLite database file.
+    """
+    conn = connect(openalex_db_file)
+    try:
+        migrate(conn)
+        neighbourhood_ids = None
+        if neighbourhood:
+            neighbourhood_ids = get_library_neighbourhood_ids(conn)
+            if not neighbourhood_ids:
+                print("No library works in the database yet, so the neighbourhood is empty. Build the citation network first, or pass --no-neighbourhood.")
+                return
+        load_snapshot(conn, snapshot_path, neighbourhood_ids, max_workers=workers, chunk_size=chunk_size)
+    finally:
+        conn.close()
+
 def get_creators_zotero(item_data: dict) -> str:
     """Get the creators of the item from the Zotero item data."""
     creators = item_data.get('creators', [])
@@ -1,6 +1,7 @@
 ZOTERO_DB_FILE_HELP = "Path to the Zotero SQLite database file."
 TYPE_HELP = "Choose how to visualize the data."
 NUM_GROUPS_HELP = "Number of groups to display in the chart."
+OPENALEX_DB_FILE_HELP = "Path to the OpenAlex SQLite database file (created if it does not exist)."
 
 ZOTERO_ENDPOINTS_DICT = {
     'items': '/items',
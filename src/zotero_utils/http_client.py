@@ -0,0 +1,130 @@
+"""
+Shared HTTP sessions for every outbound call: the Zotero local API and OpenAlex.
+
+Each service gets one long-lived requests.Session with a keep-alive connection pool, so small lookups reuse
+open TCP/TLS connections instead of setting up a new one per request. Responses are requested gzip-compressed.
+"""
+
+import os
+import threading
+from typing import Optional
+
+import pyalex
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ZOTERO_LOCAL_API_URL = "http://127.0.0.1:23119/api"
+
+# Number of hosts to keep pools for, and of connections kept open per host. The pool size should cover the
+# number of threads making requests at once (fetch_batches workers, proxy handler threads).
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = int(os.environ.get("ZOTERO_UTILS_HTTP_POOL_SIZE", 16))
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+_lock = threading.Lock()
+_sessions = {}
+_pool_connections = DEFAULT_POOL_CONNECTIONS
+_pool_maxsize = DEFAULT_POOL_MAXSIZE
+
+
+def configure_pools(pool_connections: Optional[int] = None, pool_maxsize: Optional[int] = None) -> None:
+    """
+    Set the connection pool sizes. The shared sessions are rebuilt with the new sizes on next use.
+
+    Args:
+        pool_connections: Number of hosts to keep connection pools for
+        pool_maxsize: Number of connections kept open per host
+    """
+    global _pool_connections, _pool_maxsize
+    if pool_connections is not None:
+        _pool_connections = pool_connections
+    if pool_maxsize is not None:
+        _pool_maxsize = pool_maxsize
+    reset_sessions()
+
+
+def reset_sessions() -> None:
+    """Close the shared sessions. They are rebuilt on next use, e.g. after installing a response cache."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def _openalex_retries() -> Retry:
+    """Transport-level retries, configured like pyalex's own session."""
+    return Retry(
+        total=pyalex.config.max_retries,
+        backoff_factor=pyalex.config.retry_backoff_factor,
+        status_forcelist=pyalex.config.retry_http_codes,
+        allowed_methods={"GET", "POST"},
+    )
+
+
+def build_session(adapter: HTTPAdapter) -> requests.Session:
+    """Create a session with the shared default headers, sending every request through `adapter`."""
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _build_openalex_session() -> requests.Session:
+    # Imported here because response_cache imports this module
+    from .OpenAlexAPI import response_cache
+
+    pool_kwargs = dict(pool_connections=_pool_connections, pool_maxsize=_pool_maxsize, max_retries=_openalex_retries())
+    if response_cache._installed_cache is not None:
+        return build_session(response_cache.CachingAdapter(response_cache._installed_cache, **pool_kwargs))
+    return build_session(HTTPAdapter(**pool_kwargs))
+
+
+def _build_zotero_session() -> requests.Session:
+    # The local API is on the same machine: no transport retries, fail fast if Zotero is not running
+    return build_session(HTTPAdapter(pool_connections=1, pool_maxsize=_pool_maxsize))
+
+
+def _get_session(name: str, build) -> requests.Session:
+    session = _sessions.get(name)
+    if session is None:
+        with _lock:
+            session = _sessions.get(name)
+            if session is None:
+                session = _sessions[name] = build()
+    return session
+
+
+def get_openalex_session() -> requests.Session:
+    """Get the shared OpenAlex session (through the response cache, if one is installed)."""
+    return _get_session("openalex", _build_openalex_session)
+
+
+def get_zotero_session() -> requests.Session:
+    """Get the shared session for the Zotero local API."""
+    return _get_session("zotero", _build_zotero_session)
+
+
+def install_openalex_session() -> None:
+    """Make pyalex use the shared OpenAlex session instead of creating a new session per request."""
+    pyalex.api._get_requests_session = get_openalex_session
+
+
+def zotero_api_get(path: str, **kwargs) -> requests.Response:
+    """
+    GET a path of the Zotero local API, e.g. "users/0/items".
+
+    Args:
+        path: Path relative to ZOTERO_LOCAL_API_URL
+        **kwargs: Passed on to requests.Session.get()
+
+    Returns:
+        requests.Response
+    """
+    return get_zotero_session().get(f"{ZOTERO_LOCAL_API_URL}/{path.lstrip('/')}", **kwargs)
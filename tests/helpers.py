@@ -0,0 +1,8 @@
+def make_work(work_id, refs=(), **fields):
+    """OpenAlex work dict with an ID, a title, references (IDs without the base URL) and any further fields."""
+    return {
+        'id': f'https://openalex.org/{work_id}',
+        'title': f'Title {work_id}',
+        'referenced_works': [f'https://openalex.org/{ref}' for ref in refs],
+        **fields,
+    }
@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from zotero_utils.OpenAlexAPI.batch import TokenBucket, fetch_batches, split_into_batches
+
+REQUEST_DELAY = 0.2
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers /works?filter=openalex_id:W1|W2 with one result per ID after a fixed delay."""
+
+    def do_GET(self):
+        time.sleep(REQUEST_DELAY)
+        query = parse_qs(urlparse(self.path).query)
+        ids = query['filter'][0].split(':', 1)[1].split('|')
+        body = json.dumps({'results': [{'id': f'https://openalex.org/{i}'} for i in ids]}).encode()
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def make_fetcher(base_url):
+    def fetch(batch):
+        response = requests.get(f'{base_url}/works', params={'filter': 'openalex_id:' + '|'.join(batch)})
+        response.raise_for_status()
+        return response.json()['results']
+    return fetch
+
+
+def test_fetch_batches_runs_concurrently_in_stable_order(stand_in_url):
+    ids = [f'W{i}' for i in range(400)]
+    batches = split_into_batches(ids, 50)
+    start = time.monotonic()
+    results = list(fetch_batches(batches, make_fetcher(stand_in_url), max_workers=8, limiter=None))
+    elapsed = time.monotonic() - start
+
+    assert elapsed < REQUEST_DELAY * len(batches) / 2
+    fetched = [w['id'].split('/')[-1] for _, works, error in results for w in works]
+    assert fetched == ids
+    assert all(error is None for _, _, error in results)
+
+
+def test_fetch_batches_reports_errors_per_batch(stand_in_url):
+    fetch = make_fetcher(stand_in_url)
+
+    def flaky(batch):
+        if batch[0] == 'W50':
+            raise RuntimeError('boom')
+        return fetch(batch)
+
+    results = list(fetch_batches(split_into_batches([f'W{i}' for i in range(150)]), flaky, max_workers=3, limiter=None))
+    assert [error is None for _, _, error in results] == [True, False, True]
+
+
+def test_token_bucket_limits_rate():
+    limiter = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.45
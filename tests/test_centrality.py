@@ -0,0 +1,93 @@
+import numpy as np
+from scipy import sparse
+
+from zotero_utils.OpenAlexDB import centrality
+from zotero_utils.OpenAlexDB.centrality import approximate_betweenness, pagerank, update_centrality
+from zotero_utils.OpenAlexDB.citation_network import build_library_graph
+from zotero_utils.OpenAlexDB.connection import OpenAlexConnections
+from zotero_utils.OpenAlexDB.graph_engine import CitationGraph
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+from zotero_utils.OpenAlexDB.work import WorkBatchWriter
+
+from helpers import make_work
+
+
+def adjacency(n, edges):
+    sources, targets = np.array(edges).T
+    return sparse.csr_matrix((np.ones(len(edges)), (sources, targets)), shape=(n, n))
+
+
+def test_pagerank_and_betweenness_of_small_graphs():
+    # 1, 2 and 3 cite 0; 0 cites nothing
+    ranks = pagerank(adjacency(4, [(1, 0), (2, 0), (3, 0)]))
+    assert np.isclose(ranks.sum(), 1) and ranks.argmax() == 0
+    assert np.allclose(ranks[1:], ranks[1])
+
+    # Path 0 - 1 - 2 - 3: exact betweenness is 2 for the inner works
+    assert np.allclose(approximate_betweenness(adjacency(4, [(0, 1), (2, 1), (2, 3)])), [0, 2, 2, 0])
+    # Two paths of equal length between 0 and 3 share the path through the middle
+    assert np.allclose(approximate_betweenness(adjacency(4, [(0, 1), (0, 2), (1, 3), (2, 3)])), [0.5, 0.5, 0.5, 0.5])
+
+
+def test_centrality_is_stored_and_only_recomputed_when_citations_change(tmp_path, monkeypatch):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', refs=['W3', 'W10']))
+        writer.add(make_work('W2', refs=['W3', 'W10', 'W11']))
+        writer.add(make_work('W3', refs=['W12']))
+    graph = CitationGraph.load(conn)
+    graph.attach()
+    try:
+        library = ['W1', 'W2', 'W3']
+        assert update_centrality(conn, graph, library)
+        assert conn.execute("SELECT COUNT(*) FROM work_centrality").fetchone()[0] == 6  # Library and 1 hop
+
+        items = {f'K{i}': {'openalex_work_id': f'W{i}'} for i in (1, 2, 3)}
+        nodes = {node['id']: node for node in build_library_graph(conn, items, graph)['nodes']}
+        assert nodes['W3']['centrality']['in_degree'] == 2
+        assert nodes['W3']['centrality']['pagerank'] > nodes['W1']['centrality']['pagerank']
+
+        monkeypatch.setattr(centrality, 'compute_centrality', lambda *args: 1 / 0)
+        assert not update_centrality(conn, graph, library)
+        monkeypatch.undo()
+
+        # A new citation: recomputed, starting from the stored scores
+        with WorkBatchWriter(conn) as writer:
+            writer.add(make_work('W4', refs=['W3']))
+        assert update_centrality(conn, graph, library)
+        assert conn.execute("SELECT in_degree FROM work_centrality WHERE work_id = 3").fetchone() == (3,)
+    finally:
+        graph.detach()
+    conn.close()
+
+
+def test_centrality_is_computed_on_a_reader_and_stored_through_the_writer(tmp_path, monkeypatch):
+    path = str(tmp_path / 'openalex.db')
+    init_conn = init_openalex_db(path)
+    with WorkBatchWriter(init_conn) as writer:
+        writer.add(make_work('W1', refs=['W2']))
+    graph = CitationGraph.load(init_conn)
+    init_conn.close()
+
+    connections = OpenAlexConnections(path)
+    borrowed = []
+
+    def writer():
+        borrowed.append(True)
+        return connections.writer()
+
+    compute = centrality.compute_centrality
+
+    def compute_without_writer(*args):
+        assert not borrowed
+        return compute(*args)
+
+    monkeypatch.setattr(centrality, 'compute_centrality', compute_without_writer)
+    with connections.reader() as conn:
+        assert update_centrality(conn, graph, ['W1'], writer=writer)
+        assert borrowed
+    with connections.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM work_centrality").fetchone()[0] == 2
+        assert not update_centrality(conn, graph, ['W1'], writer=writer)
+    assert len(borrowed) == 1
+    connections.close()
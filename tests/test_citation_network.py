@@ -0,0 +1,129 @@
+import pyalex
+import pytest
+
+from zotero_utils.OpenAlexAPI.works import BatchFetchReport
+from zotero_utils.OpenAlexDB import citation_network
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    yield conn
+    conn.close()
+
+
+def make_work(work_id, **fields):
+    return pyalex.Work({'id': f'https://openalex.org/{work_id}', 'title': f'Title {work_id}', **fields})
+
+
+def test_stream_citing_works_resumes_from_saved_cursor(conn, monkeypatch):
+    pages = {
+        '*': ([make_work('W1'), make_work('W2')], 'c1'),
+        'c1': ([make_work('W3')], 'c2'),
+        'c2': ([make_work('W4')], None),
+    }
+    requested_cursors = []
+
+    def fake_pages(work_id, per_page=200, cursor='*', select=None, fail_on=None):
+        while cursor:
+            requested_cursors.append(cursor)
+            if cursor == fail_on:
+                raise ConnectionError('interrupted')
+            page, next_cursor = pages[cursor]
+            yield page, next_cursor
+            cursor = next_cursor
+
+    monkeypatch.setattr(citation_network, 'iter_citing_works_pages',
+                        lambda *args, **kwargs: fake_pages(*args, **kwargs, fail_on='c2'))
+    with pytest.raises(ConnectionError):
+        list(citation_network.stream_citing_works_to_cache(conn, 'W0'))
+    assert sorted(citation_network.get_citing_works_from_cache(conn, 'W0')) == ['W1', 'W2', 'W3']
+    assert citation_network.get_citing_fetch_state(conn, 'W0')['next_cursor'] == 'c2'
+
+    requested_cursors.clear()
+    monkeypatch.setattr(citation_network, 'iter_citing_works_pages', fake_pages)
+    assert list(citation_network.stream_citing_works_to_cache(conn, 'W0')) == [['W4']]
+    assert requested_cursors == ['c2']
+    assert citation_network.get_citing_fetch_state(conn, 'W0') == {'next_cursor': None, 'fetched_count': 4, 'complete': True}
+    assert conn.execute("SELECT COUNT(*) FROM works").fetchone()[0] == 4
+
+    # A complete fetch is not repeated
+    assert list(citation_network.stream_citing_works_to_cache(conn, 'W0')) == []
+
+
+def test_stub_never_downgrades_full_record_and_upgrades_on_demand(conn, monkeypatch):
+    from zotero_utils.OpenAlexDB.work import Work
+
+    authorships = [{'author_position': 'first', 'author': {'id': 'https://openalex.org/A1', 'display_name': 'Ada'}, 'institutions': []}]
+    Work(make_work('W1', publication_year=2020, authorships=authorships)).insert_stub_in_db(conn)
+    Work(make_work('W1', publication_year=2020, authorships=authorships)).insert_stub_in_db(conn)
+    assert conn.execute("SELECT fetch_tier FROM works WHERE id = 'W1'").fetchone()[0] == 'stub'
+    assert citation_network.get_authors_for_work(conn, 'W1') == 'Ada'
+
+    full = make_work('W1', publication_year=2020, authorships=authorships, referenced_works=['https://openalex.org/W9'])
+    monkeypatch.setattr(citation_network, 'get_works_by_ids_coalesced', lambda ids: [full])
+    assert citation_network.upgrade_stub_works(conn, ['W1', 'W2']) == 1
+    assert citation_network.get_referenced_works_from_cache(conn, 'W1') == ['W9']
+    assert conn.execute("SELECT COUNT(*) FROM works_authorships WHERE work_id = 'W1'").fetchone()[0] == 1
+
+    assert not Work(make_work('W1', title='Stub title')).insert_stub_in_db(conn)
+    assert conn.execute("SELECT title, fetch_tier FROM works WHERE id = 'W1'").fetchone() == ('Title W1', 'full')
+
+
+def test_search_works_ranks_title_matches_and_follows_rewrites(conn):
+    with citation_network.WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', title='Gait variability in older adults'))
+        writer.add(make_work('W2', title='Balance control', abstract_inverted_index={'gait': [1], 'Walking': [0]}))
+        writer.add(make_work('W3', title='Unrelated'))
+    conn.execute("INSERT INTO zotero_openalex_mapping (zotero_key, openalex_work_id) VALUES ('K1', 'W2')")
+
+    results = citation_network.search_works(conn, 'gai')
+    assert [r['id'] for r in results] == ['W1', 'W2']
+    assert [r['in_library'] for r in results] == [False, True]
+    assert citation_network.search_works(conn, 'walking gait')[0]['snippet'] == '<b>Walking</b> <b>gait</b>'
+    assert citation_network.search_works(conn, '"(*') == []
+
+    # Rewriting a work replaces its index entry
+    with citation_network.WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', title='Posture'))
+    assert [r['id'] for r in citation_network.search_works(conn, 'gait')] == ['W2']
+
+
+def test_fetch_and_cache_works_uses_cache_status_without_fetching(conn, monkeypatch):
+    from zotero_utils.OpenAlexDB.work import Work
+    Work(make_work('W1')).insert_or_replace_in_db(conn)
+    conn.executemany(
+        "INSERT INTO zotero_openalex_mapping (zotero_key, openalex_work_id) VALUES (?, ?)",
+        [('K1', 'W1'), ('K2', 'W2')]
+    )
+    assert citation_network.get_cache_status(conn, ['K1', 'K2', 'K3']) == {
+        'K1': ('W1', True), 'K2': ('W2', False), 'K3': (None, False)
+    }
+
+    monkeypatch.setattr(citation_network, 'get_works_by_ids_report', lambda ids: pytest.fail('fetched by ID'))
+    items = [{'zotero_key': 'K1', 'doi': '10.1/a', 'title': 'A', 'authors': '', 'year': 2020},
+             {'zotero_key': 'K4', 'doi': None, 'title': 'B', 'authors': ''}]
+    result = citation_network.fetch_and_cache_works(conn, items)
+    assert list(result) == ['K1'] and result['K1']['openalex_work_id'] == 'W1'
+
+
+def test_fetch_and_cache_works_skips_openalex_ids_recorded_as_bad(conn, monkeypatch):
+    conn.executemany(
+        "INSERT INTO zotero_openalex_mapping (zotero_key, openalex_work_id) VALUES (?, ?)",
+        [('K1', 'W1'), ('K2', 'W2')]
+    )
+    citation_network.record_bad_identifiers(conn, {'W2': 'not found'}, 'openalex_id')
+    requested = []
+
+    def fake_report(ids):
+        requested.extend(ids)
+        report = BatchFetchReport()
+        report.resolved = {work_id: make_work(work_id) for work_id in ids}
+        return report
+
+    monkeypatch.setattr(citation_network, 'get_works_by_ids_report', fake_report)
+    items = [{'zotero_key': 'K1', 'doi': '10.1/a', 'title': 'A', 'authors': ''},
+             {'zotero_key': 'K2', 'doi': '10.1/b', 'title': 'B', 'authors': ''}]
+    result = citation_network.fetch_and_cache_works(conn, items)
+    assert requested == ['W1'] and list(result) == ['K1']
@@ -0,0 +1,26 @@
+import sqlite3
+
+import pytest
+
+from zotero_utils.OpenAlexDB.connection import OpenAlexConnections
+
+
+def test_readers_are_not_blocked_by_an_open_write(tmp_path):
+    path = str(tmp_path / 'openalex.db')
+    connections = OpenAlexConnections(path, max_readers=2)
+    with connections.writer() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        conn.execute("CREATE TABLE works (id TEXT PRIMARY KEY)")
+        conn.execute("INSERT INTO works VALUES ('W1')")
+        conn.commit()
+
+        conn.execute("INSERT INTO works VALUES ('W2')")  # Transaction left open
+        with connections.reader() as reader:
+            assert reader.execute("SELECT COUNT(*) FROM works").fetchone()[0] == 1
+            with pytest.raises(sqlite3.OperationalError):
+                reader.execute("INSERT INTO works VALUES ('W3')")
+        conn.commit()
+
+    with connections.reader() as reader:
+        assert reader.execute("SELECT COUNT(*) FROM works").fetchone()[0] == 2
+    connections.close()
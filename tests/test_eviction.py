@@ -0,0 +1,32 @@
+from zotero_utils.OpenAlexDB.eviction import evict_works, get_db_used_bytes, touch_works
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+from zotero_utils.OpenAlexDB.work import WorkBatchWriter
+
+
+from helpers import make_work
+
+LONG_ABSTRACT = {'x' * 200: [0]}
+
+
+def test_evicts_least_recently_used_unpinned_works(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    empty = get_db_used_bytes(conn)
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', refs=['W2'], abstract_inverted_index=LONG_ABSTRACT))  # Library work
+        for i in range(2, 400):
+            writer.add(make_work(f'W{i}', refs=['W1'], abstract_inverted_index=LONG_ABSTRACT))
+    conn.execute("INSERT INTO zotero_openalex_mapping (zotero_key, openalex_work_id) VALUES ('K1', 'W1')")
+    conn.execute("UPDATE works SET last_accessed = '2000-01-01'")
+    touch_works(conn, ['W3'])
+
+    used = get_db_used_bytes(conn)
+    assert evict_works(conn, max_bytes=used)['evicted'] == 0
+
+    budget = empty + (used - empty) // 2
+    counts = evict_works(conn, max_bytes=budget, batch_size=50)
+    assert 0 < counts['evicted'] < 397 and counts['used'] <= budget * 0.9
+    remaining = {row[0] for row in conn.execute("SELECT id FROM works")}
+    assert {'W1', 'W2', 'W3'} <= remaining  # Pinned, pinned, recently used
+    assert conn.execute("SELECT COUNT(*) FROM works_referenced_works").fetchone()[0] == len(remaining)
+    assert conn.execute("SELECT COUNT(*) FROM works_fts").fetchone()[0] == len(remaining)
+    conn.close()
@@ -0,0 +1,124 @@
+import threading
+
+import pyalex
+
+from zotero_utils.OpenAlexAPI.works import BatchFetchReport
+from zotero_utils.OpenAlexDB import expansion
+from zotero_utils.OpenAlexDB.connection import OpenAlexConnections
+from zotero_utils.OpenAlexDB.expansion import expand_neighbourhood
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+from zotero_utils.OpenAlexDB.work import FETCH_TIER_STUB, WorkBatchWriter
+
+
+from helpers import make_work
+
+
+# OpenAlex: W1 cites W2-W4, which each cite two more works
+OPENALEX = {
+    'W1': make_work('W1', refs=['W2', 'W3', 'W4'], cited_by_count=0),
+    'W2': make_work('W2', refs=['W5', 'W6'], cited_by_count=30),
+    'W3': make_work('W3', refs=['W7', 'W8'], cited_by_count=20),
+    'W4': make_work('W4', refs=['W9', 'W10'], cited_by_count=10),
+    **{f'W{i}': make_work(f'W{i}', cited_by_count=i) for i in range(5, 11)},
+}
+
+
+def test_expansion_fetches_each_frontier_in_one_call_within_budgets(tmp_path, monkeypatch):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(OPENALEX['W1'])
+    calls = []
+
+    def fake_report(ids, retry_missing=True, select=None):
+        calls.append((list(ids), select is None))
+        report = BatchFetchReport()
+        report.resolved = {work_id: pyalex.Work(OPENALEX[work_id]) for work_id in ids}
+        report.requests = 1
+        return report
+
+    monkeypatch.setattr(expansion, 'get_works_by_ids_report', fake_report)
+
+    result = expand_neighbourhood(conn, ['W1'], {'W1'}, hops=2, max_nodes=6)
+    hops = {node['id']: node['hop'] for node in result['nodes']}
+    # Hop 1: W2-W4 fetched in full in one call, hop 2: their references as stubs in one call
+    assert calls == [(['W2', 'W3', 'W4'], True), (['W5', 'W6', 'W7', 'W8', 'W9', 'W10'], False)]
+    # The node budget keeps the most cited works of hop 2
+    assert hops == {'W1': 0, 'W2': 1, 'W3': 1, 'W4': 1, 'W10': 2, 'W9': 2, 'W8': 2}
+    assert {(edge['source'], edge['target']) for edge in result['edges']} == {
+        ('W1', 'W2'), ('W1', 'W3'), ('W1', 'W4'), ('W3', 'W8'), ('W4', 'W9'), ('W4', 'W10')
+    }
+    assert result['stats'] == {**result['stats'], 'hops': 2, 'api_calls': 2, 'truncated': 'max_nodes'}
+    assert [node['nodeType'] for node in result['nodes']].count('library') == 1
+    # Hop 2 only needs its works for display: they are cached as stubs, to be fetched in full when expanded
+    tiers = dict(conn.execute("SELECT id, fetch_tier FROM works").fetchall())
+    assert {tiers[f'W{i}'] for i in range(2, 5)} == {'full'}
+    assert {tiers[f'W{i}'] for i in range(5, 11)} == {FETCH_TIER_STUB}
+
+    # Everything needed is cached now: no more requests, and a zero request budget is enough
+    calls.clear()
+    again = expand_neighbourhood(conn, ['W1'], {'W1'}, hops=2, max_nodes=6, max_api_calls=0)
+    assert calls == [] and {node['id'] for node in again['nodes']} == set(hops)
+    conn.close()
+
+
+def test_expansion_stops_when_the_request_budget_is_spent(tmp_path, monkeypatch):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(OPENALEX['W1'])
+    monkeypatch.setattr(expansion, 'get_works_by_ids_report', lambda *args, **kwargs: 1 / 0)
+
+    result = expand_neighbourhood(conn, ['W1'], set(), hops=3, max_api_calls=0)
+    assert [node['id'] for node in result['nodes']] == ['W1']
+    assert result['stats']['truncated'] == 'max_api_calls' and result['stats']['api_calls'] == 0
+    conn.close()
+
+
+def test_expansion_charges_the_requests_actually_made(tmp_path, monkeypatch):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(OPENALEX['W1'])
+
+    def fake_report(ids, retry_missing=True, select=None):
+        report = BatchFetchReport()
+        report.resolved = {work_id: pyalex.Work(OPENALEX[work_id]) for work_id in ids}
+        report.requests = 4  # One batch, retried three times
+        return report
+
+    monkeypatch.setattr(expansion, 'get_works_by_ids_report', fake_report)
+
+    result = expand_neighbourhood(conn, ['W1'], set(), hops=2, max_api_calls=4)
+    # Hop 1 used up the budget, so hop 2 is taken from the cache only
+    assert {node['hop'] for node in result['nodes']} == {0, 1}
+    assert result['stats']['api_calls'] == 4 and result['stats']['truncated'] == 'max_api_calls'
+    conn.close()
+
+
+def test_expansion_does_not_hold_the_writer_while_fetching(tmp_path, monkeypatch):
+    path = str(tmp_path / 'openalex.db')
+    init_openalex_db(path).close()
+    connections = OpenAlexConnections(path)
+    with connections.writer() as conn, WorkBatchWriter(conn) as writer:
+        writer.add(OPENALEX['W1'])
+    writer_free = []
+
+    def write():
+        with connections.writer():
+            writer_free.append(True)
+
+    def fake_report(ids, retry_missing=True, select=None):
+        # Another thread can write while the works are fetched
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join(timeout=5)
+        report = BatchFetchReport()
+        report.resolved = {work_id: pyalex.Work(OPENALEX[work_id]) for work_id in ids}
+        report.requests = 1
+        return report
+
+    monkeypatch.setattr(expansion, 'get_works_by_ids_report', fake_report)
+
+    with connections.reader() as conn:
+        result = expand_neighbourhood(conn, ['W1'], {'W1'}, hops=1, writer=connections.writer)
+    assert writer_free == [True]
+    assert {node['id'] for node in result['nodes']} == {'W1', 'W2', 'W3', 'W4'}
+    connections.close()
@@ -0,0 +1,28 @@
+import pyalex
+
+from zotero_utils.OpenAlexDB import get_items_from_api
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+
+ENTITY_CLASSES = {'A': pyalex.Author, 'I': pyalex.Institution, 'F': pyalex.Funder}
+
+
+def test_mixed_ids_are_partitioned_fetched_and_routed(tmp_path, monkeypatch):
+    batches = []
+
+    def fetch_entity_batch(batch):
+        batches.append(list(batch))
+        return [ENTITY_CLASSES[i[0]]({'id': f'https://openalex.org/{i}', 'display_name': f'Name {i}'}) for i in batch]
+
+    monkeypatch.setattr(get_items_from_api, '_fetch_entity_batch', fetch_entity_batch)
+    ids = [f'A{i}' for i in range(60)] + ['https://openalex.org/I1', 'i1', 'F1']
+
+    entities = get_items_from_api.get_entities_by_id(ids, max_workers=2)
+    assert sorted(len(b) for b in batches) == [1, 1, 10, 50]
+    assert {k: len(v) for k, v in entities.items()} == {'A': 60, 'I': 1, 'F': 1}
+
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    inserted = get_items_from_api.insert_entities_in_db(conn, entities)
+    assert set(inserted) == {'A', 'I'}
+    assert conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0] == 60
+    assert conn.execute("SELECT display_name FROM institutions WHERE id = 'I1'").fetchone()[0] == 'Name I1'
+    conn.close()
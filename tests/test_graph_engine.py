@@ -0,0 +1,126 @@
+import pytest
+
+from zotero_utils.OpenAlexDB import graph_engine
+from zotero_utils.OpenAlexDB.citation_network import build_library_graph, cache_citing_works, reset_citation_cache
+from zotero_utils.OpenAlexDB.clean import int_to_work_id
+from zotero_utils.OpenAlexDB.graph_engine import CitationGraph
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+from zotero_utils.OpenAlexDB.work import Work, WorkBatchWriter
+
+from helpers import make_work
+
+
+def test_graph_follows_edges_written_after_loading(tmp_path, monkeypatch):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', refs=['W2', 'W3']))
+        writer.add(make_work('W2', refs=['W3']))
+    cache_citing_works(conn, 'W1', ['W9'])
+
+    graph = CitationGraph.load(conn)
+    graph.attach()
+    try:
+        assert graph.references('W1') == ['W2', 'W3']
+        assert graph.citing('W3') == ['W1', 'W2']
+        assert graph.citing('W1') == ['W9']
+        assert graph.num_edges == 4
+
+        # Written after loading: kept pending, then merged into the arrays
+        with WorkBatchWriter(conn) as writer:
+            writer.add(make_work('W4', refs=['W1', 'W5']))
+        cache_citing_works(conn, 'W3', ['W1', 'W6'])
+        assert graph.references('W4') == ['W1', 'W5']
+        assert graph.citing('W1') == ['W9', 'W4']
+        assert graph.degrees(['W1', 'W3', 'W7']) == {'W1': (2, 2), 'W3': (0, 3), 'W7': (0, 0)}
+        monkeypatch.setattr(graph_engine, 'COMPACT_MIN_EDGES', 0)
+        graph.add_edges([])
+        assert sorted(graph.citing('W1')) == ['W4', 'W9']
+        assert graph.num_edges == 7
+
+        assert sorted(graph.subgraph_edges(['W1', 'W2', 'W3', 'W4'])) == [
+            ('W1', 'W2'), ('W1', 'W3'), ('W2', 'W3'), ('W4', 'W1')
+        ]
+
+        Work.delete_many(conn, ['W4'])
+        assert graph.stale
+        graph.reload(conn)
+        assert graph.citing('W1') == ['W9'] and not graph.stale
+
+        reset_citation_cache(conn)
+        assert graph.stale
+        graph.reload(conn)
+        assert graph.num_edges == 0 and graph.references('W1') == []
+    finally:
+        graph.detach()
+    conn.close()
+
+
+def test_build_library_graph_with_graph_matches_database(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', refs=['W2', 'W8']))
+        writer.add(make_work('W2', refs=['W3']))
+        writer.add(make_work('W3'))
+    items = {f'K{i}': {'openalex_work_id': f'W{i}', 'title': f'Title W{i}'} for i in (1, 2, 3)}
+
+    from_database = build_library_graph(conn, items)
+    from_graph = build_library_graph(conn, items, CitationGraph.load(conn))
+    key = lambda edge: (edge['source'], edge['target'])
+    assert sorted(from_graph['edges'], key=key) == sorted(from_database['edges'], key=key)
+    assert len(from_graph['edges']) == 2
+    conn.close()
+
+
+def test_graph_only_follows_committed_edges_of_its_database(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    other = init_openalex_db(str(tmp_path / 'other.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', refs=['W2']))
+
+    graph = CitationGraph.load(conn)
+    graph.attach()
+    try:
+        with WorkBatchWriter(other) as writer:
+            writer.add(make_work('W3', refs=['W1']))
+        assert graph.citing('W1') == []
+
+        try:
+            with conn:
+                cache_citing_works(conn, 'W1', ['W4'], commit=False)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert graph.citing('W1') == []
+
+        cache_citing_works(conn, 'W1', ['W4'])
+        assert graph.citing('W1') == ['W4']
+    finally:
+        graph.detach()
+    conn.close()
+    other.close()
+
+
+def test_neighbourhood_includes_pending_edges_without_compacting(tmp_path, monkeypatch):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', refs=['W2']))
+        writer.add(make_work('W2', refs=['W3']))
+
+    graph = CitationGraph.load(conn)
+    graph.attach()
+    try:
+        with WorkBatchWriter(conn) as writer:
+            writer.add(make_work('W4', refs=['W1', 'W5']))
+        monkeypatch.setattr(graph, '_compact', lambda: pytest.fail("neighbourhood() compacted the graph"))
+
+        numbers, sources, targets = graph.neighbourhood(['W1'])
+        ids = [int_to_work_id(number) for number in numbers]
+        assert sorted(ids) == ['W1', 'W2', 'W4']
+        assert sorted((ids[s], ids[t]) for s, t in zip(sources, targets)) == [('W1', 'W2'), ('W4', 'W1')]
+
+        numbers, _, targets = graph.neighbourhood(['W4'], hops=2)
+        assert sorted(int_to_work_id(number) for number in numbers) == ['W1', 'W2', 'W4', 'W5']
+        assert len(targets) == 3
+    finally:
+        graph.detach()
+    conn.close()
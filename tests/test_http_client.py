@@ -0,0 +1,45 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pyalex
+
+from zotero_utils import http_client
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    client_ports = set()
+
+    def do_GET(self):
+        KeepAliveHandler.client_ports.add(self.client_address[1])
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_shared_session_reuses_connections(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(http_client, 'ZOTERO_LOCAL_API_URL', f'http://127.0.0.1:{server.server_address[1]}/api')
+    http_client.reset_sessions()
+    try:
+        for _ in range(5):
+            assert http_client.zotero_api_get('users/0/items').json() == {'ok': True}
+        assert len(KeepAliveHandler.client_ports) == 1
+        assert http_client.get_zotero_session() is http_client.get_zotero_session()
+        assert http_client.get_zotero_session().headers['Accept-Encoding'] == 'gzip, deflate'
+    finally:
+        http_client.reset_sessions()
+        server.shutdown()
+        server.server_close()
+
+
+def test_pyalex_uses_shared_openalex_session():
+    http_client.install_openalex_session()
+    assert pyalex.api._get_requests_session() is http_client.get_openalex_session()
@@ -0,0 +1,25 @@
+from zotero_utils.OpenAlexDB.ingest_pipeline import IngestPipeline
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+
+
+def make_work(i):
+    return {'id': f'https://openalex.org/W{i}', 'title': f'Title {i}', 'referenced_works': [f'https://openalex.org/W{i + 1}']}
+
+
+def test_pipeline_parses_in_processes_and_skips_unchanged_works(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    works = [make_work(i) for i in range(450)]
+
+    with IngestPipeline(conn, max_workers=2, chunk_size=100, max_pending=2, flush_size=150) as pipeline:
+        for i in range(0, len(works), 50):  # Pages from a fetcher
+            pipeline.submit_works(works[i:i + 50])
+    assert pipeline.progress() == {'submitted': 9, 'read': 450, 'parsed': 450, 'written': 450, 'unchanged': 0,
+                                   'edges': 450, 'errors': 0}
+    assert conn.execute("SELECT COUNT(*) FROM works").fetchone()[0] == 450
+    assert conn.execute("SELECT COUNT(*) FROM works_referenced_works").fetchone()[0] == 450
+
+    with IngestPipeline(conn, max_workers=1, chunk_size=100) as pipeline:
+        pipeline.submit_works(works[:10] + [dict(make_work(10), title='Changed')])
+    assert (pipeline.progress()['written'], pipeline.progress()['unchanged']) == (1, 10)
+    assert conn.execute("SELECT title FROM works WHERE id = 'W10'").fetchone() == ('Changed',)
+    conn.close()
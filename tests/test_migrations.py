@@ -0,0 +1,38 @@
+import sqlite3
+
+from zotero_utils.OpenAlexDB.migrations import LATEST_VERSION, column_exists, get_schema_version, migrate
+
+
+def test_legacy_database_is_migrated_idempotently(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'openalex.db'))
+    # A database created before fetch tiers, bad identifiers and migrations existed
+    conn.executescript("""
+        CREATE TABLE works (id TEXT PRIMARY KEY, doi TEXT, title TEXT);
+        CREATE TABLE works_authorships (work_id TEXT, author_position TEXT, author_id TEXT, institution_id TEXT);
+        CREATE TABLE authors (id TEXT PRIMARY KEY, display_name TEXT);
+        CREATE TABLE works_referenced_works (work_id TEXT, referenced_work_id TEXT);
+        CREATE TABLE works_topics (work_id TEXT, topic_id TEXT, score REAL);
+        CREATE TABLE works_concepts (work_id TEXT, concept_id TEXT, score REAL);
+        INSERT INTO works VALUES ('W1', 'https://doi.org/10.1/x', 'Title');
+        INSERT INTO works_referenced_works VALUES ('W1', 'W2'), ('W1', 'W3'), ('W1', 'W3');
+    """)
+
+    assert migrate(conn) == LATEST_VERSION
+    assert get_schema_version(conn) == LATEST_VERSION
+    assert column_exists(conn, 'works', 'fetch_tier')
+    assert conn.execute("SELECT title FROM works").fetchone() == ('Title',)
+    assert conn.execute("SELECT rowid FROM works_fts WHERE works_fts MATCH 'title'").fetchall() == [(1,)]
+    assert conn.execute("SELECT * FROM works_referenced_works").fetchall() == [(1, 2), (1, 3)]
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT work_id FROM works_referenced_works WHERE referenced_work_id = 3").fetchall()
+    assert 'USING COVERING INDEX works_referenced_works_ref_id_idx' in plan[0][-1]
+
+    plan = conn.execute("""
+        EXPLAIN QUERY PLAN
+        SELECT a.display_name FROM works_authorships wa JOIN authors a ON wa.author_id = a.id
+        WHERE wa.work_id = ? ORDER BY wa.author_position LIMIT 2
+    """, ('W1',)).fetchall()
+    assert 'USING COVERING INDEX works_authorships_work_position_author_idx' in plan[0][-1]
+
+    # Running again is a no-op
+    assert migrate(conn) == LATEST_VERSION
+    conn.close()
@@ -0,0 +1,66 @@
+import pytest
+
+from zotero_utils.OpenAlexAPI.works import BatchFetchReport
+from zotero_utils.OpenAlexDB import refresh
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    conn.executemany("INSERT INTO zotero_openalex_mapping (zotero_key, openalex_work_id) VALUES (?, ?)",
+                     [('K1', 'W1'), ('K2', 'W2')])
+    yield conn
+    conn.close()
+
+
+def make_work(work_id, updated_date, title='Title'):
+    return {'id': f'https://openalex.org/{work_id}', 'title': title, 'updated_date': updated_date}
+
+
+def make_report(works):
+    report = BatchFetchReport()
+    report.resolved = {work['id'].rsplit('/', 1)[-1]: work for work in works}
+    return report
+
+
+def test_refresh_fetches_only_changed_works_and_records_the_sync(conn, monkeypatch):
+    calls = []
+    remote = {'W1': make_work('W1', '2024-01-01'), 'W2': make_work('W2', '2024-01-01')}
+
+    def fake_report(work_ids, max_workers=4, retry_missing=True, select=None, filters=None):
+        calls.append((sorted(work_ids), select, filters))
+        since = (filters or {}).get('from_updated_date', '')
+        return make_report([remote[i] for i in work_ids if remote[i]['updated_date'] >= since])
+
+    monkeypatch.setattr(refresh, 'get_works_by_ids_report', fake_report)
+    monkeypatch.setattr(refresh, 'supports_from_updated_date', lambda since: True)
+
+    counts = refresh.refresh_library_works(conn)
+    assert (counts['mode'], counts['updated']) == ('full', 2)
+    synced_date = refresh.get_synced_date(conn)
+    assert synced_date is not None
+    assert conn.execute("SELECT updated_date FROM works WHERE id = 'W1'").fetchone() == ('2024-01-01',)
+
+    remote['W2'] = make_work('W2', '9999-01-01', title='New title')
+    counts = refresh.refresh_library_works(conn)
+    assert (counts['mode'], counts['updated']) == ('from_updated_date', 1)
+    assert calls[-1][2] == {'from_updated_date': synced_date}
+    assert conn.execute("SELECT title FROM works WHERE id = 'W2'").fetchone() == ('New title',)
+
+    # Without from_updated_date, the updated dates are compared instead
+    monkeypatch.setattr(refresh, 'supports_from_updated_date', lambda since: False)
+    remote['W1'] = make_work('W1', '2024-02-01', title='Changed')
+    counts = refresh.refresh_library_works(conn)
+    assert (counts['mode'], counts['updated']) == ('updated_date', 1)
+    assert calls[-1][0] == ['W1']
+    assert conn.execute("SELECT title FROM works WHERE id = 'W1'").fetchone() == ('Changed',)
+
+
+def test_replayed_refresh_does_not_advance_the_synced_date(conn, monkeypatch):
+    from zotero_utils.OpenAlexAPI import response_cache
+
+    monkeypatch.setattr(refresh, 'get_works_by_ids_report', lambda work_ids, *args, **kwargs: make_report([]))
+    monkeypatch.setattr(response_cache, '_installed_cache', response_cache.ResponseCache(':memory:', replay_only=True))
+    refresh.refresh_library_works(conn)
+    assert refresh.get_synced_date(conn) is None
@@ -0,0 +1,81 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from zotero_utils.OpenAlexAPI.response_cache import (
+    CacheMissError,
+    ResponseCache,
+    get_cached_session,
+    normalize_url,
+)
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    hits = 0
+
+    def do_GET(self):
+        CountingHandler.hits += 1
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{"id": "https://openalex.org/W1"}')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    CountingHandler.hits = 0
+    server = HTTPServer(('127.0.0.1', 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_normalize_url_ignores_param_order_and_caller_identity():
+    assert normalize_url('HTTPS://API.openalex.org/works?select=id&filter=doi:x&mailto=a@b.c') == \
+        normalize_url('https://api.openalex.org/works?filter=doi:x&select=id')
+
+
+def test_cached_responses_are_replayed_offline(server_url, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'))
+    session = get_cached_session(cache)
+    assert session.get(f'{server_url}/works/W1').json()['id'] == 'https://openalex.org/W1'
+    assert session.get(f'{server_url}/works/W1').json()['id'] == 'https://openalex.org/W1'
+    assert CountingHandler.hits == 1
+
+    replay = get_cached_session(ResponseCache(str(tmp_path / 'cache.db'), ttls={'works': 0}, replay_only=True))
+    time.sleep(0.01)
+    assert replay.get(f'{server_url}/works/W1').status_code == 200
+    with pytest.raises(CacheMissError):
+        replay.get(f'{server_url}/works/W2')
+    assert CountingHandler.hits == 1
+
+
+def test_expired_entries_are_refetched(server_url, tmp_path):
+    session = get_cached_session(ResponseCache(str(tmp_path / 'cache.db'), ttls={'works': 0}))
+    session.get(f'{server_url}/works/W1')
+    time.sleep(0.01)
+    session.get(f'{server_url}/works/W1')
+    assert CountingHandler.hits == 2
+
+
+def test_bypassed_requests_go_to_the_network_from_worker_threads_too(server_url, tmp_path):
+    from zotero_utils.OpenAlexAPI.batch import fetch_batches
+    from zotero_utils.OpenAlexAPI.response_cache import bypass_response_cache
+
+    session = get_cached_session(ResponseCache(str(tmp_path / 'cache.db')))
+    session.get(f'{server_url}/works/W1')
+    fetch = lambda batch: [session.get(f'{server_url}/works/{work_id}').status_code for work_id in batch]
+    with bypass_response_cache():
+        results = list(fetch_batches([['W1'], ['W1']], fetch, max_workers=2, limiter=None))
+    assert [result for _, result, _ in results] == [[200], [200]]
+    assert CountingHandler.hits == 3
+
+    # Outside the block, the refreshed entry is served again
+    session.get(f'{server_url}/works/W1')
+    assert CountingHandler.hits == 3
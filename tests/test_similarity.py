@@ -0,0 +1,44 @@
+import numpy as np
+
+from zotero_utils.OpenAlexDB import similarity
+from zotero_utils.OpenAlexDB.citation_network import cache_citing_works
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+from zotero_utils.OpenAlexDB.similarity import compute_similarity, get_similarity_edges
+from zotero_utils.OpenAlexDB.work import WorkBatchWriter
+
+from helpers import make_work
+
+
+def test_coupling_and_cocitation_are_computed_once_and_cached(tmp_path, monkeypatch):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', refs=['W10', 'W11', 'W12']))
+        writer.add(make_work('W2', refs=['W10', 'W11']))
+        writer.add(make_work('W3', refs=['W12', 'W13']))
+        writer.add(make_work('W20', refs=['W1', 'W2']))  # External work co-citing W1 and W2
+    cache_citing_works(conn, 'W3', ['W21'])
+    cache_citing_works(conn, 'W1', ['W21'])
+    library = ['W1', 'W2', 'W3']
+
+    assert get_similarity_edges(conn, library, 'coupling') == [
+        {'source': 'W1', 'target': 'W2', 'weight': 2, 'type': 'coupling'},
+        {'source': 'W1', 'target': 'W3', 'weight': 1, 'type': 'coupling'},
+    ]
+    assert [(e['source'], e['target'], e['weight']) for e in get_similarity_edges(conn, library, 'cocitation')] == [
+        ('W1', 'W2', 1), ('W1', 'W3', 1)
+    ]
+
+    # Unchanged citations: read from the cache
+    monkeypatch.setattr(similarity, 'compute_similarity', lambda *args: 1 / 0)
+    assert len(get_similarity_edges(conn, library, 'coupling')) == 2
+    conn.close()
+
+
+def test_top_k_keeps_the_heaviest_links_of_each_work():
+    # W1 shares 3 references with W2, 2 with W3 and 1 with W4; W4 shares nothing else
+    library = np.array([1, 2, 3, 4])
+    edges = [(1, 10), (1, 11), (1, 12), (2, 10), (2, 11), (2, 12), (3, 10), (3, 11), (4, 10)]
+    library_side, other_side = np.array(edges).T
+    works, others, weights = compute_similarity(library, library_side, other_side, top_k=1)
+    # Top 1 of W1 and W2 is each other, of W3 W1 (tie with W2, by ID), of W4 W1
+    assert list(zip(works.tolist(), others.tolist(), weights.tolist())) == [(1, 2, 3), (1, 3, 2), (1, 4, 1)]
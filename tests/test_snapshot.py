@@ -0,0 +1,67 @@
+import gzip
+import json
+import sqlite3
+
+from typer.testing import CliRunner
+
+from zotero_utils.commands import app
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+from zotero_utils.OpenAlexDB.snapshot import load_snapshot
+
+from helpers import make_work
+
+
+def write_partition(path, works):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for work in works:
+            f.write(json.dumps(work) + '\n')
+
+
+def make_snapshot_work(work_id, refs=()):
+    return make_work(work_id, refs, authorships=[
+        {'author_position': 'first', 'author': {'id': 'https://openalex.org/A1', 'display_name': 'Ada'}, 'institutions': []}
+    ])
+
+
+def test_load_snapshot_partitions_filtered_to_neighbourhood(tmp_path):
+    works_dir = tmp_path / 'data' / 'works'
+    write_partition(works_dir / 'updated_date=2024-01-01' / 'part_000.gz',
+                    [make_snapshot_work('W1', ['W2']), make_snapshot_work('W2'), make_snapshot_work('W3', ['W9'])])
+    write_partition(works_dir / 'updated_date=2024-01-02' / 'part_000.gz',
+                    [make_snapshot_work('W4', ['W1', 'W2']), make_snapshot_work('W5')])
+
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    counts = load_snapshot(conn, str(works_dir), neighbourhood_ids={'W1', 'W2'}, max_workers=2)
+
+    assert counts == {'partitions': 2, 'read': 5, 'loaded': 3, 'edges': 3}
+    assert [row[0] for row in conn.execute("SELECT id FROM works ORDER BY id")] == ['W1', 'W2', 'W4']
+    assert conn.execute("SELECT COUNT(*) FROM works_authorships").fetchone()[0] == 3
+
+    # Reloading, a record per chunk, replaces the rows instead of duplicating them
+    counts = load_snapshot(conn, str(works_dir), neighbourhood_ids={'W1', 'W2'}, max_workers=1, chunk_size=1)
+    assert counts == {'partitions': 2, 'read': 5, 'loaded': 3, 'edges': 3}
+    assert conn.execute("SELECT COUNT(*) FROM works_referenced_works").fetchone()[0] == 3
+    conn.close()
+
+
+def test_load_snapshot_command_loads_the_library_neighbourhood(tmp_path):
+    works_dir = tmp_path / 'works'
+    write_partition(works_dir / 'part_000.gz', [make_snapshot_work('W1', ['W2']), make_snapshot_work('W3')])
+    db_file = str(tmp_path / 'openalex.db')
+    conn = init_openalex_db(db_file)
+    conn.execute("INSERT INTO zotero_openalex_mapping (zotero_key, openalex_work_id) VALUES ('K1', 'W1')")
+    conn.commit()
+    conn.close()
+
+    args = ['load-openalex-snapshot', str(works_dir), '--openalex-db-file', db_file, '--workers', '1']
+    result = CliRunner().invoke(app, args)
+    assert result.exit_code == 0, result.output
+    conn = sqlite3.connect(db_file)
+    assert [row[0] for row in conn.execute("SELECT id FROM works")] == ['W1']
+    conn.close()
+
+    assert CliRunner().invoke(app, args + ['--no-neighbourhood']).exit_code == 0
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT COUNT(*) FROM works").fetchone()[0] == 2
+    conn.close()
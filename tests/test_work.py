@@ -0,0 +1,120 @@
+from zotero_utils.OpenAlexDB.citation_network import cache_citing_works, reset_citation_cache
+from zotero_utils.OpenAlexDB.init_db import init_openalex_db
+from zotero_utils.OpenAlexDB.work import Work, WorkBatchWriter, read_work_dicts
+
+from helpers import make_work
+
+
+def test_batch_writer_flushes_in_batches_and_replaces_rows(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn, flush_size=4) as writer:
+        for i in range(10):
+            writer.add(make_work(f'W{i}', refs=['W100', 'W101']))
+        assert writer.written == 8 and len(writer) == 2
+        writer.add(make_work('W9', refs=['W102']))  # Re-added work replaces the buffered one
+    assert writer.written == 11
+
+    assert conn.execute("SELECT COUNT(*) FROM works").fetchone()[0] == 10
+    assert conn.execute("SELECT referenced_work_id FROM works_referenced_works WHERE work_id = 9").fetchall() == [(102,)]
+    assert conn.execute("SELECT COUNT(*) FROM works_referenced_works").fetchone()[0] == 19
+    conn.close()
+
+
+def test_read_work_dicts_round_trips_works_in_one_query_per_table(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    work = {
+        'id': 'https://openalex.org/W1', 'doi': 'https://doi.org/10.1/x', 'title': 'Gait', 'display_name': 'Gait',
+        'publication_year': 2020, 'type': 'article', 'cited_by_count': 3,
+        'abstract_inverted_index': {'Walking': [0], 'gait': [1]},
+        'primary_location': {'source': {'id': 'https://openalex.org/S1'}, 'is_oa': True},
+        'authorships': [
+            {'author_position': 'first', 'author': {'id': 'https://openalex.org/A1', 'display_name': 'Ada'},
+             'institutions': [{'id': 'https://openalex.org/I1'}, {'id': 'https://openalex.org/I2'}]},
+            {'author_position': 'last', 'author': {'id': 'https://openalex.org/A2', 'display_name': 'Bob'}, 'institutions': []},
+        ],
+        'topics': [{'id': 'https://openalex.org/T1', 'score': 0.9}],
+        'referenced_works': ['https://openalex.org/W2', 'https://openalex.org/W3'],
+        'ids': {'openalex': 'https://openalex.org/W1', 'pmid': '123'},
+    }
+    with WorkBatchWriter(conn) as writer:
+        writer.add(work)
+        for i in range(2, 40):
+            writer.add(make_work(f'W{i}', refs=['W1']))
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    works = read_work_dicts(conn, [f'W{i}' for i in range(1, 40)] + ['W999'])
+    conn.set_trace_callback(None)
+    assert len(statements) == 13
+    assert len(works) == 39
+
+    read = works['W1']
+    assert read['abstract_inverted_index'] == work['abstract_inverted_index']
+    assert read['primary_location']['source']['id'] == 'https://openalex.org/S1'
+    assert [(a['author']['display_name'], [i['id'] for i in a['institutions']]) for a in read['authorships']] == [
+        ('Ada', ['https://openalex.org/I1', 'https://openalex.org/I2']), ('Bob', [])]
+    assert [t['id'] for t in read['topics']] == ['https://openalex.org/T1']
+    assert read['referenced_works'] == work['referenced_works']
+    assert read['ids'] == {'openalex': 'https://openalex.org/W1', 'pmid': '123'}
+    assert works['W2']['referenced_works'] == ['https://openalex.org/W1']
+
+    assert [w.work_id for w in Work.read_works_from_db_by_ids(conn, ['W3', 'https://openalex.org/W1'])] == ['W3', 'W1']
+    conn.close()
+
+
+def test_unchanged_works_and_sections_are_not_rewritten(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    work = dict(make_work('W1', refs=['W2']), topics=[{'id': 'https://openalex.org/T1', 'score': 0.5}])
+    with WorkBatchWriter(conn) as writer:
+        writer.add(work)
+    assert writer.written == 1
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    with WorkBatchWriter(conn) as writer:
+        writer.add(dict(work))
+    assert (writer.written, writer.unchanged) == (0, 1)
+    assert not [s for s in statements if s.lstrip().startswith(('DELETE', 'INSERT', 'REPLACE INTO works '))]
+
+    statements.clear()
+    with WorkBatchWriter(conn) as writer:
+        writer.add(dict(work, topics=[{'id': 'https://openalex.org/T2', 'score': 0.5}]))
+    conn.set_trace_callback(None)
+    assert writer.written == 1
+    assert {s.split()[2] for s in statements if s.lstrip().startswith(('DELETE', 'INSERT'))} == {'works_topics'}
+    assert conn.execute("SELECT topic_id FROM works_topics").fetchall() == [('T2',)]
+    assert conn.execute("SELECT referenced_work_id FROM works_referenced_works").fetchall() == [(2,)]
+    conn.close()
+
+
+def test_references_are_rewritten_after_a_cache_reset(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', refs=['W2', 'W3']))
+    reset_citation_cache(conn)
+    assert conn.execute("SELECT COUNT(*) FROM works_referenced_works").fetchone()[0] == 0
+
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', refs=['W2', 'W3']))
+    assert writer.written == 1
+    assert conn.execute("SELECT COUNT(*) FROM works_referenced_works").fetchone()[0] == 2
+    conn.close()
+
+
+def test_delete_many_removes_cited_by_rows_both_ways_and_orphaned_authors(tmp_path):
+    conn = init_openalex_db(str(tmp_path / 'openalex.db'))
+
+    def authorships(*author_ids):
+        return [{'author': {'id': f'https://openalex.org/{a}', 'display_name': a}} for a in author_ids]
+
+    with WorkBatchWriter(conn) as writer:
+        writer.add(make_work('W1', authorships=authorships('A1', 'A2')))
+        writer.add(make_work('W2', authorships=authorships('A2')))
+        writer.add(make_work('W3'))
+    cache_citing_works(conn, 'W3', ['W1', 'W2'])
+    cache_citing_works(conn, 'W1', ['W2'])
+
+    assert Work.delete_many(conn, ['W1']) == 1
+    assert conn.execute("SELECT work_id, citing_work_id FROM works_cited_by").fetchall() == [(3, 2)]
+    assert [row[0] for row in conn.execute("SELECT id FROM authors")] == ['A2']
+    conn.close()
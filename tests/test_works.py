@@ -0,0 +1,279 @@
+import pytest
+
+from zotero_utils.OpenAlexAPI import works as works_api
+
+
+def test_doi_report_retries_only_missing(monkeypatch):
+    known = {f'10.1/{i}': {'id': f'https://openalex.org/W{i}', 'doi': f'https://doi.org/10.1/{i}'} for i in range(60)}
+    batch_requests = []
+    single_requests = []
+
+    def fetch_filter_batch(filter_field, batch, select=None, filters=None, on_request=None, retry_policy=None):
+        on_request()
+        batch_requests.append(list(batch))
+        return [known[d.lower()] for d in batch if d.lower() in known]
+
+    def lookup_work_by_doi(doi, select, retry_policy, on_request):
+        on_request()
+        single_requests.append(doi)
+        return None
+
+    monkeypatch.setattr(works_api, '_fetch_filter_batch', fetch_filter_batch)
+    monkeypatch.setattr(works_api, '_lookup_work_by_doi', lookup_work_by_doi)
+
+    dois = ['https://doi.org/10.1/0', '10.1/1'] + [f'10.1/{i}' for i in range(2, 60)] + ['10.1/missing']
+    report = works_api.get_works_by_dois_report(dois, max_workers=1)
+
+    assert len(batch_requests) == 2
+    assert single_requests == ['10.1/missing']
+    assert report.missing == report.not_found == ['10.1/missing']
+    assert not report.errored
+    assert report.resolved['10.1/0']['id'] == 'https://openalex.org/W0'
+    assert len(report.works) == 60
+    assert report.requests == 3
+
+
+def test_coalescer_shares_in_flight_lookups():
+    import threading
+    import time
+
+    from zotero_utils.OpenAlexAPI.coalesce import WorkFetchCoalescer
+
+    calls = []
+
+    def fetch_works(ids):
+        calls.append(sorted(ids))
+        time.sleep(0.05)
+        return {i: {'id': f'https://openalex.org/{i}'} for i in ids if i != 'W404'}
+
+    coalescer = WorkFetchCoalescer(fetch_works, window=0.05)
+    results = {}
+
+    def lookup(name, ids):
+        results[name] = [w['id'].rsplit('/', 1)[-1] for w in coalescer.get_works(ids)]
+
+    threads = [
+        threading.Thread(target=lookup, args=('a', ['W1', 'W2'])),
+        threading.Thread(target=lookup, args=('b', ['https://openalex.org/W2', 'W3', 'W404'])),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [['W1', 'W2', 'W3', 'W404']]
+    assert results == {'a': ['W1', 'W2'], 'b': ['W2', 'W3']}
+
+
+def test_rejected_batch_is_bisected_to_isolate_bad_ids(monkeypatch):
+    import requests
+
+    from zotero_utils.OpenAlexAPI.retry import RetryPolicy
+
+    batch_requests = []
+
+    def fetch_filter_batch(filter_field, batch, select=None, filters=None, on_request=None, retry_policy=None):
+        on_request()
+        batch_requests.append(list(batch))
+        if 'WBAD' in batch:
+            response = requests.Response()
+            response.status_code = 400
+            raise requests.exceptions.HTTPError('400 Bad Request', response=response)
+        return [{'id': f'https://openalex.org/{i}'} for i in batch]
+
+    monkeypatch.setattr(works_api, '_fetch_filter_batch', fetch_filter_batch)
+    ids = [f'W{i}' for i in range(15)] + ['WBAD']
+    report = works_api._get_works_report(
+        ids, 'openalex_id', works_api._openalex_id_key, lambda w: works_api._openalex_id_key(w['id']),
+        get_single=None, max_workers=1, retry_missing=False,
+        retry_policy=RetryPolicy(limiter=None, sleep=lambda s: None),
+    )
+
+    assert list(report.invalid) == ['WBAD']
+    assert list(report.errored) == ['WBAD']
+    assert len(report.resolved) == 15
+    assert len(batch_requests) == 1 + 2 * 4  # log2(16) levels of bisection
+    assert report.requests == len(batch_requests)
+
+
+def test_retry_policy_honours_retry_after():
+    import requests
+
+    from zotero_utils.OpenAlexAPI.retry import RetryPolicy
+
+    sleeps = []
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            response = requests.Response()
+            response.status_code = 429
+            response.headers['Retry-After'] = '7'
+            raise requests.exceptions.HTTPError('429 Too Many Requests', response=response)
+        return 'ok'
+
+    assert RetryPolicy(limiter=None, sleep=sleeps.append).call(flaky) == 'ok'
+    assert sleeps == [7.0, 7.0]
+
+
+def test_auth_errors_are_raised_instead_of_bisected(monkeypatch):
+    from pyalex.api import QueryError
+
+    from zotero_utils.OpenAlexAPI.retry import RetryPolicy
+
+    batch_requests = []
+
+    def fetch_filter_batch(filter_field, batch, select=None, filters=None, on_request=None, retry_policy=None):
+        batch_requests.append(list(batch))
+        raise QueryError('Invalid API key. Did you configure a valid API key?')
+
+    monkeypatch.setattr(works_api, '_fetch_filter_batch', fetch_filter_batch)
+    policy = RetryPolicy(limiter=None, sleep=lambda s: None)
+    assert policy.is_auth_error(QueryError('Invalid API key')) and not policy.is_rejection(QueryError('Invalid API key'))
+    with pytest.raises(QueryError):
+        works_api._get_works_report(
+            [f'W{i}' for i in range(16)], 'openalex_id', works_api._openalex_id_key,
+            lambda w: works_api._openalex_id_key(w['id']),
+            get_single=None, max_workers=1, retry_missing=False, retry_policy=policy,
+        )
+    assert len(batch_requests) == 1
+
+
+def test_stub_lookups_of_missing_ids_only_select_the_stub_fields(monkeypatch):
+    import requests
+
+    urls = []
+
+    class Session:
+        def get(self, url, auth=None):
+            urls.append(url)
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b'{"id": "https://openalex.org/W2"}'  # W1 was merged into W2
+            return response
+
+    monkeypatch.setattr(works_api, '_fetch_filter_batch', lambda *args, **kwargs: [])
+    monkeypatch.setattr(works_api, 'get_openalex_session', Session)
+
+    report = works_api.get_works_by_ids_report(['W1'], max_workers=1, select=works_api.STUB_WORK_FIELDS)
+    assert report.resolved == {'W1': {'id': 'https://openalex.org/W2'}}
+    assert urls == [f"https://api.openalex.org/works/W1?select={','.join(works_api.STUB_WORK_FIELDS)}"]
+    assert report.requests == 1
+
+
+def http_error(status):
+    import requests
+
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(f'{status} Error', response=response)
+
+
+def test_failed_single_lookups_are_errored_and_only_404s_are_not_found(monkeypatch):
+    from zotero_utils.OpenAlexAPI.retry import RetryPolicy
+
+    lookups = []
+
+    def get_single_work(record_id, select=None):
+        lookups.append(record_id)
+        if record_id == 'W500':
+            raise http_error(500)
+        if record_id == 'W400':
+            raise http_error(400)
+        raise http_error(404)
+
+    monkeypatch.setattr(works_api, '_fetch_filter_batch', lambda *args, **kwargs: [])
+    monkeypatch.setattr(works_api, '_get_single_work', get_single_work)
+    report = works_api._get_works_report(
+        ['W404', 'W500', 'W400'], 'openalex_id', works_api._openalex_id_key,
+        lambda w: works_api._openalex_id_key(w['id']), get_single=works_api._lookup_work_by_id,
+        max_workers=1, retry_missing=True, retry_policy=RetryPolicy(max_attempts=3, limiter=None, sleep=lambda s: None),
+    )
+
+    assert report.missing == report.not_found == ['W404']
+    assert sorted(report.errored) == ['W400', 'W500']
+    assert list(report.invalid) == ['W400']
+    assert lookups.count('W500') == 3  # Retried
+    assert report.requests == len(lookups)
+
+
+def test_pages_after_the_first_are_retried(monkeypatch):
+    from zotero_utils.OpenAlexAPI.retry import RetryPolicy
+
+    pages = []
+
+    class Page(list):
+        meta = {'count': 3}
+
+    class Query:
+        def get(self, per_page, page=None):
+            pages.append(page)
+            if page == 2 and pages.count(2) == 1:
+                raise http_error(503)
+            return Page([{'id': f'https://openalex.org/W{page or 1}{i}'} for i in range(2 if page is None else 1)])
+
+    monkeypatch.setattr(works_api, '_works_query', lambda select=None, **filters: Query())
+    requests_made = []
+    works = works_api._fetch_filter_batch(
+        'openalex_id', ['W1', 'W2'], on_request=lambda: requests_made.append(1),
+        retry_policy=RetryPolicy(limiter=None, sleep=lambda s: None),
+    )
+    assert len(works) == 3
+    assert pages == [None, 2, 2]
+    assert len(requests_made) == 3
+
+
+def test_doi_lookup_quotes_the_doi_and_falls_back_to_the_filter_on_404(monkeypatch):
+    import requests
+
+    from zotero_utils.OpenAlexAPI.retry import RetryPolicy
+
+    urls = []
+
+    class Session:
+        def get(self, url, auth=None):
+            urls.append(url)
+            response = requests.Response()
+            response.status_code = 404
+            return response
+
+    class Query:
+        def get(self):
+            return [{'id': 'https://openalex.org/W7'}]
+
+    monkeypatch.setattr(works_api, 'get_openalex_session', Session)
+    monkeypatch.setattr(works_api, '_works_query', lambda select=None, **filters: Query())
+    work = works_api._lookup_work_by_doi('10.1/a#b', retry_policy=RetryPolicy(limiter=None, sleep=lambda s: None))
+    assert work == {'id': 'https://openalex.org/W7'}
+    assert urls == ['https://api.openalex.org/works/https%3A%2F%2Fdoi.org%2F10.1%2Fa%23b']
+
+
+def test_coalescer_fails_waiters_when_the_flush_is_interrupted_and_times_out():
+    from concurrent.futures import TimeoutError
+
+    from zotero_utils.OpenAlexAPI.coalesce import WorkFetchCoalescer
+
+    class Interrupted(BaseException):
+        pass
+
+    def fetch_works(ids):
+        raise Interrupted
+
+    coalescer = WorkFetchCoalescer(fetch_works, window=0)
+    flush = coalescer._flush
+
+    def flush_quietly():
+        # The timer thread would otherwise report the interruption
+        with pytest.raises(Interrupted):
+            flush()
+
+    coalescer._flush = flush_quietly
+    with pytest.raises(Interrupted):
+        coalescer.get_works(['W1'], timeout=5)
+    assert not coalescer._in_flight
+
+    stalled = WorkFetchCoalescer(lambda ids: {}, window=60)
+    with pytest.raises(TimeoutError):
+        stalled.get_works(['W1'], timeout=0.01)
+    stalled._timer.cancel()